@@ -1,13 +1,34 @@
-from flask import Flask, redirect, url_for, render_template
+from flask import Flask, Response, redirect, url_for, render_template
 from flask_socketio import SocketIO
 from flask_cors import CORS
+from sqlalchemy import false, func
 from app.config import Config
-from app.database import init_db, get_session
+from app.active_poll import active_poll_cache
+from app.broadcast import broadcaster, dispatcher
+from app import metrics
+from app.database import init_db, get_session, remove_session, sqlite_pragmas
+from app.middleware.auth import require_admin_secret
 from app.models import Poll
+from app.shared_state import SharedStateStore
+from app.tally import tally
+from app.timeline import live_timeline, timeline_cache
+from app.utils.responses import COMPLETED_PAGE_SIZE, format_completed_poll, page_cursor
 
 socketio = SocketIO()
 
 
+@socketio.on("connect")
+def handle_connect():
+    """Count a connected client"""
+    metrics.socketio_clients.inc()
+
+
+@socketio.on("disconnect")
+def handle_disconnect():
+    """Count a disconnected client"""
+    metrics.socketio_clients.dec()
+
+
 def create_app(config_class=Config):
     """Flask application factory"""
     app = Flask(__name__,
@@ -17,9 +38,47 @@ def create_app(config_class=Config):
 
     CORS(app)
 
-    init_db(app.config['DATABASE_URL'])
-
-    socketio.init_app(app, cors_allowed_origins="*")
+    # Share state before init_db so its invalidation also resets the store
+    store = None
+    if app.config['COUNTER_STORE_URL']:
+        store = SharedStateStore.from_url(app.config['COUNTER_STORE_URL'])
+    tally.share(store)
+    broadcaster.share(store)
+    active_poll_cache.share(store)
+
+    init_db(
+        app.config['DATABASE_URL'],
+        pragmas=sqlite_pragmas(app.config),
+        pool_size=app.config['DB_POOL_SIZE'],
+        pool_timeout=app.config['DB_POOL_TIMEOUT'],
+    )
+    active_poll_cache.ttl = app.config['ACTIVE_POLL_CACHE_TTL']
+    tally.ttl = app.config['VOTE_TALLY_TTL']
+    timeline_cache.max_entries = app.config['TIMELINE_CACHE_SIZE']
+    timeline_cache.clear()
+    live_timeline.configure(app.config['TIMELINE_LIVE_BUCKETS'])
+    app.teardown_appcontext(remove_session)
+    metrics.instrument(app)
+
+    socketio.init_app(
+        app,
+        cors_allowed_origins="*",
+        async_mode=app.config['SOCKETIO_ASYNC_MODE'],
+        message_queue=app.config['SOCKETIO_MESSAGE_QUEUE'],
+    )
+
+    dispatcher.configure(app.config['BROADCAST_QUEUE_MAX_SIZE'])
+    broadcaster.configure(app.config['VOTE_BROADCAST_WINDOW_MS'])
+
+    if app.config['VOTE_INGEST_MODE'] == 'batched':
+        from app.ingest import vote_queue
+
+        vote_queue.configure(
+            max_size=app.config['VOTE_QUEUE_MAX_SIZE'],
+            batch_size=app.config['VOTE_BATCH_SIZE'],
+            interval_ms=app.config['VOTE_BATCH_INTERVAL_MS'],
+        )
+        vote_queue.start()
 
     from app.routes.admin import admin_bp
     from app.routes.api import api_bp
@@ -27,6 +86,18 @@ def create_app(config_class=Config):
     app.register_blueprint(admin_bp, url_prefix='/admin')
     app.register_blueprint(api_bp, url_prefix='/api')
 
+    from app.commands import compact_votes_command, reconcile_counts_command
+
+    app.cli.add_command(reconcile_counts_command)
+    app.cli.add_command(compact_votes_command)
+
+    @app.route('/metrics')
+    @require_admin_secret
+    def metrics_endpoint():
+        """Prometheus metrics for this process"""
+        body = metrics.render(dispatcher.stats(), get_session().get_bind())
+        return Response(body, content_type=metrics.CONTENT_TYPE)
+
     @app.route('/')
     def index():
         """Redirect to display page"""
@@ -36,64 +107,47 @@ def create_app(config_class=Config):
     def display():
         """Display page for showing poll results"""
         session = get_session()
-        active_poll = session.query(Poll).filter_by(is_active=True).first()
-
-        if active_poll:
-            counts = active_poll.get_vote_counts(session)
-            return render_template('display.html',
-                                 poll=active_poll,
-                                 count_a=counts['A'],
-                                 count_b=counts['B'])
-        else:
-            return render_template('display.html', poll=None)
+        active_poll = active_poll_cache.get(session)
+
+        # The page carries the poll markup even when no poll is active, so a
+        # poll_activated event can fill it in without a reload
+        seq = broadcaster.seq
+        counts = tally.get_counts(active_poll, session) if active_poll else {'A': 0, 'B': 0}
+        return render_template('display.html',
+                             poll=active_poll,
+                             count_a=counts['A'],
+                             count_b=counts['B'],
+                             seq=seq)
 
     @app.route('/display-no-votes')
     def display_no_votes():
         """Display page showing poll options without vote counts"""
         session = get_session()
-        active_poll = session.query(Poll).filter_by(is_active=True).first()
+        active_poll = active_poll_cache.get(session)
         return render_template('display_no_votes.html', poll=active_poll)
 
     @app.route('/display-completed')
     def display_completed():
-        """Display page showing completed polls in 2x2 grid"""
+        """Display page showing completed polls in 2x2 grid.
+
+        Only the first page is rendered; display_completed.js fetches the
+        following pages from /api/polls/completed as it rotates.
+        """
         session = get_session()
 
-        # Get all inactive polls, ordered by most recent first
-        completed_polls = session.query(Poll).filter_by(
-            is_active=False
-        ).order_by(Poll.created_at.desc()).all()
-
-        # Get vote counts for each poll
-        polls_with_counts = []
-        for poll in completed_polls:
-            counts = poll.get_vote_counts(session)
-            total_votes = counts['A'] + counts['B']
-
-            # Calculate percentages for bar heights
-            if total_votes > 0:
-                percent_a = (counts['A'] / total_votes) * 100
-                percent_b = (counts['B'] / total_votes) * 100
-            else:
-                percent_a = 0
-                percent_b = 0
-
-            polls_with_counts.append({
-                'poll': {
-                    'id': poll.id,
-                    'question': poll.question,
-                    'answer_a': poll.answer_a,
-                    'answer_b': poll.answer_b,
-                    'created_at': poll.created_at.isoformat(),
-                    'created_at_formatted': poll.created_at.strftime('%B %d, %Y')
-                },
-                'count_a': counts['A'],
-                'count_b': counts['B'],
-                'percent_a': percent_a,
-                'percent_b': percent_b
-            })
-
-        return render_template('display_completed.html', polls=polls_with_counts)
+        page = Poll.completed_page(session, limit=COMPLETED_PAGE_SIZE + 1)
+        total = session.query(func.count(Poll.id)).filter(Poll.is_active == false()).scalar()
+
+        polls = [format_completed_poll(poll, result) for poll, result in page]
+        next_cursor = (
+            page_cursor(page[COMPLETED_PAGE_SIZE - 1][0])
+            if len(page) > COMPLETED_PAGE_SIZE else None
+        )
+        return render_template('display_completed.html',
+                             polls=polls[:COMPLETED_PAGE_SIZE],
+                             total=total,
+                             page_size=COMPLETED_PAGE_SIZE,
+                             next_cursor=next_cursor)
 
     return app
 
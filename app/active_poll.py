@@ -0,0 +1,86 @@
+import threading
+import time
+from dataclasses import dataclass
+
+from sqlalchemy import true
+
+from app.models import Poll
+
+
+@dataclass(frozen=True)
+class PollSnapshot:
+    """Immutable copy of the fields the hot paths need from the active poll"""
+
+    id: int
+    question: str
+    answer_a: str
+    answer_b: str
+
+    @classmethod
+    def from_poll(cls, poll):
+        return cls(poll.id, poll.question, poll.answer_a, poll.answer_b)
+
+    def get_vote_counts(self, session):
+        """Get vote counts for this poll from its stored counters"""
+        count_a, count_b = session.query(Poll.count_a, Poll.count_b).filter_by(
+            id=self.id
+        ).one()
+        return {'A': count_a, 'B': count_b}
+
+
+_MISSING = object()
+
+
+class ActivePollCache:
+    """Process-level cache of the active poll.
+
+    Admin routes invalidate it whenever they change which poll is active or
+    what it says; the TTL only guards against changes made outside the app.
+    With a shared store, an invalidation in any worker process (seen as a new
+    epoch) also drops the snapshot cached here.
+    """
+
+    def __init__(self, ttl=5.0):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._snapshot = _MISSING
+        self._expires_at = 0.0
+        self._generation = 0
+        self._store = None
+        self._epoch = None
+
+    def share(self, store):
+        """Follow invalidations through a SharedStateStore (None for local only)"""
+        self._store = store
+        self.invalidate()
+
+    def get(self, session):
+        """Return a PollSnapshot of the active poll, or None if there is none"""
+        epoch = self._store.epoch() if self._store is not None else None
+        with self._lock:
+            if (self._snapshot is not _MISSING and time.monotonic() < self._expires_at
+                    and epoch == self._epoch):
+                return self._snapshot
+            generation = self._generation
+
+        poll = session.query(Poll).filter(Poll.is_active == true()).first()
+        snapshot = PollSnapshot.from_poll(poll) if poll else None
+
+        with self._lock:
+            # Don't let a load that raced an invalidation cache stale data
+            if generation == self._generation:
+                self._snapshot = snapshot
+                self._expires_at = time.monotonic() + self.ttl
+                self._epoch = epoch
+        return snapshot
+
+    def invalidate(self):
+        """Forget the cached snapshot so the next lookup reloads it"""
+        if self._store is not None:
+            self._store.bump_epoch()
+        with self._lock:
+            self._snapshot = _MISSING
+            self._generation += 1
+
+
+active_poll_cache = ActivePollCache()
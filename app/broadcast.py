@@ -0,0 +1,224 @@
+import atexit
+import logging
+import queue
+import threading
+import time
+
+from app.metrics import emit_seconds
+from app.tally import tally
+
+logger = logging.getLogger(__name__)
+
+
+def _socketio_emit(event, payload):
+    from app import socketio
+
+    socketio.emit(event, payload)
+
+
+class BroadcastDispatcher:
+    """Emits Socket.IO events from a background thread, in submission order.
+
+    Request handlers only enqueue, so the fan-out to every connected display
+    never adds to vote latency. When ``max_size`` events are already
+    waiting, new ones are dropped and counted; displays notice the missing
+    seq and re-sync over HTTP.
+    """
+
+    def __init__(self, emit=_socketio_emit, max_size=1000):
+        self._emit_fn = emit
+        self._lock = threading.Lock()
+        self._thread = None
+        self._queue = None
+        self._stats = {
+            'emitted': 0,
+            'failed': 0,
+            'dropped': 0,
+            'emit_seconds_total': 0.0,
+            'emit_seconds_max': 0.0,
+            'wait_seconds_total': 0.0,
+            'wait_seconds_max': 0.0,
+        }
+        self.configure(max_size)
+
+    def configure(self, max_size):
+        """Set the queue bound; a running dispatcher is drained and restarted"""
+        self.stop()
+        self._queue = queue.Queue(maxsize=max_size)
+
+    def submit(self, event, payload):
+        """Queue an event for emission; never blocks"""
+        self.start()
+        try:
+            self._queue.put_nowait((event, payload, time.perf_counter()))
+        except queue.Full:
+            with self._lock:
+                self._stats['dropped'] += 1
+            logger.warning('Broadcast queue full, dropped %s', event)
+
+    def stats(self):
+        """Queue depth plus emit counts and timings since startup"""
+        with self._lock:
+            return dict(self._stats, queue_depth=self._queue.qsize())
+
+    def _record(self, name, seconds):
+        self._stats[f'{name}_seconds_total'] += seconds
+        self._stats[f'{name}_seconds_max'] = max(self._stats[f'{name}_seconds_max'], seconds)
+
+    def _dispatch(self, event, payload, enqueued_at):
+        started = time.perf_counter()
+        try:
+            self._emit_fn(event, payload)
+            outcome = 'emitted'
+        except Exception:
+            logger.exception('Failed to broadcast %s for poll %s', event, payload.get('poll_id'))
+            outcome = 'failed'
+        finished = time.perf_counter()
+
+        with self._lock:
+            self._stats[outcome] += 1
+            self._record('wait', started - enqueued_at)
+            self._record('emit', finished - started)
+        emit_seconds.observe(finished - started)
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            self._dispatch(*item)
+
+    def start(self):
+        """Start the dispatcher thread (idempotent)"""
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(
+                target=self._run, name='broadcast-dispatcher', daemon=True
+            )
+            self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self):
+        """Emit whatever is queued, then stop the thread"""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(None)
+            thread.join()
+
+
+class VoteBroadcaster:
+    """Pushes vote counts to displays, at most one event per poll per window.
+
+    Each vote_cast event carries the poll's current counts and a sequence
+    number that increases by one per event, so a display can apply it
+    directly and only re-fetch over HTTP when it notices a gap.
+
+    The first vote for a poll is broadcast immediately and opens a window of
+    ``window_ms`` milliseconds. Votes arriving inside the window are merged
+    into a single trailing event sent when it closes, so the last vote always
+    reaches the displays. A window of 0 broadcasts every vote individually.
+
+    Events are handed to ``emit`` (the background dispatcher by default) in
+    sequence order. Several worker processes share one sequence through a
+    SharedStateStore.
+    Their events can still arrive out of order; displays treat that like any
+    other gap and re-sync.
+    """
+
+    def __init__(self, window_ms=150, emit=None):
+        self._lock = threading.Lock()
+        self._emit_lock = threading.Lock()
+        self._pending = {}
+        self._seq = 0
+        self._store = None
+        self._emit_fn = dispatcher.submit
+        self.configure(window_ms, emit)
+
+    def configure(self, window_ms, emit=None):
+        self.window = window_ms / 1000
+        if emit is not None:
+            self._emit_fn = emit
+
+    def share(self, store):
+        """Number events from a SharedStateStore, or in this process when None"""
+        self._store = store
+
+    @property
+    def seq(self):
+        """Sequence number of the most recent vote_cast event"""
+        if self._store is not None:
+            return self._store.seq()
+        return self._seq
+
+    def _next_seq(self):
+        if self._store is not None:
+            return self._store.next_seq()
+        self._seq += 1
+        return self._seq
+
+    def vote_cast(self, poll_id, counts, votes=1):
+        """Announce that votes were recorded; counts are the poll's totals after them"""
+        if self.window <= 0:
+            self._emit(poll_id, counts, votes)
+            return
+
+        with self._lock:
+            if poll_id in self._pending:
+                pending = self._pending[poll_id] or {'votes': 0}
+                pending['votes'] += votes
+                pending['counts'] = counts
+                self._pending[poll_id] = pending
+                return
+            self._pending[poll_id] = None
+
+        self._emit(poll_id, counts, votes)
+        self._schedule(poll_id)
+
+    def poll_activated(self, poll):
+        """Announce a newly active poll; poll is its display payload (or None)"""
+        with self._emit_lock:
+            # Carry the current seq so displays can keep applying vote_cast
+            # events without re-fetching
+            self._emit_fn('poll_activated', {
+                'poll_id': poll['id'] if poll else None,
+                'poll': poll,
+                'seq': self.seq,
+            })
+
+    def _schedule(self, poll_id):
+        timer = threading.Timer(self.window, self._close_window, args=(poll_id,))
+        timer.daemon = True
+        timer.start()
+
+    def _close_window(self, poll_id):
+        with self._lock:
+            pending = self._pending.pop(poll_id, None)
+            if pending:
+                # Keep throttling while votes keep arriving
+                self._pending[poll_id] = None
+
+        if pending:
+            self._emit(poll_id, pending['counts'], pending['votes'])
+            self._schedule(poll_id)
+
+    def _emit(self, poll_id, counts, votes):
+        # Sequence numbers must go out in order or every display would resync
+        with self._emit_lock:
+            # Prefer the live tally: requests can finish out of order, so the
+            # counts captured by the last caller are not necessarily the newest
+            counts = tally.peek(poll_id) or counts
+            self._emit_fn('vote_cast', {
+                'poll_id': poll_id,
+                'count_a': counts['A'],
+                'count_b': counts['B'],
+                'votes': votes,
+                'seq': self._next_seq(),
+            })
+
+
+dispatcher = BroadcastDispatcher()
+broadcaster = VoteBroadcaster()
@@ -0,0 +1,50 @@
+from datetime import timedelta
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+from app.compaction import compact_polls, reclaim_space
+from app.database import get_session
+from app.models import Poll, PollResult
+from app.tally import tally
+
+
+@click.command('reconcile-counts')
+@with_appcontext
+def reconcile_counts_command():
+    """Recompute stored poll vote counters and frozen results from the votes table"""
+    session = get_session()
+    Poll.reconcile_counts(session)
+    PollResult.freeze(session, [
+        poll_id for poll_id, in session.query(Poll.id).filter_by(is_active=False)
+    ])
+    session.commit()
+    tally.invalidate()
+    click.echo('Vote counters reconciled')
+
+
+@click.command('compact-votes')
+@click.option('--retention-days', type=float, default=None,
+              help='Compact polls completed longer ago than this (default: COMPACTION_RETENTION_DAYS)')
+@click.option('--vacuum/--no-vacuum', default=True,
+              help='Return freed pages to the filesystem afterwards')
+@with_appcontext
+def compact_votes_command(retention_days, vacuum):
+    """Replace raw votes of long-completed polls with per-bucket counts"""
+    config = current_app.config
+    if retention_days is None:
+        retention_days = config['COMPACTION_RETENTION_DAYS']
+
+    session = get_session()
+    compacted = compact_polls(
+        session,
+        timedelta(days=retention_days),
+        bucket_seconds=config['COMPACTION_BUCKET_SECONDS'],
+    )
+    for poll_id, deleted in compacted.items():
+        click.echo(f'Poll {poll_id}: compacted {deleted} votes')
+
+    if compacted and vacuum:
+        reclaim_space(session.get_bind())
+    click.echo(f'Compacted {len(compacted)} poll(s)')
@@ -0,0 +1,83 @@
+from datetime import datetime
+
+from sqlalchemy import case, delete, exists, false, func, select
+from sqlalchemy.dialects.sqlite import insert
+
+from app.models import Poll, Vote, VoteBucket
+from app.timeline import bucket_start
+
+
+def compactable_polls(session, retention, now=None):
+    """Ids of inactive polls with raw votes that were completed before the retention period"""
+    cutoff = (now or datetime.utcnow()) - retention
+    return [
+        poll_id for poll_id, in session.query(Poll.id).filter(
+            Poll.is_active == false(),
+            Poll.completed_at < cutoff,
+            exists().where(Vote.poll_id == Poll.id),
+        ).order_by(Poll.id)
+    ]
+
+
+def compact_poll(session, poll_id, bucket_seconds=1):
+    """Collapse a poll's raw votes into vote_buckets and delete them.
+
+    Buckets already present (from an earlier compaction of a poll that was
+    reactivated since) are added to rather than replaced. The poll's stored
+    counters and frozen results are left as they are: the totals do not
+    change, only where the votes behind them are kept.
+    """
+    votes = Vote.__table__
+    start = bucket_start(votes.c.timestamp, bucket_seconds)
+    aggregated = select(
+        votes.c.poll_id,
+        start,
+        func.sum(case((votes.c.answer == 'A', 1), else_=0)),
+        func.sum(case((votes.c.answer == 'B', 1), else_=0)),
+    ).where(votes.c.poll_id == poll_id).group_by(start)
+
+    buckets = VoteBucket.__table__
+    upsert = insert(buckets).from_select(
+        ['poll_id', 'bucket_start', 'count_a', 'count_b'], aggregated
+    )
+    session.execute(upsert.on_conflict_do_update(
+        index_elements=[buckets.c.poll_id, buckets.c.bucket_start],
+        set_={
+            'count_a': buckets.c.count_a + upsert.excluded.count_a,
+            'count_b': buckets.c.count_b + upsert.excluded.count_b,
+        },
+    ))
+    return session.execute(delete(votes).where(votes.c.poll_id == poll_id)).rowcount
+
+
+def reclaim_space(engine):
+    """Return pages freed by compaction to the filesystem.
+
+    Databases created with auto_vacuum=INCREMENTAL free pages in place;
+    older ones get one full VACUUM, which also switches them to incremental
+    mode when the connection profile asks for it. The WAL is truncated
+    afterwards, since a VACUUM copies the whole database through it.
+    """
+    with engine.connect() as connection:
+        connection = connection.execution_options(isolation_level='AUTOCOMMIT')
+        if connection.exec_driver_sql('PRAGMA auto_vacuum').scalar() == 2:
+            # Each step of the pragma frees one page, and execute() only takes
+            # one step; a script is stepped through to the end
+            connection.connection.dbapi_connection.executescript('PRAGMA incremental_vacuum;')
+        else:
+            connection.exec_driver_sql('VACUUM')
+        connection.exec_driver_sql('PRAGMA wal_checkpoint(TRUNCATE)').all()
+
+
+def compact_polls(session, retention, bucket_seconds=1, now=None):
+    """Compact every poll past the retention period, one transaction per poll.
+
+    Committing poll by poll keeps each write lock short, so votes for the
+    active poll are not held up behind a large archive. Returns
+    {poll_id: raw votes deleted}.
+    """
+    compacted = {}
+    for poll_id in compactable_polls(session, retention, now):
+        compacted[poll_id] = compact_poll(session, poll_id, bucket_seconds)
+        session.commit()
+    return compacted
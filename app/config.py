@@ -14,3 +14,78 @@ class Config:
     SECRET_KEY = os.getenv("SECRET_KEY", "dev-secret-key")
     SQLALCHEMY_DATABASE_URI = DATABASE_URL
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # SQLite storage profile, applied to every new connection. WAL lets the
+    # display readers run alongside vote writers; NORMAL sync is durable
+    # across application crashes and only fsyncs at WAL checkpoints.
+    SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+    SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+    SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+    # Vote writes that still find the database locked after the busy timeout
+    # are retried with a cooperative sleep for up to this long, then get a 503
+    SQLITE_LOCK_RETRY_MS = int(os.getenv("SQLITE_LOCK_RETRY_MS", "5000"))
+    SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+    # Negative values are KiB, positive values are pages
+    SQLITE_CACHE_SIZE = int(os.getenv("SQLITE_CACHE_SIZE", "-65536"))
+    # New databases free pages in place when compaction deletes votes
+    SQLITE_AUTO_VACUUM = os.getenv("SQLITE_AUTO_VACUUM", "INCREMENTAL")
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+    DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+
+    # Seconds before the cached active poll is re-read even without an admin change
+    ACTIVE_POLL_CACHE_TTL = float(os.getenv("ACTIVE_POLL_CACHE_TTL", "5"))
+    # Seconds before the in-memory vote counts are re-read from the stored counters
+    VOTE_TALLY_TTL = float(os.getenv("VOTE_TALLY_TTL", "5"))
+
+    # Vote timelines: completed polls kept in memory, and buckets per
+    # resolution held in memory for the active poll
+    TIMELINE_CACHE_SIZE = int(os.getenv("TIMELINE_CACHE_SIZE", "64"))
+    TIMELINE_LIVE_BUCKETS = int(os.getenv("TIMELINE_LIVE_BUCKETS", "300"))
+
+    # `flask compact-votes` replaces the raw votes of polls completed more
+    # than this many days ago with per-bucket counts of this many seconds
+    COMPACTION_RETENTION_DAYS = float(os.getenv("COMPACTION_RETENTION_DAYS", "30"))
+    COMPACTION_BUCKET_SECONDS = int(os.getenv("COMPACTION_BUCKET_SECONDS", "1"))
+
+    # Votes within this many milliseconds are merged into one vote_cast event
+    # per poll (0 broadcasts every vote)
+    VOTE_BROADCAST_WINDOW_MS = int(os.getenv("VOTE_BROADCAST_WINDOW_MS", "150"))
+    # Socket.IO events waiting for the background dispatcher; beyond this
+    # they are dropped and displays re-sync from the seq gap
+    BROADCAST_QUEUE_MAX_SIZE = int(os.getenv("BROADCAST_QUEUE_MAX_SIZE", "1000"))
+
+    # "sync" commits every vote inside its request; "batched" queues votes
+    # and bulk-inserts them from a background thread
+    VOTE_INGEST_MODE = os.getenv("VOTE_INGEST_MODE", "sync")
+    VOTE_BATCH_INTERVAL_MS = int(os.getenv("VOTE_BATCH_INTERVAL_MS", "100"))
+    VOTE_BATCH_SIZE = int(os.getenv("VOTE_BATCH_SIZE", "500"))
+    VOTE_QUEUE_MAX_SIZE = int(os.getenv("VOTE_QUEUE_MAX_SIZE", "10000"))
+    # Largest /api/votes/batch upload; a batch is one transaction holding the
+    # write lock, so bigger gateway buffers must be split
+    VOTE_BATCH_MAX_RECORDS = int(os.getenv("VOTE_BATCH_MAX_RECORDS", "1000"))
+
+    # Socket.IO server. "threading" is the Werkzeug development server used
+    # by app.main; app.serve runs ProductionConfig under gevent instead.
+    SOCKETIO_ASYNC_MODE = os.getenv("SOCKETIO_ASYNC_MODE", "threading")
+    SERVER_HOST = os.getenv("SERVER_HOST", "0.0.0.0")
+    SERVER_PORT = int(os.getenv("SERVER_PORT", "8080"))
+
+    # Running several worker processes: a Redis URL (e.g. redis://redis:6379/0)
+    # that relays Socket.IO events between workers, and one that holds the
+    # vote counts, broadcast seq and cache invalidations they all read.
+    # Unset keeps both inside the single process.
+    SOCKETIO_MESSAGE_QUEUE = os.getenv("SOCKETIO_MESSAGE_QUEUE") or None
+    COUNTER_STORE_URL = os.getenv("COUNTER_STORE_URL") or None
+
+
+class ProductionConfig(Config):
+    """Configuration for the app.serve production entry point"""
+
+    # One cooperative worker holds every display socket as a greenlet and
+    # upgrades them to native WebSocket instead of long-polling
+    SOCKETIO_ASYNC_MODE = os.getenv("SOCKETIO_ASYNC_MODE", "gevent")
+    # SQLite waits out a lock inside the sqlite3 call, which freezes every
+    # greenlet in the worker until it returns. Keep that wait short and let
+    # vote writes retry (see SQLITE_LOCK_RETRY_MS) with sleeps that yield;
+    # other writes, such as admin edits, fail sooner while a lock is held
+    SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5"))
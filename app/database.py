@@ -1,17 +1,77 @@
-from sqlalchemy import create_engine
+import time
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.orm import sessionmaker, scoped_session
+from sqlalchemy.pool import QueuePool
+from app.active_poll import active_poll_cache
+from app.migrations import run_migrations, schema_lock
 from app.models import Base
+from app.tally import tally
 
 _session = None
 
+# Backoff between attempts at a write while the database is locked
+LOCK_RETRY_MIN_SECONDS = 0.005
+LOCK_RETRY_MAX_SECONDS = 0.1
+
+
+def sqlite_pragmas(config):
+    """Build the SQLite PRAGMA profile from application config"""
+    return {
+        # Only takes effect before the first table is created (or at VACUUM)
+        'auto_vacuum': config['SQLITE_AUTO_VACUUM'],
+        'journal_mode': config['SQLITE_JOURNAL_MODE'],
+        'synchronous': config['SQLITE_SYNCHRONOUS'],
+        'busy_timeout': config['SQLITE_BUSY_TIMEOUT_MS'],
+        'mmap_size': config['SQLITE_MMAP_SIZE'],
+        'cache_size': config['SQLITE_CACHE_SIZE'],
+        'foreign_keys': 'ON',
+    }
+
+
+def _create_engine(database_url, pragmas=None, pool_size=None, pool_timeout=30):
+    url = make_url(database_url)
+    options = {'echo': False}
+    is_file_sqlite = url.get_backend_name() == 'sqlite' and url.database not in (None, '', ':memory:')
+
+    if is_file_sqlite and pool_size:
+        # One pooled connection per concurrent request instead of a connection
+        # per thread; WAL makes sharing the file between them safe
+        options.update(
+            poolclass=QueuePool,
+            pool_size=pool_size,
+            max_overflow=pool_size,
+            pool_timeout=pool_timeout,
+            connect_args={'check_same_thread': False},
+        )
+
+    engine = create_engine(url, **options)
+
+    if pragmas and url.get_backend_name() == 'sqlite':
+        @event.listens_for(engine, 'connect')
+        def set_sqlite_pragmas(dbapi_conn, connection_record):
+            cursor = dbapi_conn.cursor()
+            for name, value in pragmas.items():
+                cursor.execute(f'PRAGMA {name}={value}')
+            cursor.close()
 
-def init_db(database_url='sqlite:///votes.db'):
+    return engine
+
+
+def init_db(database_url='sqlite:///votes.db', pragmas=None, pool_size=None, pool_timeout=30):
     """Initialize the database"""
     global _session
-    engine = create_engine(database_url, echo=False)
-    Base.metadata.create_all(engine)
+    engine = _create_engine(database_url, pragmas, pool_size, pool_timeout)
+    # Workers starting together would otherwise race to create the same tables
+    with schema_lock(engine) as connection:
+        Base.metadata.create_all(connection)
+    run_migrations(engine)
     session_factory = sessionmaker(bind=engine)
     _session = scoped_session(session_factory)
+    tally.invalidate()
+    active_poll_cache.invalidate()
     return engine
 
 
@@ -19,3 +79,35 @@ def get_session():
     """Get the current database session"""
     return _session
 
+
+def remove_session(exception=None):
+    """Discard the current thread's session when an app context ends.
+
+    Rolls back anything left uncommitted, returns the connection to the pool
+    and drops the identity map, so a long-lived worker thread does not keep
+    every Poll and Vote it has ever touched.
+    """
+    if _session is not None:
+        _session.remove()
+
+
+def retry_while_locked(session, write, wait_seconds):
+    """Call ``write()`` until it stops raising OperationalError, or time runs out.
+
+    SQLite's own busy wait sleeps inside the sqlite3 call, which under gevent
+    stalls every greenlet in the worker, so ProductionConfig keeps it short
+    and writes wait here instead: the session is rolled back and ``write``
+    called again after a ``time.sleep`` that yields to the rest of the
+    worker. The last error is raised once ``wait_seconds`` have passed.
+    """
+    deadline = time.monotonic() + wait_seconds
+    delay = LOCK_RETRY_MIN_SECONDS
+    while True:
+        try:
+            return write()
+        except OperationalError:
+            session.rollback()
+            if time.monotonic() + delay > deadline:
+                raise
+        time.sleep(delay)
+        delay = min(delay * 2, LOCK_RETRY_MAX_SECONDS)
@@ -0,0 +1,155 @@
+import atexit
+import logging
+import queue
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+from sqlalchemy.exc import OperationalError
+
+from app.database import get_session
+from app.metrics import commit_seconds, votes_dropped, votes_ingested
+from app.models import Poll, Vote
+from app.tally import tally
+
+logger = logging.getLogger(__name__)
+
+# Backoff between attempts to write a batch while the database is busy
+RETRY_MIN_SECONDS = 0.05
+RETRY_MAX_SECONDS = 2.0
+
+
+class VoteIngestQueue:
+    """Write-behind queue that batches votes into bulk inserts.
+
+    Validated votes are queued in memory and counted as pending in the tally
+    straight away; a background thread writes them every ``interval_ms``
+    milliseconds or as soon as ``batch_size`` votes are waiting, trading one
+    commit per vote for one commit per batch.
+
+    The votes have already been acknowledged, so a batch that fails with an
+    OperationalError (typically ``database is locked``) is kept and retried
+    with backoff, ahead of anything queued after it. Only batches the
+    database rejects outright are dropped, and counted in votes_dropped_total.
+    """
+
+    def __init__(self, max_size=10000, batch_size=500, interval_ms=100):
+        self.configure(max_size, batch_size, interval_ms)
+        self._flush_lock = threading.Lock()
+        self._held = []
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def configure(self, max_size, batch_size, interval_ms):
+        """Set queue bounds and flush triggers (before the flusher starts)"""
+        self._queue = queue.Queue(maxsize=max_size)
+        self.batch_size = batch_size
+        self.interval = interval_ms / 1000
+
+    def submit(self, poll_id, answer):
+        """Queue a vote; raises queue.Full when the queue is at capacity"""
+        with tally.queueing(poll_id, answer):
+            self._queue.put_nowait((poll_id, answer, datetime.utcnow()))
+        if self._queue.qsize() >= self.batch_size:
+            self._wake.set()
+
+    def pending(self):
+        """Number of votes waiting to be written"""
+        return self._queue.qsize() + len(self._held)
+
+    def flush(self):
+        """Write up to one batch of queued votes and return how many were written.
+
+        Raises OperationalError if the database was busy; the batch is then
+        held and is the first one written by the next flush.
+        """
+        with self._flush_lock:
+            batch, self._held = self._held, []
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if batch:
+                try:
+                    self._write(batch)
+                except OperationalError:
+                    self._held = batch
+                    raise
+            return len(batch)
+
+    def _write(self, batch):
+        session = get_session()
+        rows = [
+            {'poll_id': poll_id, 'answer': answer, 'timestamp': timestamp}
+            for poll_id, answer, timestamp in batch
+        ]
+        votes = Counter((poll_id, answer) for poll_id, answer, _ in batch)
+        try:
+            with tally.settling(votes):
+                session.execute(Vote.__table__.insert(), rows)
+                connection = session.connection()
+                for poll_id in {poll_id for poll_id, _ in votes}:
+                    Poll.adjust_counts(
+                        connection, poll_id,
+                        votes[(poll_id, 'A')], votes[(poll_id, 'B')]
+                    )
+                with commit_seconds.time('queue'):
+                    session.commit()
+            votes_ingested.inc(len(batch), 'queue')
+        except OperationalError:
+            session.rollback()
+            raise
+        except Exception:
+            session.rollback()
+            tally.discard(votes)
+            votes_dropped.inc(len(batch))
+            logger.exception('Dropped a batch of %d votes', len(batch))
+
+    def drain(self):
+        """Write every queued vote, waiting out a busy database"""
+        delay = RETRY_MIN_SECONDS
+        while True:
+            try:
+                if not self.flush():
+                    return
+                delay = RETRY_MIN_SECONDS
+            except OperationalError as error:
+                logger.warning(
+                    'Could not write %d votes (%s), retrying in %.2fs',
+                    len(self._held), error.orig, delay,
+                )
+                time.sleep(delay)
+                delay = min(delay * 2, RETRY_MAX_SECONDS)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            self.drain()
+        get_session().remove()
+
+    def start(self):
+        """Start the background flusher (idempotent)"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name='vote-ingest', daemon=True
+        )
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self):
+        """Stop the flusher and write whatever is still queued"""
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        self.drain()
+
+
+vote_queue = VoteIngestQueue()
@@ -1,31 +1,24 @@
-from flask_socketio import emit
-
 from app import create_app, socketio
+from app.broadcast import broadcaster
 
 app = create_app()
 
 
-@socketio.on("connect")
-def handle_connect():
-    """Handle client connection"""
-    print("Client connected")
-
-
-@socketio.on("disconnect")
-def handle_disconnect():
-    """Handle client disconnection"""
-    print("Client disconnected")
-
-
-def emit_vote_cast(poll_id):
-    """Emit vote cast event to all connected clients"""
-    socketio.emit("vote_cast", {"poll_id": poll_id})
+def emit_vote_cast(poll_id, counts):
+    """Queue a vote cast event for all connected clients (coalesced)"""
+    broadcaster.vote_cast(poll_id, counts)
 
 
-def emit_poll_activated(poll_id):
-    """Emit poll activated event to all connected clients"""
-    socketio.emit("poll_activated", {"poll_id": poll_id})
+def emit_poll_activated(poll):
+    """Queue a poll activated event for all connected clients"""
+    broadcaster.poll_activated(poll)
 
 
 if __name__ == "__main__":
-    socketio.run(app, host="0.0.0.0", port=8080, debug=True, allow_unsafe_werkzeug=True)
+    socketio.run(
+        app,
+        host=app.config["SERVER_HOST"],
+        port=app.config["SERVER_PORT"],
+        debug=True,
+        allow_unsafe_werkzeug=True,
+    )
@@ -0,0 +1,254 @@
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+
+from flask import g, request
+from sqlalchemy.pool import QueuePool
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+LATENCY_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+
+class Metric:
+    """A Prometheus metric family with at most one label.
+
+    Recording never waits: observations are appended to a deque (safe
+    across threads and greenlets without a lock) and folded into the totals
+    by whoever reads them, or by the recording thread once ``fold_at``
+    have piled up and no one else is already folding.
+    """
+
+    kind = None
+
+    def __init__(self, name, help, label=None, fold_at=1024):
+        self.name = name
+        self.help = help
+        self.label = label
+        self.fold_at = fold_at
+        self._pending = deque()
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _record(self, label_value, value):
+        self._pending.append((label_value, value))
+        if len(self._pending) >= self.fold_at and self._lock.acquire(blocking=False):
+            try:
+                self._fold()
+            finally:
+                self._lock.release()
+
+    def _fold(self):
+        while True:
+            try:
+                label_value, value = self._pending.popleft()
+            except IndexError:
+                return
+            self._apply(label_value, value)
+
+    def _apply(self, label_value, value):
+        raise NotImplementedError
+
+    def collect(self):
+        """Current values by label value (None when unlabelled)"""
+        with self._lock:
+            self._fold()
+            return {key: self._copy(value) for key, value in self._values.items()}
+
+    def _copy(self, value):
+        return value
+
+    def reset(self):
+        with self._lock:
+            self._pending.clear()
+            self._values.clear()
+
+    def _labels(self, label_value, **extra):
+        pairs = [(self.label, label_value)] if self.label else []
+        pairs += extra.items()
+        if not pairs:
+            return ''
+        return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in pairs) + '}'
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+        for label_value, value in sorted(self.collect().items(), key=_sort_key):
+            lines.extend(self._samples(label_value, value))
+        return lines
+
+    def _samples(self, label_value, value):
+        return [f'{self.name}{self._labels(label_value)} {_format(value)}']
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, label_value=None):
+        self._record(label_value, amount)
+
+    def _apply(self, label_value, value):
+        self._values[label_value] = self._values.get(label_value, 0) + value
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def dec(self, amount=1, label_value=None):
+        self._record(label_value, -amount)
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help, label=None, buckets=LATENCY_BUCKETS, fold_at=1024):
+        super().__init__(name, help, label, fold_at)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, label_value=None):
+        self._record(label_value, value)
+
+    @contextmanager
+    def time(self, label_value=None):
+        """Observe the seconds taken by the block, unless it raises"""
+        started = time.perf_counter()
+        yield
+        self.observe(time.perf_counter() - started, label_value)
+
+    def _apply(self, label_value, value):
+        # Per-bucket counts plus [count, sum]; made cumulative when rendered
+        entry = self._values.get(label_value)
+        if entry is None:
+            entry = self._values[label_value] = [0] * (len(self.buckets) + 1) + [0.0]
+        entry[bisect_left(self.buckets, value)] += 1
+        entry[-1] += value
+
+    def _copy(self, value):
+        return list(value)
+
+    def _samples(self, label_value, value):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), value):
+            cumulative += count
+            le = '+Inf' if bound == float('inf') else _format(bound)
+            lines.append(f'{self.name}_bucket{self._labels(label_value, le=le)} {cumulative}')
+        lines.append(f'{self.name}_sum{self._labels(label_value)} {_format(value[-1])}')
+        lines.append(f'{self.name}_count{self._labels(label_value)} {cumulative}')
+        return lines
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format(value):
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+def _sort_key(item):
+    return '' if item[0] is None else str(item[0])
+
+
+request_seconds = Histogram(
+    'http_request_duration_seconds',
+    'Time to handle a request, by Flask endpoint',
+    label='endpoint',
+)
+votes_ingested = Counter(
+    'votes_ingested_total',
+    'Votes committed to the database, by ingestion path',
+    label='path',
+)
+votes_dropped = Counter(
+    'votes_dropped_total',
+    'Acknowledged votes dropped because their batch could not be written',
+)
+commit_seconds = Histogram(
+    'vote_commit_duration_seconds',
+    'Time to commit a transaction of votes, by ingestion path',
+    label='path',
+)
+socketio_clients = Gauge(
+    'socketio_connected_clients',
+    'Socket.IO clients currently connected to this process',
+)
+emit_seconds = Histogram(
+    'broadcast_emit_duration_seconds',
+    'Time to fan a Socket.IO event out to every connected client',
+)
+
+METRICS = (
+    request_seconds, votes_ingested, votes_dropped, commit_seconds, socketio_clients,
+    emit_seconds,
+)
+
+
+def reset():
+    """Zero every metric"""
+    for metric in METRICS:
+        metric.reset()
+
+
+def _gauge(name, help, value):
+    return [f'# HELP {name} {help}', f'# TYPE {name} gauge', f'{name} {_format(value)}']
+
+
+def _counter(name, help, value):
+    return [f'# HELP {name} {help}', f'# TYPE {name} counter', f'{name} {_format(value)}']
+
+
+def _dispatcher_samples(stats):
+    return (
+        _gauge('broadcast_queue_depth', 'Events waiting for the broadcast dispatcher',
+               stats['queue_depth'])
+        + _counter('broadcast_events_dropped_total', 'Events dropped because the queue was full',
+                   stats['dropped'])
+        + _counter('broadcast_events_failed_total', 'Events whose emit raised',
+                   stats['failed'])
+    )
+
+
+def _pool_samples(engine):
+    pool = engine.pool if engine is not None else None
+    if not isinstance(pool, QueuePool):
+        # In-memory and single-connection databases have nothing to report
+        return []
+    return (
+        _gauge('db_pool_size', 'Connections the pool keeps open', pool.size())
+        + _gauge('db_pool_checked_out', 'Pooled connections currently in use', pool.checkedout())
+        + _gauge('db_pool_checked_in', 'Pooled connections currently idle', pool.checkedin())
+        + _gauge('db_pool_overflow', 'Connections open beyond the pool size',
+                 max(pool.overflow(), 0))
+    )
+
+
+def render(dispatcher_stats, engine=None):
+    """Every metric in the Prometheus text exposition format"""
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    lines.extend(_dispatcher_samples(dispatcher_stats))
+    lines.extend(_pool_samples(engine))
+    return '\n'.join(lines) + '\n'
+
+
+def instrument(app):
+    """Time every request to ``app`` by its endpoint"""
+
+    @app.before_request
+    def start_request_timer():
+        g.request_started = time.perf_counter()
+
+    @app.teardown_request
+    def observe_request_time(exception=None):
+        started = g.pop('request_started', None)
+        if started is not None:
+            request_seconds.observe(
+                time.perf_counter() - started, request.endpoint or 'unmatched'
+            )
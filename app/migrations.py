@@ -0,0 +1,226 @@
+import logging
+from contextlib import contextmanager
+
+from sqlalchemy import false, func, inspect, text
+from sqlalchemy.orm import Session
+
+from app.models import Poll, PollResult, Vote
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS = []
+
+# How long a worker waits for another one to finish changing the schema
+SCHEMA_LOCK_TIMEOUT_MS = 10 * 60 * 1000
+
+
+def migration(version):
+    """Register a migration function under a schema version"""
+
+    def register(fn):
+        MIGRATIONS.append((version, fn))
+        MIGRATIONS.sort(key=lambda item: item[0])
+        return fn
+
+    return register
+
+
+def _columns(connection, table):
+    return {column['name'] for column in inspect(connection).get_columns(table)}
+
+
+def _create_indexes(connection, table):
+    for index in table.indexes:
+        index.create(connection, checkfirst=True)
+
+
+@migration(1)
+def add_poll_vote_counters(connection):
+    """Add stored count_a/count_b to polls and backfill them from votes"""
+    columns = _columns(connection, 'polls')
+    missing = [name for name in ('count_a', 'count_b') if name not in columns]
+    for name in missing:
+        connection.execute(text(
+            f'ALTER TABLE polls ADD COLUMN {name} INTEGER NOT NULL DEFAULT 0'
+        ))
+
+    if missing:
+        with Session(bind=connection) as session:
+            Poll.reconcile_counts(session)
+            session.flush()
+
+
+@migration(2)
+def add_hot_query_indexes(connection):
+    """Index votes by (poll_id, answer) and the active poll"""
+    _create_indexes(connection, Vote.__table__)
+    _create_indexes(connection, Poll.__table__)
+
+
+@migration(3)
+def freeze_completed_poll_results(connection):
+    """Snapshot final results for polls that were completed before poll_results"""
+    with Session(bind=connection) as session:
+        PollResult.freeze(session, [
+            poll_id for poll_id, in session.query(Poll.id).filter_by(is_active=False)
+        ])
+        session.flush()
+
+
+@migration(4)
+def add_timeline_index(connection):
+    """Index votes by (poll_id, timestamp) for vote timelines"""
+    _create_indexes(connection, Vote.__table__)
+
+
+@migration(5)
+def add_completed_polls_index(connection):
+    """Index polls by (is_active, created_at) for paging completed polls"""
+    _create_indexes(connection, Poll.__table__)
+
+
+@migration(6)
+def compact_vote_encoding(connection):
+    """Rebuild votes with 0/1 answers and integer epoch-millisecond timestamps.
+
+    SQLite cannot change a column's type in place, so the rows are copied
+    into a table created from the current model and the old one dropped.
+    Votes with answers other than A or B cannot be stored any more; their
+    polls' counters are recomputed without them, and the results of those
+    already completed frozen again, so every view agrees on the totals.
+    """
+    types = {
+        column['name']: str(column['type']).upper()
+        for column in inspect(connection).get_columns('votes')
+    }
+    if 'INT' in types['answer'] and 'INT' in types['timestamp']:
+        return
+
+    dropped = dict(connection.execute(text(
+        "SELECT poll_id, COUNT(*) FROM votes WHERE answer NOT IN ('A', 'B') GROUP BY poll_id"
+    )).all())
+
+    connection.execute(text('ALTER TABLE votes RENAME TO votes_legacy'))
+    for index in Vote.__table__.indexes:
+        connection.execute(text(f'DROP INDEX IF EXISTS {index.name}'))
+    Vote.__table__.create(connection)
+    connection.execute(text(
+        "INSERT INTO votes (id, poll_id, answer, timestamp) "
+        "SELECT id, poll_id, CASE answer WHEN 'A' THEN 0 ELSE 1 END, "
+        "CAST(strftime('%s', timestamp) AS INTEGER) * 1000 "
+        "+ CAST(substr(strftime('%f', timestamp), 4) AS INTEGER) "
+        "FROM votes_legacy WHERE answer IN ('A', 'B') ORDER BY id"
+    ))
+    connection.execute(text('DROP TABLE votes_legacy'))
+
+    if dropped:
+        logger.warning(
+            'Dropped %d votes with answers other than A or B, from polls %s',
+            sum(dropped.values()), ', '.join(str(poll_id) for poll_id in sorted(dropped)),
+        )
+        with Session(bind=connection) as session:
+            Poll.reconcile_counts(session, dropped)
+            PollResult.freeze(session, [
+                poll_id for poll_id, in session.query(Poll.id).filter(
+                    Poll.id.in_(list(dropped)), Poll.is_active == false()
+                )
+            ])
+            session.flush()
+
+
+@migration(7)
+def add_poll_completed_at(connection):
+    """Add polls.completed_at and backfill it for polls already completed.
+
+    The deactivation time was never recorded, so it is estimated by the
+    poll's last vote, falling back to when its results were frozen and
+    then to when it was created.
+    """
+    if 'completed_at' not in _columns(connection, 'polls'):
+        connection.execute(text('ALTER TABLE polls ADD COLUMN completed_at DATETIME'))
+
+    with Session(bind=connection) as session:
+        last_votes = dict(
+            session.query(Vote.poll_id, func.max(Vote.timestamp)).group_by(Vote.poll_id)
+        )
+        for poll in session.query(Poll).filter(
+            Poll.is_active == false(), Poll.completed_at.is_(None)
+        ):
+            poll.completed_at = (
+                last_votes.get(poll.id)
+                or (poll.result.computed_at if poll.result else None)
+                or poll.created_at
+            )
+        session.flush()
+
+
+@migration(8)
+def add_vote_timestamp_index(connection):
+    """Index votes by timestamp for exporting a time range across polls"""
+    _create_indexes(connection, Vote.__table__)
+
+
+def current_version(connection):
+    """Return the schema version recorded in the database (0 if none)"""
+    connection.execute(text(
+        'CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL)'
+    ))
+    return connection.execute(
+        text('SELECT MAX(version) FROM schema_version')
+    ).scalar() or 0
+
+
+@contextmanager
+def schema_lock(engine):
+    """A transaction that holds the database's write lock from its first statement.
+
+    Every worker process sets up the schema on startup; taking SQLite's
+    write lock with BEGIN IMMEDIATE makes them do it one at a time, and
+    anything read inside (such as the schema version) cannot change
+    underneath. Waits up to SCHEMA_LOCK_TIMEOUT_MS for the lock, since
+    another worker may be running a long migration.
+    """
+    with engine.connect() as connection:
+        if connection.dialect.name != 'sqlite':
+            with connection.begin():
+                yield connection
+            return
+
+        busy_timeout = connection.exec_driver_sql('PRAGMA busy_timeout').scalar()
+        connection.exec_driver_sql(f'PRAGMA busy_timeout = {SCHEMA_LOCK_TIMEOUT_MS}')
+        try:
+            connection.exec_driver_sql('BEGIN IMMEDIATE')
+            try:
+                yield connection
+            except BaseException:
+                connection.rollback()
+                raise
+            connection.commit()
+        finally:
+            connection.exec_driver_sql(f'PRAGMA busy_timeout = {busy_timeout}')
+
+
+def run_migrations(engine):
+    """Apply every migration newer than the recorded schema version.
+
+    create_all builds the current schema for new databases but never alters
+    existing tables; these migrations bring older databases forward. They are
+    no-ops on a freshly created schema, so this can run on every startup.
+    Each migration commits together with its version bump, so a failure
+    leaves the database at the last good version. The version is re-read
+    under the schema lock before each one, so workers starting together
+    apply each migration once.
+    """
+    applied = []
+    for target, fn in MIGRATIONS:
+        with schema_lock(engine) as connection:
+            if target <= current_version(connection):
+                continue
+            fn(connection)
+            connection.execute(text('DELETE FROM schema_version'))
+            connection.execute(
+                text('INSERT INTO schema_version (version) VALUES (:version)'),
+                {'version': target},
+            )
+        applied.append(target)
+    return applied
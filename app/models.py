@@ -1,9 +1,68 @@
-from datetime import datetime
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, func
+from datetime import datetime, timedelta
+from sqlalchemy import (
+    CheckConstraint, Column, Integer, SmallInteger, String, Boolean, DateTime, Float, ForeignKey,
+    Index, bindparam, delete, event, false, func, literal, or_, select, text, true, union_all,
+    update
+)
 from sqlalchemy.orm import declarative_base, relationship
+from sqlalchemy.types import TypeDecorator
 
 Base = declarative_base()
 
+EPOCH = datetime(1970, 1, 1)
+
+
+class Answer(TypeDecorator):
+    """Answer 'A' or 'B', stored as the small integer 0 or 1"""
+
+    impl = SmallInteger
+    cache_ok = True
+
+    LETTERS = ('A', 'B')
+    CODES = {letter: code for code, letter in enumerate(LETTERS)}
+
+    def process_bind_param(self, value, dialect):
+        # Anything else is passed through for the CHECK constraint to reject
+        return self.CODES.get(value, value)
+
+    def process_result_value(self, value, dialect):
+        # Rows not yet converted by migration 6 still hold the letter
+        if isinstance(value, int):
+            return self.LETTERS[value]
+        return value
+
+
+class EpochMillis(TypeDecorator):
+    """Naive UTC datetime, stored as integer milliseconds since the Unix epoch"""
+
+    impl = Integer
+    cache_ok = True
+
+    # What the database stores when no value is given
+    NOW = text(
+        "(CAST(strftime('%s', 'now') AS INTEGER) * 1000"
+        " + CAST(substr(strftime('%f', 'now'), 4) AS INTEGER))"
+    )
+
+    def process_bind_param(self, value, dialect):
+        if isinstance(value, datetime):
+            return (value - EPOCH) // timedelta(milliseconds=1)
+        return value
+
+    def process_result_value(self, value, dialect):
+        if isinstance(value, int):
+            return EPOCH + timedelta(milliseconds=value)
+        # Rows not yet converted by migration 6 still hold ISO text
+        if isinstance(value, str):
+            return datetime.fromisoformat(value)
+        return value
+
+    def coerce_compared_value(self, op, value):
+        # Arithmetic with plain numbers works on the stored milliseconds
+        if isinstance(value, datetime):
+            return self
+        return self.impl_instance
+
 
 class Poll(Base):
     __tablename__ = 'polls'
@@ -14,28 +73,203 @@ class Poll(Base):
     answer_b = Column(String, nullable=False)
     is_active = Column(Boolean, default=False, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    count_a = Column(Integer, default=0, server_default='0', nullable=False)
+    count_b = Column(Integer, default=0, server_default='0', nullable=False)
+    # When the poll last stopped being active; NULL while active or never run
+    completed_at = Column(DateTime)
+
+    # The database cascades deletes to votes and results; passive_deletes
+    # keeps the ORM from loading every vote just to delete it
+    votes = relationship(
+        'Vote', back_populates='poll', cascade='all, delete-orphan', passive_deletes=True
+    )
+    result = relationship(
+        'PollResult', uselist=False, back_populates='poll', cascade='all, delete-orphan',
+        passive_deletes=True,
+    )
 
-    votes = relationship('Vote', back_populates='poll', cascade='all, delete-orphan')
+    __table_args__ = (
+        # Partial index: only the (at most one) active poll is indexed, so the
+        # active-poll lookup is a single index probe regardless of poll count.
+        # Queries must compare against a literal true() for SQLite to use it.
+        Index(
+            'ix_polls_active', is_active,
+            sqlite_where=is_active == true(),
+            postgresql_where=is_active == true(),
+        ),
+        # Completed polls are paged newest first by (created_at, id); the
+        # rowid rides along in the index, so each page is one range scan
+        Index('ix_polls_is_active_created_at', is_active, created_at),
+    )
 
     @staticmethod
     def activate_poll(session, poll_id):
-        """Activate a poll and deactivate all others"""
-        session.query(Poll).update({'is_active': False})
+        """Activate a poll and deactivate all others.
+
+        Polls that stop being active get their final results frozen into
+        poll_results; the newly active poll's snapshot is dropped because
+        its counts are live again.
+        """
+        deactivated = [
+            id_ for id_, in session.query(Poll.id).filter(Poll.is_active == true())
+        ]
+        session.query(Poll).filter(Poll.is_active == true()).update(
+            {'is_active': False, 'completed_at': datetime.utcnow()}
+        )
+        PollResult.freeze(session, [id_ for id_ in deactivated if id_ != poll_id])
+
         poll = session.query(Poll).filter_by(id=poll_id).first()
         if poll:
             poll.is_active = True
+            poll.completed_at = None
+            session.query(PollResult).filter_by(poll_id=poll_id).delete()
 
-    def get_vote_counts(self, session):
-        """Get vote counts for this poll"""
-        votes_a = session.query(func.count(Vote.id)).filter_by(
-            poll_id=self.id, answer='A'
-        ).scalar() or 0
+    @staticmethod
+    def delete_polls(session, poll_ids):
+        """Delete polls with their votes, vote buckets and results, one DELETE per table.
+
+        Votes are deleted explicitly rather than left to ON DELETE CASCADE so
+        databases created before the cascade was declared behave the same.
+        Returns the number of polls deleted.
+        """
+        poll_ids = list(poll_ids)
+        if not poll_ids:
+            return 0
+
+        for table, column in (
+            (Vote.__table__, Vote.__table__.c.poll_id),
+            (PollResult.__table__, PollResult.__table__.c.poll_id),
+            (VoteBucket.__table__, VoteBucket.__table__.c.poll_id),
+        ):
+            session.execute(delete(table).where(column.in_(poll_ids)))
+        return session.execute(
+            delete(Poll.__table__).where(Poll.__table__.c.id.in_(poll_ids))
+        ).rowcount
+
+    @staticmethod
+    def completed_page(session, after=None, limit=4):
+        """Return up to limit inactive polls with their frozen results, newest first.
+
+        Keyset pagination: ``after`` is the (created_at, id) of the last poll
+        on the previous page, so each page costs the same however deep it is.
+        Returns a list of (Poll, PollResult or None) pairs.
+        """
+        query = session.query(Poll, PollResult).outerjoin(PollResult).filter(
+            Poll.is_active == false()
+        )
+        if after is not None:
+            created_at, poll_id = after
+            query = query.filter(
+                Poll.created_at <= created_at,
+                or_(Poll.created_at < created_at, Poll.id < poll_id),
+            )
+        return query.order_by(Poll.created_at.desc(), Poll.id.desc()).limit(limit).all()
+
+    @staticmethod
+    def adjust_counts(connection, poll_id, delta_a=0, delta_b=0):
+        """Shift the stored counters of a poll inside the current transaction"""
+        connection.execute(
+            update(Poll.__table__)
+            .where(Poll.__table__.c.id == poll_id)
+            .values(
+                count_a=Poll.__table__.c.count_a + delta_a,
+                count_b=Poll.__table__.c.count_b + delta_b,
+            )
+        )
+
+    @staticmethod
+    def count_votes(session, poll_ids):
+        """Aggregate vote counts for many polls with a single GROUP BY query.
+
+        Votes of compacted polls are counted from their vote_buckets.
+        Returns {poll_id: {'A': int, 'B': int}}, including zeroes for polls
+        without votes.
+        """
+        counts = {poll_id: {'A': 0, 'B': 0} for poll_id in poll_ids}
+        if not counts:
+            return counts
+
+        poll_ids = list(counts)
+        buckets = VoteBucket.__table__
+        rows = session.execute(union_all(
+            select(Vote.poll_id, Vote.answer, func.count(Vote.id))
+            .where(Vote.poll_id.in_(poll_ids))
+            .group_by(Vote.poll_id, Vote.answer),
+            *(
+                select(buckets.c.poll_id, literal(answer), func.sum(column))
+                .where(buckets.c.poll_id.in_(poll_ids))
+                .group_by(buckets.c.poll_id)
+                for answer, column in (('A', buckets.c.count_a), ('B', buckets.c.count_b))
+            ),
+        ))
+
+        for poll_id, answer, count in rows:
+            if answer in counts[poll_id]:
+                counts[poll_id][answer] += count
+        return counts
+
+    @staticmethod
+    def set_vote_counts(session, poll_id, count_a, count_b):
+        """Add or remove votes so the poll has exactly count_a A and count_b B votes.
 
-        votes_b = session.query(func.count(Vote.id)).filter_by(
-            poll_id=self.id, answer='B'
-        ).scalar() or 0
+        Only the difference is written: missing votes are bulk-inserted and
+        surplus ones bulk-deleted, newest first, so the votes left in place
+        keep their timestamps. Once a compacted poll runs out of raw votes,
+        the rest are taken from its newest buckets. The write lock is taken
+        before counting, so a live vote committed meanwhile is counted rather
+        than lost.
+        """
+        connection = session.connection()
+        # A no-op write opens the write transaction before the votes are counted
+        Poll.adjust_counts(connection, poll_id)
+        current = Poll.count_votes(session, [poll_id])[poll_id]
 
-        return {'A': votes_a, 'B': votes_b}
+        now = datetime.utcnow()
+        votes = Vote.__table__
+        for answer, target in (('A', count_a), ('B', count_b)):
+            missing = target - current[answer]
+            if missing > 0:
+                session.execute(
+                    votes.insert(),
+                    [{'poll_id': poll_id, 'answer': answer, 'timestamp': now}] * missing
+                )
+            elif missing < 0:
+                surplus = select(votes.c.id).where(
+                    votes.c.poll_id == poll_id, votes.c.answer == answer
+                ).order_by(votes.c.id.desc()).limit(-missing)
+                deleted = session.execute(delete(votes).where(votes.c.id.in_(surplus))).rowcount
+                VoteBucket.remove(session, poll_id, answer, -missing - deleted)
+
+        session.execute(
+            update(Poll.__table__)
+            .where(Poll.__table__.c.id == poll_id)
+            .values(count_a=count_a, count_b=count_b)
+        )
+
+    @staticmethod
+    def reconcile_counts(session, poll_ids=None):
+        """Recompute the stored counters of the given polls (default all) from their votes"""
+        query = session.query(Poll.id)
+        if poll_ids is not None:
+            query = query.filter(Poll.id.in_(list(poll_ids)))
+        poll_ids = [poll_id for poll_id, in query]
+        counts = Poll.count_votes(session, poll_ids)
+        if not counts:
+            return
+
+        session.execute(
+            update(Poll.__table__)
+            .where(Poll.__table__.c.id == bindparam('poll_id'))
+            .values(count_a=bindparam('a'), count_b=bindparam('b')),
+            [
+                {'poll_id': poll_id, 'a': votes['A'], 'b': votes['B']}
+                for poll_id, votes in counts.items()
+            ]
+        )
+
+    def get_vote_counts(self, session):
+        """Get vote counts for this poll from its stored counters"""
+        return {'A': self.count_a, 'B': self.count_b}
 
     def __repr__(self):
         return f'<Poll {self.id}: {self.question}>'
@@ -45,12 +279,133 @@ class Vote(Base):
     __tablename__ = 'votes'
 
     id = Column(Integer, primary_key=True)
-    poll_id = Column(Integer, ForeignKey('polls.id'), nullable=False)
-    answer = Column(String, nullable=False)
-    timestamp = Column(DateTime, default=datetime.utcnow, nullable=False)
+    poll_id = Column(Integer, ForeignKey('polls.id', ondelete='CASCADE'), nullable=False)
+    answer = Column(Answer, nullable=False)
+    # Set by the database on insert unless given (e.g. by buffered clients)
+    timestamp = Column(EpochMillis, server_default=EpochMillis.NOW, nullable=False)
 
     poll = relationship('Poll', back_populates='votes')
 
+    __table_args__ = (
+        CheckConstraint('answer IN (0, 1)', name='ck_votes_answer'),
+        Index('ix_votes_poll_id_answer', 'poll_id', 'answer'),
+        # Timeline queries bucket one poll's votes by time
+        Index('ix_votes_poll_id_timestamp', 'poll_id', 'timestamp'),
+        # Exports of a time range across polls read it in time order
+        Index('ix_votes_timestamp', 'timestamp'),
+    )
+
     def __repr__(self):
         return f'<Vote {self.id}: Poll {self.poll_id} -> {self.answer}>'
 
+
+class VoteBucket(Base):
+    """Vote counts of a compacted poll for one time bucket, replacing its raw votes"""
+
+    __tablename__ = 'vote_buckets'
+
+    poll_id = Column(Integer, ForeignKey('polls.id', ondelete='CASCADE'), primary_key=True)
+    # Start of the bucket in Unix seconds (UTC)
+    bucket_start = Column(Integer, primary_key=True)
+    count_a = Column(Integer, default=0, nullable=False)
+    count_b = Column(Integer, default=0, nullable=False)
+
+    @staticmethod
+    def remove(session, poll_id, answer, amount):
+        """Take amount votes for answer out of a poll's buckets, newest first"""
+        if amount <= 0:
+            return
+
+        buckets = VoteBucket.__table__
+        column = buckets.c.count_a if answer == 'A' else buckets.c.count_b
+        rows = session.execute(
+            select(buckets.c.bucket_start, column)
+            .where(buckets.c.poll_id == poll_id, column > 0)
+            .order_by(buckets.c.bucket_start.desc())
+        )
+
+        updates = []
+        for bucket_start, count in rows:
+            taken = min(count, amount)
+            updates.append({'start': bucket_start, 'remaining': count - taken})
+            amount -= taken
+            if not amount:
+                break
+
+        if updates:
+            session.execute(
+                update(buckets)
+                .where(buckets.c.poll_id == poll_id, buckets.c.bucket_start == bindparam('start'))
+                .values({column.name: bindparam('remaining')}),
+                updates,
+            )
+
+
+class PollResult(Base):
+    """Frozen final results of a poll that is no longer active"""
+
+    __tablename__ = 'poll_results'
+
+    poll_id = Column(Integer, ForeignKey('polls.id', ondelete='CASCADE'), primary_key=True)
+    count_a = Column(Integer, nullable=False)
+    count_b = Column(Integer, nullable=False)
+    total = Column(Integer, nullable=False)
+    percent_a = Column(Float, nullable=False)
+    percent_b = Column(Float, nullable=False)
+    computed_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    poll = relationship('Poll', back_populates='result')
+
+    @staticmethod
+    def summarize(count_a, count_b):
+        """Counts, total and percentages in the shape the results views use"""
+        total = count_a + count_b
+        return {
+            'count_a': count_a,
+            'count_b': count_b,
+            'total': total,
+            'percent_a': (count_a / total) * 100 if total else 0,
+            'percent_b': (count_b / total) * 100 if total else 0,
+        }
+
+    @staticmethod
+    def freeze(session, poll_ids):
+        """(Re)write the snapshots of the given polls from their stored counters"""
+        poll_ids = list(poll_ids)
+        if not poll_ids:
+            return
+
+        counters = session.query(Poll.id, Poll.count_a, Poll.count_b).filter(
+            Poll.id.in_(poll_ids)
+        ).all()
+        session.query(PollResult).filter(PollResult.poll_id.in_(poll_ids)).delete()
+        if counters:
+            session.execute(PollResult.__table__.insert(), [
+                {'poll_id': poll_id, **PollResult.summarize(count_a, count_b)}
+                for poll_id, count_a, count_b in counters
+            ])
+
+    def as_dict(self):
+        return {
+            'count_a': self.count_a,
+            'count_b': self.count_b,
+            'total': self.total,
+            'percent_a': self.percent_a,
+            'percent_b': self.percent_b,
+        }
+
+
+def _count_deltas(answer, amount):
+    return (amount, 0) if answer == 'A' else (0, amount)
+
+
+@event.listens_for(Vote, 'after_insert')
+def _increment_poll_counts(mapper, connection, target):
+    """Keep Poll counters in step with ORM vote inserts"""
+    Poll.adjust_counts(connection, target.poll_id, *_count_deltas(target.answer, 1))
+
+
+@event.listens_for(Vote, 'after_delete')
+def _decrement_poll_counts(mapper, connection, target):
+    """Keep Poll counters in step with ORM vote deletes"""
+    Poll.adjust_counts(connection, target.poll_id, *_count_deltas(target.answer, -1))
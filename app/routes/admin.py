@@ -1,7 +1,15 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash
+from flask import Blueprint, Response, render_template, request, redirect, url_for, flash, jsonify
+from sqlalchemy import false
+from app.active_poll import active_poll_cache
+from app.broadcast import broadcaster, dispatcher
 from app.middleware.auth import require_admin_secret
 from app.database import get_session
-from app.models import Poll, Vote
+from app.export import FORMATS, export_chunks, vote_rows
+from app.ingest import vote_queue
+from app.models import Poll, PollResult
+from app.tally import tally
+from app.utils.responses import format_poll_response
+from app.utils.timestamps import parse_timestamp
 
 admin_bp = Blueprint('admin', __name__, template_folder='../../templates')
 
@@ -59,14 +67,20 @@ def activate_poll(poll_id):
     """Activate a poll and deactivate all others"""
     session = get_session()
 
+    # Write queued votes first so the outgoing poll's frozen results include them
+    vote_queue.drain()
     Poll.activate_poll(session, poll_id)
     session.commit()
+    tally.invalidate()
+    active_poll_cache.invalidate()
 
-    try:
-        from app import socketio
-        socketio.emit('poll_activated', {'poll_id': poll_id})
-    except:
-        pass
+    # Send the new poll with the event so displays can swap it in place
+    active_poll = active_poll_cache.get(session)
+    if active_poll:
+        counts = tally.get_counts(active_poll, session)
+        broadcaster.poll_activated(format_poll_response(active_poll, session, counts)['poll'])
+    else:
+        broadcaster.poll_activated(None)
 
     flash('Poll activated')
     return redirect(url_for('admin.index', secret=request.args.get('secret')))
@@ -88,13 +102,44 @@ def delete_poll(poll_id):
         flash('Cannot delete active poll. Deactivate it first.')
         return redirect(url_for('admin.index', secret=request.args.get('secret')))
 
-    session.delete(poll)
+    Poll.delete_polls(session, [poll_id])
     session.commit()
+    tally.invalidate(poll_id)
+    active_poll_cache.invalidate()
 
     flash('Poll deleted successfully')
     return redirect(url_for('admin.index', secret=request.args.get('secret')))
 
 
+@admin_bp.route('/polls/delete', methods=['POST'])
+@require_admin_secret
+def delete_polls():
+    """Delete the selected polls and their votes; the active poll is skipped"""
+    session = get_session()
+
+    try:
+        selected = [int(poll_id) for poll_id in request.form.getlist('poll_ids')]
+    except ValueError:
+        flash('Invalid poll selection')
+        return redirect(url_for('admin.index', secret=request.args.get('secret')))
+
+    poll_ids = [
+        poll_id for poll_id, in session.query(Poll.id).filter(
+            Poll.id.in_(selected), Poll.is_active == false()
+        )
+    ]
+    deleted = Poll.delete_polls(session, poll_ids)
+    session.commit()
+    for poll_id in poll_ids:
+        tally.invalidate(poll_id)
+    active_poll_cache.invalidate()
+
+    if len(poll_ids) < len(set(selected)):
+        flash('Skipped polls that are active or no longer exist')
+    flash(f'Deleted {deleted} poll(s)')
+    return redirect(url_for('admin.index', secret=request.args.get('secret')))
+
+
 @admin_bp.route('/polls/<int:poll_id>/edit', methods=['GET'])
 @require_admin_secret
 def edit_poll(poll_id):
@@ -135,6 +180,7 @@ def update_poll(poll_id):
     poll.answer_b = answer_b
 
     session.commit()
+    active_poll_cache.invalidate()
 
     flash('Poll updated successfully')
     return redirect(url_for('admin.index', secret=request.args.get('secret')))
@@ -165,7 +211,7 @@ def edit_votes(poll_id):
 @admin_bp.route('/polls/<int:poll_id>/edit-votes', methods=['POST'])
 @require_admin_secret
 def update_votes(poll_id):
-    """Update vote counts by adding or removing Vote records"""
+    """Update vote counts by adding or removing only the differing Vote records"""
     session = get_session()
 
     poll = session.query(Poll).filter_by(id=poll_id).first()
@@ -197,28 +243,74 @@ def update_votes(poll_id):
             count_b=counts['B']
         )
 
-    # Get current counts
-    current_counts = poll.get_vote_counts(session)
-    current_a = current_counts['A']
-    current_b = current_counts['B']
-
-    # Delete all existing votes for this poll
-    session.query(Vote).filter_by(poll_id=poll_id).delete()
-
-    # Add new votes to match desired counts
-    from datetime import datetime
-    for _ in range(new_count_a):
-        session.add(Vote(poll_id=poll_id, answer='A'))
+    # Write only the difference, so untouched votes keep their timestamps
+    Poll.set_vote_counts(session, poll_id, new_count_a, new_count_b)
 
-    for _ in range(new_count_b):
-        session.add(Vote(poll_id=poll_id, answer='B'))
+    if not poll.is_active:
+        PollResult.freeze(session, [poll_id])
 
     session.commit()
+    tally.invalidate(poll_id)
+
+    if poll.is_active:
+        # Displays only redraw on events, so push the edited totals to them
+        broadcaster.vote_cast(poll_id, tally.get_counts(poll, session), votes=0)
 
     flash('Vote counts updated successfully')
     return redirect(url_for('admin.index', secret=request.args.get('secret')))
 
 
+@admin_bp.route('/broadcast/stats')
+@require_admin_secret
+def broadcast_stats():
+    """Queue depth and emit latency of the background broadcast dispatcher"""
+    return jsonify(dispatcher.stats())
+
+
+@admin_bp.route('/export/votes')
+@require_admin_secret
+def export_votes():
+    """Stream raw votes of one poll, or of a time range across polls.
+
+    Query parameters: format (csv or ndjson), poll_id, and start/end as ISO
+    8601 timestamps (start inclusive, end exclusive). At least a poll or a
+    range bound is required.
+    """
+    session = get_session()
+
+    fmt = request.args.get('format', 'csv')
+    if fmt not in FORMATS:
+        return jsonify({'success': False, 'error': 'Invalid format. Must be csv or ndjson'}), 400
+
+    try:
+        poll_id = request.args.get('poll_id')
+        poll_id = int(poll_id) if poll_id else None
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Invalid poll_id'}), 400
+
+    bounds = {}
+    for name in ('start', 'end'):
+        value = request.args.get(name)
+        try:
+            bounds[name] = parse_timestamp(value) if value else None
+        except ValueError:
+            return jsonify({'success': False, 'error': f'Invalid {name}. Must be ISO 8601'}), 400
+
+    if poll_id is None and bounds['start'] is None and bounds['end'] is None:
+        return jsonify({'success': False, 'error': 'poll_id or a start/end range is required'}), 400
+
+    if poll_id is not None and session.get(Poll, poll_id) is None:
+        return jsonify({'success': False, 'error': 'Poll not found'}), 404
+
+    rows = vote_rows(session.get_bind(), poll_id=poll_id, **bounds)
+    filename = f'votes-poll-{poll_id}.{fmt}' if poll_id is not None else f'votes.{fmt}'
+    return Response(
+        export_chunks(rows, fmt),
+        mimetype=FORMATS[fmt],
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'},
+    )
+
+
 @admin_bp.route('/test')
 @require_admin_secret
 def test_route():
@@ -1,12 +1,35 @@
-from flask import Blueprint, jsonify, render_template, request
+import queue
+from collections import Counter
+from datetime import datetime
 
-from app.database import get_session
+from flask import Blueprint, current_app, jsonify, render_template, request
+from sqlalchemy.exc import OperationalError
+
+from app.active_poll import active_poll_cache
+from app.broadcast import broadcaster
+from app.database import get_session, retry_while_locked
+from app.ingest import vote_queue
+from app.metrics import commit_seconds, votes_ingested
 from app.middleware.auth import require_vote_password
-from app.models import Poll, Vote
-from app.utils.responses import format_poll_response
+from app.models import Poll, PollResult, Vote
+from app.tally import tally
+from app.timeline import BUCKETS, live_timeline, query_timeline, timeline_cache
+from app.utils.responses import (
+    COMPLETED_PAGE_SIZE,
+    VersionedPayload,
+    format_completed_poll,
+    format_poll_response,
+    page_cursor,
+    parse_page_cursor,
+)
+from app.utils.timestamps import parse_timestamp
 
 api_bp = Blueprint("api", __name__, template_folder="../../templates")
 
+display_payload = VersionedPayload()
+
+MAX_COMPLETED_PAGE_SIZE = 50
+
 
 @api_bp.route("/vote", methods=["POST"])
 @require_vote_password
@@ -24,32 +47,218 @@ def vote():
             400,
         )
 
-    active_poll = session.query(Poll).filter_by(is_active=True).first()
+    active_poll = active_poll_cache.get(session)
 
     if not active_poll:
         return jsonify({"success": False, "error": "No active poll"}), 400
 
-    vote = Vote(poll_id=active_poll.id, answer=answer)
-    session.add(vote)
-    session.commit()
+    if current_app.config["VOTE_INGEST_MODE"] == "batched":
+        try:
+            vote_queue.submit(active_poll.id, answer)
+        except queue.Full:
+            return jsonify({"success": False, "error": "Vote queue is full"}), 503
+    else:
+        def write():
+            session.add(Vote(poll_id=active_poll.id, answer=answer))
+            with tally.recording(active_poll.id, answer), commit_seconds.time("single"):
+                session.commit()
+
+        try:
+            retry_while_locked(session, write, current_app.config["SQLITE_LOCK_RETRY_MS"] / 1000)
+        except OperationalError:
+            return jsonify({"success": False, "error": "Database is busy"}), 503
+        votes_ingested.inc(1, "single")
+
+    counts = tally.get_counts(active_poll, session)
+    broadcaster.vote_cast(active_poll.id, counts)
+
+    return jsonify(format_poll_response(active_poll, session, counts)), 200
+
+
+@api_bp.route("/votes/batch", methods=["POST"])
+@require_vote_password
+def vote_batch():
+    """Register a batch of buffered votes for the active poll in one commit"""
+    session = get_session()
+
+    records = request.get_json(silent=True)
+    if not isinstance(records, list) or not records:
+        return (
+            jsonify({"success": False, "error": "Body must be a non-empty array of votes"}),
+            400,
+        )
+
+    max_records = current_app.config["VOTE_BATCH_MAX_RECORDS"]
+    if len(records) > max_records:
+        return (
+            jsonify({
+                "success": False,
+                "error": f"Batch too large. At most {max_records} votes per request",
+            }),
+            413,
+        )
+
+    active_poll = active_poll_cache.get(session)
+
+    if not active_poll:
+        return jsonify({"success": False, "error": "No active poll"}), 400
+
+    now = datetime.utcnow()
+    rows = []
+    for index, record in enumerate(records):
+        answer = record.get("answer") if isinstance(record, dict) else None
+        if answer not in ["A", "B"]:
+            return (
+                jsonify({
+                    "success": False,
+                    "error": f"Invalid answer at index {index}. Must be A or B",
+                }),
+                400,
+            )
+
+        timestamp = record.get("timestamp")
+        try:
+            timestamp = parse_timestamp(timestamp) if timestamp else now
+        except (TypeError, ValueError, AttributeError):
+            return (
+                jsonify({
+                    "success": False,
+                    "error": f"Invalid timestamp at index {index}. Must be ISO 8601",
+                }),
+                400,
+            )
+
+        rows.append({"poll_id": active_poll.id, "answer": answer, "timestamp": timestamp})
+
+    count_a = sum(1 for row in rows if row["answer"] == "A")
+    count_b = len(rows) - count_a
+
+    # Buffered votes carry their own times, so live timelines can place them
+    votes = Counter((row["answer"], row["timestamp"]) for row in rows)
+
+    def write():
+        session.execute(Vote.__table__.insert(), rows)
+        Poll.adjust_counts(session.connection(), active_poll.id, count_a, count_b)
+        with tally.recording_batch(active_poll.id, votes), commit_seconds.time("batch"):
+            session.commit()
 
     try:
-        from app import socketio
+        retry_while_locked(session, write, current_app.config["SQLITE_LOCK_RETRY_MS"] / 1000)
+    except OperationalError:
+        return jsonify({"success": False, "error": "Database is busy"}), 503
+    votes_ingested.inc(len(rows), "batch")
 
-        socketio.emit("vote_cast", {"poll_id": active_poll.id})
-    except:
-        pass
+    counts = tally.get_counts(active_poll, session)
+    broadcaster.vote_cast(active_poll.id, counts, votes=len(rows))
 
-    return jsonify(format_poll_response(active_poll, session)), 200
+    response = format_poll_response(active_poll, session, counts)
+    response["accepted"] = len(rows)
+    return jsonify(response), 200
 
 
 @api_bp.route("/display/data")
 def display_data():
-    """Get current active poll data for display"""
+    """Get current active poll data for display.
+
+    The body is cached per (active poll, tally version, broadcast seq) and
+    served with a strong ETag, so idle displays get a 304 Not Modified.
+    """
     session = get_session()
-    active_poll = session.query(Poll).filter_by(is_active=True).first()
+    active_poll = active_poll_cache.get(session)
 
-    if not active_poll:
-        return jsonify({"poll": None}), 200
+    # Read the sequence number and tally version before the counts, so a vote
+    # racing this response makes the key stale rather than the body
+    seq = broadcaster.seq
+    key = (active_poll, tally.version, seq)
+
+    def build():
+        if not active_poll:
+            return {"poll": None}
+        counts = tally.get_counts(active_poll, session)
+        payload = format_poll_response(active_poll, session, counts)
+        payload["seq"] = seq
+        return payload
+
+    body, etag = display_payload.get(key, build)
+
+    response = current_app.response_class(body, mimetype="application/json")
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "no-cache"
+    return response.make_conditional(request)
+
+
+@api_bp.route("/polls/completed")
+def completed_polls():
+    """Get one page of completed polls, newest first.
+
+    Pass the ``next`` cursor of a page as ``after`` to get the page that
+    follows it; ``next`` is null on the last page.
+    """
+    session = get_session()
+
+    try:
+        limit = int(request.args.get("limit", COMPLETED_PAGE_SIZE))
+    except ValueError:
+        limit = 0
+    if not 1 <= limit <= MAX_COMPLETED_PAGE_SIZE:
+        return (
+            jsonify({
+                "success": False,
+                "error": f"Invalid limit. Must be between 1 and {MAX_COMPLETED_PAGE_SIZE}",
+            }),
+            400,
+        )
+
+    after = request.args.get("after")
+    if after:
+        try:
+            after = parse_page_cursor(after)
+        except ValueError:
+            return jsonify({"success": False, "error": "Invalid after cursor"}), 400
+
+    page = Poll.completed_page(session, after=after or None, limit=limit + 1)
+    next_cursor = page_cursor(page[limit - 1][0]) if len(page) > limit else None
+
+    return jsonify({
+        "polls": [format_completed_poll(poll, result) for poll, result in page[:limit]],
+        "next": next_cursor,
+    }), 200
+
+
+@api_bp.route("/polls/<int:poll_id>/timeline")
+def poll_timeline(poll_id):
+    """Get a poll's votes per time bucket.
+
+    Completed polls are aggregated once and cached until their results are
+    re-frozen; the active poll is served from the in-memory ring buffer of
+    its most recent buckets.
+    """
+    session = get_session()
+
+    bucket = request.args.get("bucket", "10s")
+    if bucket not in BUCKETS:
+        return (
+            jsonify({
+                "success": False,
+                "error": f"Invalid bucket. Must be one of {', '.join(BUCKETS)}",
+            }),
+            400,
+        )
+    seconds = BUCKETS[bucket]
+
+    active_poll = active_poll_cache.get(session)
+    live = active_poll is not None and active_poll.id == poll_id
+    if live:
+        buckets = live_timeline.get(session, poll_id, seconds)
+    else:
+        if session.get(Poll, poll_id) is None:
+            return jsonify({"success": False, "error": "Poll not found"}), 404
+        computed_at = session.query(PollResult.computed_at).filter_by(
+            poll_id=poll_id
+        ).scalar()
+        buckets = timeline_cache.get(
+            (poll_id, seconds, computed_at),
+            lambda: query_timeline(session, poll_id, seconds),
+        )
 
-    return jsonify(format_poll_response(active_poll, session)), 200
+    return jsonify({"poll_id": poll_id, "bucket": bucket, "live": live, "buckets": buckets}), 200
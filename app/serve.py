@@ -0,0 +1,37 @@
+"""Production entry point: ``python -m app.serve``.
+
+Runs the app on gevent's WSGI server so every Socket.IO client is a
+greenlet on a native WebSocket rather than a thread on long-polling.
+The standard library must be patched before anything else is imported.
+"""
+from gevent import monkey
+
+monkey.patch_all()
+
+import signal  # noqa: E402
+
+import gevent  # noqa: E402
+
+from app import create_app, socketio  # noqa: E402
+from app.config import ProductionConfig  # noqa: E402
+from app.ingest import vote_queue  # noqa: E402
+
+app = create_app(ProductionConfig)
+
+
+def main():
+    # docker stop sends SIGTERM, which skips atexit hooks; stop serving
+    # instead, so the queued votes below are still written before exit
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        gevent.signal_handler(signum, socketio.stop)
+    socketio.run(
+        app,
+        host=app.config['SERVER_HOST'],
+        port=app.config['SERVER_PORT'],
+        log_output=False,
+    )
+    vote_queue.stop()
+
+
+if __name__ == '__main__':
+    main()
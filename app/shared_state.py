@@ -0,0 +1,86 @@
+class SharedStateStore:
+    """Vote counts, broadcast seq and cache invalidations kept in Redis.
+
+    A single worker process keeps all of this in memory. Behind a load
+    balancer every worker would drift apart, so with ``COUNTER_STORE_URL``
+    set the tally, broadcaster and active-poll cache read it from here.
+
+    Counts are absolute snapshots of a poll's stored counters, published
+    after each commit. A snapshot only replaces one with a smaller total, and
+    only if nothing was invalidated since the publisher read the epoch, so
+    workers converge on the newest committed counts without a shared lock.
+    """
+
+    def __init__(self, client, prefix='vwyf'):
+        self.client = client
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url, prefix='vwyf'):
+        import redis
+
+        return cls(redis.Redis.from_url(url), prefix)
+
+    def _key(self, name):
+        return f'{self.prefix}:{name}'
+
+    def _int(self, name):
+        return int(self.client.get(self._key(name)) or 0)
+
+    def epoch(self):
+        """Increases on every invalidation, in any worker"""
+        return self._int('epoch')
+
+    def version(self):
+        """Increases whenever stored counts change or are dropped"""
+        return self._int('version')
+
+    def seq(self):
+        """Sequence number of the most recent vote_cast event"""
+        return self._int('seq')
+
+    def next_seq(self):
+        return self.client.incr(self._key('seq'))
+
+    def counts(self, poll_id):
+        """Return the stored {'A', 'B'} counts of a poll, or None"""
+        count_a, count_b = self.client.hmget(self._key(f'counts:{poll_id}'), 'A', 'B')
+        if count_a is None or count_b is None:
+            return None
+        return {'A': int(count_a), 'B': int(count_b)}
+
+    def publish(self, epoch, poll_id, counts):
+        """Store counts read at epoch unless newer counts or an invalidation won"""
+        key = self._key(f'counts:{poll_id}')
+        epoch_key = self._key('epoch')
+
+        def update(pipe):
+            if int(pipe.get(epoch_key) or 0) != epoch:
+                return False
+            current = pipe.hmget(key, 'A', 'B')
+            if None not in current and sum(map(int, current)) >= counts['A'] + counts['B']:
+                return False
+            pipe.multi()
+            pipe.hset(key, mapping={'A': counts['A'], 'B': counts['B']})
+            pipe.incr(self._key('version'))
+            return True
+
+        return self.client.transaction(update, key, epoch_key, value_from_callable=True)
+
+    def invalidate(self, poll_id=None):
+        """Drop stored counts (for one poll, or all) and bump the epoch"""
+        if poll_id is None:
+            keys = list(self.client.scan_iter(self._key('counts:*')))
+        else:
+            keys = [self._key(f'counts:{poll_id}')]
+
+        pipe = self.client.pipeline()
+        pipe.incr(self._key('epoch'))
+        pipe.incr(self._key('version'))
+        if keys:
+            pipe.delete(*keys)
+        pipe.execute()
+
+    def bump_epoch(self):
+        """Tell other workers to drop caches without touching counts"""
+        self.client.incr(self._key('epoch'))
@@ -0,0 +1,216 @@
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+
+class VoteTally:
+    """In-memory A/B counts for the active poll.
+
+    Counts are loaded from the database the first time they are needed and
+    then kept up to date as votes are committed, so the vote and display
+    endpoints never have to aggregate the votes table on the hot path.
+
+    Votes accepted by the batched ingestion queue but not yet written are
+    tracked as pending and included whenever counts are (re)loaded.
+
+    With a shared store (several worker processes) the counts live there
+    instead: each commit publishes the poll's stored counters, and queued
+    votes are counted once their batch is written.
+
+    Local counts are re-read from the stored counters once they are ``ttl``
+    seconds old, so corrections made by another process (such as
+    ``flask reconcile-counts``) reach this one without a restart.
+    """
+
+    def __init__(self, ttl=5.0):
+        self.ttl = ttl
+        self._lock = threading.RLock()
+        self._poll_id = None
+        self._counts = None
+        self._loaded_at = 0.0
+        self._pending = Counter()
+        self._version = 0
+        self._store = None
+        self._listeners = []
+        self._invalidation_listeners = []
+
+    def on_apply(self, listener):
+        """Call listener(poll_id, answer, amount, timestamp) for votes counted in this process.
+
+        ``timestamp`` is the votes' own (naive UTC) time when they carry one,
+        or None for votes cast just now. Listeners run under the tally lock,
+        right after the commit (or enqueue) that recorded the votes; see
+        ``frozen``.
+        """
+        self._listeners.append(listener)
+
+    def on_invalidate(self, listener):
+        """Call listener(poll_id) whenever counts are invalidated (None for all)"""
+        self._invalidation_listeners.append(listener)
+
+    @contextmanager
+    def frozen(self):
+        """Hold off vote recording while the caller reads a consistent snapshot.
+
+        A vote is either committed before the block starts (and visible to
+        its queries) or reported to the listeners after it ends, never both.
+        """
+        with self._lock:
+            yield
+
+    def share(self, store):
+        """Keep counts in a SharedStateStore, or in this process when None"""
+        with self._lock:
+            self._store = store
+            self._poll_id = None
+            self._counts = None
+            self._version += 1
+
+    @property
+    def shared(self):
+        """Whether counts live in a SharedStateStore rather than this process"""
+        return self._store is not None
+
+    @property
+    def version(self):
+        """Increases whenever the cached counts change or are dropped"""
+        if self._store is not None:
+            return self._store.version()
+        return self._version
+
+    def _publish_committed(self, epoch, poll_ids):
+        from app.database import get_session
+        from app.models import Poll
+
+        rows = get_session().query(Poll.id, Poll.count_a, Poll.count_b).filter(
+            Poll.id.in_(list(poll_ids))
+        )
+        for poll_id, count_a, count_b in rows:
+            self._store.publish(epoch, poll_id, {'A': count_a, 'B': count_b})
+
+    def get_counts(self, poll, session):
+        """Return the counts for a poll, loading them on first use"""
+        store = self._store
+        if store is not None:
+            counts = store.counts(poll.id)
+            if counts is None:
+                epoch = store.epoch()
+                counts = poll.get_vote_counts(session)
+                store.publish(epoch, poll.id, counts)
+            return counts
+
+        with self._lock:
+            if (self._poll_id != poll.id or self._counts is None
+                    or time.monotonic() - self._loaded_at >= self.ttl):
+                counts = poll.get_vote_counts(session)
+                counts = {
+                    answer: counts[answer] + self._pending[(poll.id, answer)]
+                    for answer in ('A', 'B')
+                }
+                if self._poll_id != poll.id or counts != self._counts:
+                    self._version += 1
+                self._poll_id = poll.id
+                self._counts = counts
+                self._loaded_at = time.monotonic()
+            return dict(self._counts)
+
+    def peek(self, poll_id):
+        """Return the cached counts for a poll without loading, or None"""
+        if self._store is not None:
+            return self._store.counts(poll_id)
+        with self._lock:
+            if self._poll_id == poll_id and self._counts is not None:
+                return dict(self._counts)
+            return None
+
+    def _apply(self, poll_id, answer, amount, timestamp=None):
+        if self._poll_id == poll_id and self._counts is not None:
+            self._counts[answer] += amount
+            self._version += 1
+        for listener in self._listeners:
+            listener(poll_id, answer, amount, timestamp)
+
+    @contextmanager
+    def recording(self, poll_id, answer, amount=1):
+        """Apply a vote to the tally once the wrapped commit succeeds.
+
+        The lock is held across the commit so a concurrent load can never
+        observe the committed row and then have it counted a second time.
+        """
+        if self._store is not None:
+            epoch = self._store.epoch()
+            yield
+            self._publish_committed(epoch, [poll_id])
+            return
+
+        with self._lock:
+            yield
+            self._apply(poll_id, answer, amount)
+
+    @contextmanager
+    def recording_batch(self, poll_id, votes):
+        """Apply a Counter of (answer, timestamp) votes once the wrapped commit succeeds"""
+        if self._store is not None:
+            epoch = self._store.epoch()
+            yield
+            self._publish_committed(epoch, [poll_id])
+            return
+
+        with self._lock:
+            yield
+            for (answer, timestamp), amount in votes.items():
+                self._apply(poll_id, answer, amount, timestamp)
+
+    @contextmanager
+    def queueing(self, poll_id, answer):
+        """Count a vote as pending once the wrapped enqueue succeeds"""
+        if self._store is not None:
+            yield
+            return
+
+        with self._lock:
+            yield
+            self._pending[(poll_id, answer)] += 1
+            self._apply(poll_id, answer, 1)
+
+    @contextmanager
+    def settling(self, votes):
+        """Move queued (poll_id, answer) pairs from pending to committed.
+
+        Wraps the commit that writes them, so loads see either the pending
+        or the stored count of each vote, never both. If the commit fails
+        the votes stay pending, to be retried or discarded.
+        """
+        if self._store is not None:
+            epoch = self._store.epoch()
+            yield
+            self._publish_committed(epoch, {poll_id for poll_id, _ in votes})
+            return
+
+        with self._lock:
+            yield
+            self._pending.subtract(votes)
+            self._pending += Counter()
+
+    def discard(self, votes):
+        """Forget queued (poll_id, answer) pairs that will never be written"""
+        with self._lock:
+            self._pending.subtract(votes)
+            self._pending += Counter()
+        self.invalidate()
+
+    def invalidate(self, poll_id=None):
+        """Drop cached counts (for one poll, or unconditionally)"""
+        if self._store is not None:
+            self._store.invalidate(poll_id)
+        with self._lock:
+            if poll_id is None or poll_id == self._poll_id:
+                self._poll_id = None
+                self._counts = None
+                self._version += 1
+            for listener in self._invalidation_listeners:
+                listener(poll_id)
+
+
+tally = VoteTally()
@@ -0,0 +1,206 @@
+import threading
+import time
+from datetime import datetime, timezone
+from collections import OrderedDict, deque
+
+from sqlalchemy import func
+
+from app.models import Vote, VoteBucket
+from app.tally import tally
+
+BUCKETS = {'1s': 1, '10s': 10, '1m': 60}
+
+
+def bucket_start(column, seconds):
+    """SQL expression for the Unix time (UTC) at the start of a row's bucket.
+
+    ``column`` holds epoch milliseconds (see EpochMillis).
+    """
+    return column // (1000 * seconds) * seconds
+
+
+def query_timeline(session, poll_id, seconds, since=None):
+    """Per-bucket A/B counts of a poll's votes, aggregated in SQL.
+
+    Scans ix_votes_poll_id_timestamp for the poll (from ``since``, a naive
+    UTC datetime, when given), adding the vote_buckets left by compaction.
+    Returns [{'t', 'count_a', 'count_b'}] in time order, where ``t`` is the
+    bucket's start in Unix seconds; empty buckets are omitted.
+    """
+    bucket = bucket_start(Vote.timestamp, seconds).label('bucket')
+    rows = session.query(bucket, Vote.answer, func.count(Vote.id)).filter(
+        Vote.poll_id == poll_id
+    )
+    if since is not None:
+        rows = rows.filter(Vote.timestamp >= since)
+    rows = rows.group_by(bucket, Vote.answer)
+
+    buckets = {}
+    for start, answer, count in rows:
+        entry = buckets.setdefault(start, {'t': start, 'count_a': 0, 'count_b': 0})
+        entry['count_a' if answer == 'A' else 'count_b'] += count
+
+    compacted = VoteBucket.bucket_start // seconds * seconds
+    rows = session.query(
+        compacted, func.sum(VoteBucket.count_a), func.sum(VoteBucket.count_b)
+    ).filter(VoteBucket.poll_id == poll_id)
+    if since is not None:
+        rows = rows.filter(VoteBucket.bucket_start >= int(since.replace(tzinfo=timezone.utc).timestamp()))
+    rows = rows.group_by(compacted)
+
+    for start, count_a, count_b in rows:
+        entry = buckets.setdefault(start, {'t': start, 'count_a': 0, 'count_b': 0})
+        entry['count_a'] += count_a
+        entry['count_b'] += count_b
+
+    return [
+        buckets[start] for start in sorted(buckets)
+        if buckets[start]['count_a'] or buckets[start]['count_b']
+    ]
+
+
+class TimelineCache:
+    """Timelines of completed polls, keyed by when their results were frozen.
+
+    Anything that changes a completed poll's votes re-freezes its
+    PollResult, so a new ``computed_at`` retires the old entry without any
+    explicit invalidation, in every worker process.
+    """
+
+    def __init__(self, max_entries=64):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, key, load):
+        """Return the cached timeline for key, calling load() on a miss"""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+
+        timeline = load()
+        with self._lock:
+            self._entries[key] = timeline
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return timeline
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def _bucket(ring, start):
+    """The bucket starting at ``start`` in a time-ordered ring, added if missing.
+
+    Returns None for a time before every bucket of a full ring, which is
+    outside the window the ring covers.
+    """
+    # Votes almost always land in the newest bucket, so search from the end
+    index = len(ring)
+    while index and ring[index - 1]['t'] > start:
+        index -= 1
+    if index and ring[index - 1]['t'] == start:
+        return ring[index - 1]
+
+    if len(ring) == ring.maxlen:
+        if index == 0:
+            return None
+        ring.popleft()
+        index -= 1
+    bucket = {'t': start, 'count_a': 0, 'count_b': 0}
+    ring.insert(index, bucket)
+    return bucket
+
+
+class LiveTimeline:
+    """Ring buffers of the most recent buckets of the active poll.
+
+    Each resolution is seeded from SQL the first time it is requested and
+    then kept current by the tally, which reports every vote it counts.
+    Seeding runs under ``tally.frozen()``, so a vote is either in the seed or
+    applied afterwards, never both. Live buckets place votes by their own
+    timestamp when they carry one (buffered batches) and by arrival time
+    otherwise, as the database does; only the last ``capacity`` buckets are
+    kept, and an invalidated tally (activation, admin count edits) drops
+    them for a fresh seed.
+    """
+
+    def __init__(self, capacity=300, clock=time.time):
+        self.capacity = capacity
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._poll_id = None
+        self._rings = {}
+
+    def configure(self, capacity):
+        self.capacity = capacity
+        self.reset()
+
+    def reset(self, poll_id=None):
+        with self._lock:
+            if poll_id is not None and poll_id != self._poll_id:
+                return
+            self._poll_id = None
+            self._rings = {}
+
+    def record(self, poll_id, answer, amount, timestamp=None):
+        """Add votes that were just counted to every seeded resolution"""
+        if not amount:
+            return
+        if timestamp is None:
+            at = self._clock()
+        else:
+            at = timestamp.replace(tzinfo=timezone.utc).timestamp()
+        field = 'count_a' if answer == 'A' else 'count_b'
+        with self._lock:
+            if poll_id != self._poll_id:
+                return
+            for seconds, ring in self._rings.items():
+                bucket = _bucket(ring, int(at // seconds * seconds))
+                if bucket is not None:
+                    bucket[field] += amount
+
+    def _first(self, seconds):
+        """Start of the oldest bucket in the window, in Unix seconds"""
+        return (int(self._clock()) // seconds - self.capacity + 1) * seconds
+
+    def _window(self, session, poll_id, seconds):
+        since = datetime.utcfromtimestamp(self._first(seconds))
+        return query_timeline(session, poll_id, seconds, since=since)
+
+    def _recent(self, seconds):
+        first = self._first(seconds)
+        return [dict(entry) for entry in self._rings[seconds] if entry['t'] >= first]
+
+    def get(self, session, poll_id, seconds):
+        """Return the recent buckets of the active poll at one resolution.
+
+        Other workers' votes never reach this process's tally, so with a
+        shared store every request reads the window from SQL instead.
+        """
+        if tally.shared:
+            return self._window(session, poll_id, seconds)
+
+        with self._lock:
+            if poll_id == self._poll_id and seconds in self._rings:
+                return self._recent(seconds)
+
+        with tally.frozen():
+            # End any read transaction so the seed sees every vote committed
+            # before the tally was frozen
+            session.commit()
+            buckets = self._window(session, poll_id, seconds)
+            with self._lock:
+                if poll_id != self._poll_id:
+                    self._poll_id = poll_id
+                    self._rings = {}
+                self._rings[seconds] = deque(buckets, maxlen=self.capacity)
+                return self._recent(seconds)
+
+
+timeline_cache = TimelineCache()
+live_timeline = LiveTimeline()
+tally.on_apply(live_timeline.record)
+tally.on_invalidate(live_timeline.reset)
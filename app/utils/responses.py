@@ -1,15 +1,30 @@
-def format_poll_response(poll, session):
+import hashlib
+import threading
+from datetime import datetime
+
+from flask import json
+
+from app.models import PollResult
+
+# Completed polls shown per page of the 2x2 grid
+COMPLETED_PAGE_SIZE = 4
+
+
+def format_poll_response(poll, session, counts=None):
     """
     Format a poll object with vote counts into the standard API response format.
 
     Args:
         poll: Poll model instance
         session: Database session for querying vote counts
+        counts: Optional precomputed {'A': int, 'B': int} counts; when given
+            the votes table is not queried
 
     Returns:
         dict: Formatted poll data with counts
     """
-    counts = poll.get_vote_counts(session)
+    if counts is None:
+        counts = poll.get_vote_counts(session)
 
     return {
         "poll": {
@@ -21,3 +36,68 @@ def format_poll_response(poll, session):
             "count_b": counts["B"]
         }
     }
+
+
+def format_completed_poll(poll, result):
+    """
+    Format a completed poll and its frozen results for the completed-polls views.
+
+    Args:
+        poll: Poll model instance
+        result: Its PollResult, or None for polls that were never activated
+            (their stored counters are summarized instead)
+
+    Returns:
+        dict: Poll details with counts and percentages
+    """
+    summary = result.as_dict() if result else PollResult.summarize(
+        poll.count_a, poll.count_b
+    )
+    return {
+        "poll": {
+            "id": poll.id,
+            "question": poll.question,
+            "answer_a": poll.answer_a,
+            "answer_b": poll.answer_b,
+            "created_at": poll.created_at.isoformat(),
+            "created_at_formatted": poll.created_at.strftime("%B %d, %Y"),
+        },
+        "count_a": summary["count_a"],
+        "count_b": summary["count_b"],
+        "percent_a": summary["percent_a"],
+        "percent_b": summary["percent_b"],
+    }
+
+
+def page_cursor(poll):
+    """Cursor for the page after a poll: its created_at and id"""
+    return f"{poll.created_at.isoformat()},{poll.id}"
+
+
+def parse_page_cursor(value):
+    """Parse a page cursor into (created_at, id); raises ValueError if malformed"""
+    created_at, _, poll_id = value.rpartition(",")
+    return datetime.fromisoformat(created_at), int(poll_id)
+
+
+class VersionedPayload:
+    """A JSON body serialized once per version key, with a strong ETag.
+
+    Callers pass a key that changes whenever the payload would; while it
+    stays the same every request reuses the cached bytes and ETag.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entry = None
+
+    def get(self, key, build):
+        """Return (body, etag) for key, calling build() only when key changed"""
+        entry = self._entry
+        if entry is None or entry[0] != key:
+            body = json.dumps(build(), separators=(",", ":"))
+            etag = hashlib.sha1(body.encode("utf-8")).hexdigest()
+            entry = (key, body, etag)
+            with self._lock:
+                self._entry = entry
+        return entry[1], entry[2]
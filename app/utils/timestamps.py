@@ -0,0 +1,9 @@
+from datetime import datetime, timezone
+
+
+def parse_timestamp(value):
+    """Parse an ISO 8601 timestamp into a naive UTC datetime"""
+    parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
@@ -0,0 +1,154 @@
+"""Compare SQLite busy timeouts with two gevent workers voting at once.
+
+Starts two app.serve workers on one scratch database, once per busy
+timeout, and has ``--voters`` clients per worker cast votes for a few
+seconds. A probe on each worker polls /api/display/data meanwhile: SQLite
+waits out a lock inside the sqlite3 call, so every greenlet in the worker
+(probe included) stalls until it returns. ``--hold-ms`` also takes the
+write lock from a third process every second, as compact-votes does:
+
+    uv run python -m benchmarks.gevent_workers --seconds 5 --voters 8 --hold-ms 500
+"""
+import argparse
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+from app import database
+from app.models import Poll
+
+TIMEOUTS_MS = (5000, 50)
+
+
+def _wait_for_server(port, timeout=15):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(f'http://127.0.0.1:{port}/api/display/data', timeout=1)
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f'server on port {port} did not start')
+
+
+def _vote(port, stop, results):
+    request = urllib.request.Request(
+        f'http://127.0.0.1:{port}/api/vote?answer=A',
+        method='POST', headers={'X-Vote-Password': 'bench'},
+    )
+    while not stop.is_set():
+        started = time.perf_counter()
+        try:
+            urllib.request.urlopen(request, timeout=30).read()
+            status = 200
+        except urllib.error.HTTPError as error:
+            status = error.code
+        results.append(('vote', status, time.perf_counter() - started))
+
+
+def _probe(port, stop, results):
+    while not stop.is_set():
+        started = time.perf_counter()
+        urllib.request.urlopen(f'http://127.0.0.1:{port}/api/display/data', timeout=30).read()
+        results.append(('probe', 200, time.perf_counter() - started))
+        time.sleep(0.02)
+
+
+def _hold_lock(path, hold_ms, stop):
+    connection = sqlite3.connect(path, isolation_level=None, timeout=30)
+    while not stop.wait(1.0):
+        connection.execute('BEGIN IMMEDIATE')
+        time.sleep(hold_ms / 1000)
+        connection.execute('ROLLBACK')
+    connection.close()
+
+
+def _percentile(values, fraction):
+    values = sorted(values) or [0]
+    return values[min(int(len(values) * fraction), len(values) - 1)] * 1000
+
+
+def run(busy_timeout_ms, args, directory):
+    path = Path(directory) / f'busy-{busy_timeout_ms}.db'
+    url = f'sqlite:///{path}'
+    database.init_db(url)
+    session = database.get_session()()
+    session.add(Poll(question='Bench?', answer_a='A', answer_b='B', is_active=True))
+    session.commit()
+    session.close()
+
+    ports = [args.port, args.port + 1]
+    env = dict(
+        os.environ,
+        DATABASE_URL=url,
+        VOTE_PASSWORD='bench',
+        SQLITE_BUSY_TIMEOUT_MS=str(busy_timeout_ms),
+    )
+    servers = [
+        subprocess.Popen(
+            [sys.executable, '-m', 'app.serve'],
+            env=dict(env, SERVER_PORT=str(port)),
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        for port in ports
+    ]
+    try:
+        for port in ports:
+            _wait_for_server(port)
+
+        stop = threading.Event()
+        results = []
+        threads = [
+            threading.Thread(target=_vote, args=(port, stop, results))
+            for port in ports for _ in range(args.voters)
+        ]
+        threads += [threading.Thread(target=_probe, args=(port, stop, results)) for port in ports]
+        if args.hold_ms:
+            threads.append(threading.Thread(target=_hold_lock, args=(path, args.hold_ms, stop)))
+        for thread in threads:
+            thread.start()
+        time.sleep(args.seconds)
+        stop.set()
+        for thread in threads:
+            thread.join()
+    finally:
+        for server in servers:
+            server.terminate()
+            server.wait()
+
+    votes = [seconds for kind, status, seconds in results if kind == 'vote' and status == 200]
+    busy = sum(1 for kind, status, _ in results if kind == 'vote' and status != 200)
+    probes = [seconds for kind, _, seconds in results if kind == 'probe']
+    print(
+        f'busy_timeout={busy_timeout_ms:>5}ms  votes/s={len(votes) / args.seconds:>6.0f}  '
+        f'failed={busy:>4}  vote p50={_percentile(votes, 0.5):>6.1f}ms  '
+        f'p99={_percentile(votes, 0.99):>7.1f}ms  '
+        f'display p50={_percentile(probes, 0.5):>6.1f}ms  '
+        f'max={_percentile(probes, 1.0):>7.1f}ms'
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--voters', type=int, default=8, help='concurrent voters per worker')
+    parser.add_argument('--hold-ms', type=int, default=0,
+                        help='hold the write lock this long every second')
+    parser.add_argument('--timeouts', type=int, nargs='+', default=list(TIMEOUTS_MS))
+    parser.add_argument('--port', type=int, default=18080)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        for busy_timeout_ms in args.timeouts:
+            run(busy_timeout_ms, args, directory)
+
+
+if __name__ == '__main__':
+    main()
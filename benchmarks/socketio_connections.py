@@ -0,0 +1,195 @@
+"""Compare concurrent Socket.IO display connections per server mode.
+
+Starts the app as a subprocess, once on the threaded Werkzeug development
+server (app.main) and once on the gevent production server (app.serve),
+opens ``--clients`` native WebSocket display connections, then casts a vote
+and times how long the vote_cast event takes to reach every display:
+
+    uv run python -m benchmarks.socketio_connections --clients 200 500 1000
+"""
+import argparse
+import json
+import os
+import selectors
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from pathlib import Path
+
+from wsproto import ConnectionType, WSConnection
+from wsproto.events import Message, Ping, Request, TextMessage
+
+from app import database
+from app.models import Poll
+
+SERVERS = {
+    'werkzeug': (
+        'from app.main import app, socketio; '
+        'socketio.run(app, host="127.0.0.1", port=app.config["SERVER_PORT"], '
+        'allow_unsafe_werkzeug=True, log_output=False)'
+    ),
+    'gevent': 'from app.serve import main; main()',
+}
+
+
+class Display:
+    """One display: a raw Engine.IO v4 WebSocket client driven by a selector"""
+
+    def __init__(self, port):
+        self.port = port
+        self.sock = None
+        self.ws = WSConnection(ConnectionType.CLIENT)
+        self.connect_seconds = None
+        self.received_at = None
+
+    def _send(self, event):
+        self.sock.sendall(self.ws.send(event))
+
+    def messages(self):
+        """Read what is available and yield the text messages in it"""
+        data = self.sock.recv(65536)
+        self.ws.receive_data(data or None)
+        for event in self.ws.events():
+            if isinstance(event, TextMessage):
+                if event.data == '2':
+                    self._send(Message(data='3'))  # answer Engine.IO pings
+                yield event.data
+            elif isinstance(event, Ping):
+                self._send(event.response())
+
+    def connect(self):
+        started = time.perf_counter()
+        self.sock = socket.create_connection(('127.0.0.1', self.port), timeout=30)
+        self._send(Request(host='127.0.0.1', target='/socket.io/?EIO=4&transport=websocket'))
+        connected = False
+        while not connected:
+            for message in self.messages():
+                if message.startswith('0'):
+                    self._send(Message(data='40'))  # join the default namespace
+                elif message.startswith('40'):
+                    connected = True
+        self.sock.setblocking(False)
+        self.connect_seconds = time.perf_counter() - started
+
+    def close(self):
+        self.sock.close()
+
+
+def _wait_for_votes(displays, timeout):
+    selector = selectors.DefaultSelector()
+    for display in displays:
+        selector.register(display.sock, selectors.EVENT_READ, display)
+
+    waiting = len(displays)
+    deadline = time.monotonic() + timeout
+    while waiting and time.monotonic() < deadline:
+        for key, _ in selector.select(timeout=0.5):
+            display = key.data
+            for message in display.messages():
+                if message.startswith('42["vote_cast"') and display.received_at is None:
+                    display.received_at = time.perf_counter()
+                    waiting -= 1
+    selector.close()
+
+
+def _rss_mb(pid):
+    with open(f'/proc/{pid}/status') as status:
+        for line in status:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def _wait_for_server(port, timeout=15):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(f'http://127.0.0.1:{port}/api/display/data', timeout=1)
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f'server on port {port} did not start')
+
+
+def run_server(name, clients, port, directory):
+    url = f"sqlite:///{Path(directory) / f'{name}-{clients}.db'}"
+    database.init_db(url)
+    session = database.get_session()()
+    session.add(Poll(question='Bench?', answer_a='A', answer_b='B', is_active=True))
+    session.commit()
+    session.close()
+
+    env = dict(
+        os.environ,
+        DATABASE_URL=url,
+        SERVER_PORT=str(port),
+        VOTE_PASSWORD='bench',
+        VOTE_BROADCAST_WINDOW_MS='0',
+    )
+    server = subprocess.Popen(
+        [sys.executable, '-c', SERVERS[name]],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    displays = []
+    try:
+        _wait_for_server(port)
+        idle_rss = _rss_mb(server.pid)
+
+        started = time.perf_counter()
+        failed = 0
+        for _ in range(clients):
+            display = Display(port)
+            try:
+                display.connect()
+            except Exception:
+                failed += 1
+                continue
+            displays.append(display)
+        connect_seconds = time.perf_counter() - started
+
+        request = urllib.request.Request(
+            f'http://127.0.0.1:{port}/api/vote?answer=A',
+            method='POST', headers={'X-Vote-Password': 'bench'},
+        )
+        voted_at = time.perf_counter()
+        json.load(urllib.request.urlopen(request, timeout=30))
+        _wait_for_votes(displays, timeout=10)
+        delivered = [d for d in displays if d.received_at is not None]
+        fan_out_ms = (
+            (max(d.received_at for d in delivered) - voted_at) * 1000 if delivered else 0
+        )
+
+        connects = sorted(d.connect_seconds * 1000 for d in displays) or [0]
+        print(
+            f"{name:<9} clients={clients:>5}  connected={len(displays):>5}  failed={failed:>4}  "
+            f"connect p50={connects[len(connects) // 2]:>6.1f}ms  "
+            f"all={connect_seconds:>6.2f}s  "
+            f"fan-out={fan_out_ms:>7.1f}ms ({len(delivered)} delivered)  "
+            f"rss={idle_rss:.0f}->{_rss_mb(server.pid):.0f}MB  "
+            f"threads={len(os.listdir(f'/proc/{server.pid}/task'))}"
+        )
+    finally:
+        for display in displays:
+            display.close()
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clients', type=int, nargs='+', default=[100, 500])
+    parser.add_argument('--servers', nargs='+', default=list(SERVERS), choices=list(SERVERS))
+    parser.add_argument('--port', type=int, default=18080)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        for name in args.servers:
+            for clients in args.clients:
+                run_server(name, clients, args.port, directory)
+
+
+if __name__ == '__main__':
+    main()
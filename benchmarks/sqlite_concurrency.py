@@ -0,0 +1,102 @@
+"""Compare SQLite read/write concurrency with and without the tuned profile.
+
+Runs vote writer and display reader processes against a scratch database
+for a few seconds per profile and reports throughput and "database is
+locked" errors. Separate processes keep the GIL out of the measurement:
+
+    uv run python -m benchmarks.sqlite_concurrency --seconds 5 --writers 2 --readers 8
+"""
+import argparse
+import multiprocessing
+import tempfile
+import time
+from pathlib import Path
+
+from sqlalchemy.exc import OperationalError
+
+from app import database
+from app.config import Config
+from app.models import Poll, Vote
+
+
+def _worker(role, url, pragmas, pool_size, poll_id, seconds, results):
+    database.init_db(url, pragmas=pragmas, pool_size=pool_size)
+    session = database.get_session()()
+    done = locked = 0
+    deadline = time.monotonic() + seconds
+
+    while time.monotonic() < deadline:
+        try:
+            if role == 'writer':
+                session.add(Vote(poll_id=poll_id, answer='A'))
+            else:
+                session.query(Poll.count_a, Poll.count_b).filter_by(id=poll_id).one()
+            session.commit()
+            done += 1
+        except OperationalError:
+            session.rollback()
+            locked += 1
+
+    session.close()
+    results.put((role, done, locked))
+
+
+def run_profile(name, url, pragmas, pool_size, seconds, writers, readers):
+    database.init_db(url, pragmas=pragmas, pool_size=pool_size)
+    session = database.get_session()()
+    poll = Poll(question='Bench?', answer_a='A', answer_b='B', is_active=True)
+    session.add(poll)
+    session.commit()
+    poll_id = poll.id
+    session.close()
+
+    results = multiprocessing.Queue()
+    roles = ['writer'] * writers + ['reader'] * readers
+    processes = [
+        multiprocessing.Process(
+            target=_worker,
+            args=(role, url, pragmas, pool_size, poll_id, seconds, results),
+        )
+        for role in roles
+    ]
+    for process in processes:
+        process.start()
+
+    totals = {'writer': 0, 'reader': 0, 'locked': 0}
+    for _ in processes:
+        role, done, locked = results.get()
+        totals[role] += done
+        totals['locked'] += locked
+    for process in processes:
+        process.join()
+
+    print(
+        f"{name:<8} writes/s={totals['writer'] / seconds:>8.0f}  "
+        f"reads/s={totals['reader'] / seconds:>8.0f}  locked errors={totals['locked']}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--writers', type=int, default=2)
+    parser.add_argument('--readers', type=int, default=8)
+    args = parser.parse_args()
+
+    config = {key: getattr(Config, key) for key in dir(Config) if key.isupper()}
+    profiles = [
+        ('default', None, None),
+        ('tuned', database.sqlite_pragmas(config), Config.DB_POOL_SIZE),
+    ]
+
+    with tempfile.TemporaryDirectory() as directory:
+        for name, pragmas, pool_size in profiles:
+            url = f"sqlite:///{Path(directory) / f'{name}.db'}"
+            run_profile(
+                name, url, pragmas, pool_size,
+                args.seconds, args.writers, args.readers,
+            )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+"""Compare the legacy and compact vote encodings on file size and insert speed.
+
+The legacy votes table stores answers as 'A'/'B' text and timestamps as
+ISO datetime text set in Python; the compact one stores 0/1 small integers
+and epoch milliseconds set by the database. Both get the same indexes and
+the tuned SQLite profile:
+
+    uv run python -m benchmarks.vote_encoding --votes 1000000
+"""
+import argparse
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from sqlalchemy import (
+    Column, DateTime, ForeignKey, Index, Integer, MetaData, String, Table, insert,
+)
+
+from app import database
+from app.config import Config
+from app.models import Poll, Vote
+
+BATCH_SIZE = 500
+
+legacy_metadata = MetaData()
+legacy_polls = Table('polls', legacy_metadata, Column('id', Integer, primary_key=True))
+legacy_votes = Table(
+    'votes', legacy_metadata,
+    Column('id', Integer, primary_key=True),
+    Column('poll_id', Integer, ForeignKey('polls.id'), nullable=False),
+    Column('answer', String, nullable=False),
+    Column('timestamp', DateTime, default=datetime.utcnow, nullable=False),
+    Index('ix_votes_poll_id_answer', 'poll_id', 'answer'),
+    Index('ix_votes_poll_id_timestamp', 'poll_id', 'timestamp'),
+    Index('ix_votes_timestamp', 'timestamp'),
+)
+
+
+def _legacy_engine(url, pragmas):
+    engine = database._create_engine(url, pragmas, Config.DB_POOL_SIZE)
+    legacy_metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(insert(legacy_polls), [{'id': 1}])
+    return engine
+
+
+def _compact_engine(url, pragmas):
+    engine = database.init_db(url, pragmas=pragmas, pool_size=Config.DB_POOL_SIZE)
+    with engine.begin() as connection:
+        connection.execute(insert(Poll.__table__), [
+            {'id': 1, 'question': 'Bench?', 'answer_a': 'A', 'answer_b': 'B', 'is_active': True}
+        ])
+    return engine
+
+
+def single_inserts(engine, table, count):
+    """Votes per second committed one at a time, as by POST /api/vote"""
+    started = time.perf_counter()
+    with engine.connect() as connection:
+        for i in range(count):
+            connection.execute(insert(table), {'poll_id': 1, 'answer': 'AB'[i % 2]})
+            connection.commit()
+    return count / (time.perf_counter() - started)
+
+
+def batch_inserts(engine, table, count):
+    """Votes per second bulk-inserted in batches, as by the ingestion queue"""
+    start = datetime.utcnow()
+    started = time.perf_counter()
+    with engine.connect() as connection:
+        for offset in range(0, count, BATCH_SIZE):
+            connection.execute(insert(table), [
+                {
+                    'poll_id': 1,
+                    'answer': 'AB'[i % 2],
+                    'timestamp': start + timedelta(milliseconds=37 * i),
+                }
+                for i in range(offset, min(offset + BATCH_SIZE, count))
+            ])
+            connection.commit()
+    return count / (time.perf_counter() - started)
+
+
+def file_size(engine, path):
+    with engine.connect() as connection:
+        connection.exec_driver_sql('PRAGMA wal_checkpoint(TRUNCATE)')
+    return os.path.getsize(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--votes', type=int, default=200000,
+                        help='votes bulk-inserted before measuring file size')
+    parser.add_argument('--single', type=int, default=5000,
+                        help='votes inserted with one commit each')
+    args = parser.parse_args()
+
+    config = {key: getattr(Config, key) for key in dir(Config) if key.isupper()}
+    pragmas = database.sqlite_pragmas(config)
+    encodings = [
+        ('legacy', _legacy_engine, legacy_votes),
+        ('compact', _compact_engine, Vote.__table__),
+    ]
+
+    print(f"{'encoding':<8} {'single/s':>10} {'batched/s':>10} {'file MiB':>9} {'bytes/vote':>11}")
+    with tempfile.TemporaryDirectory() as directory:
+        for name, make_engine, table in encodings:
+            path = Path(directory) / f'{name}.db'
+            engine = make_engine(f'sqlite:///{path}', pragmas)
+            batched = batch_inserts(engine, table, args.votes)
+            size = file_size(engine, path)
+            single = single_inserts(engine, table, args.single)
+            engine.dispose()
+            print(
+                f'{name:<8} {single:>10.0f} {batched:>10.0f} '
+                f'{size / 2 ** 20:>9.1f} {size / args.votes:>11.1f}'
+            )
+
+
+if __name__ == '__main__':
+    main()
@@ -1,43 +1,123 @@
 // WebSocket client for real-time updates
 const socket = io();
 
+const FALLBACK_POLL_INTERVAL = 5000; // only while the socket is down
+
+let pollId = document.body.dataset.pollId ? Number(document.body.dataset.pollId) : null;
+let lastSeq = document.body.dataset.seq ? Number(document.body.dataset.seq) : null;
+let lastEtag = null;
+let fallbackTimer = null;
+
+// Poll over HTTP until the socket is up
+startFallbackPolling();
+
 socket.on('connect', function () {
     console.log('Connected to server');
+    stopFallbackPolling();
+    // Anything may have happened while we were away
+    updateDisplay();
+});
+
+socket.on('disconnect', function () {
+    console.log('Disconnected from server');
+    startFallbackPolling();
 });
 
 socket.on('vote_cast', function (data) {
-    console.log('Vote cast:', data);
-    updateDisplay();
+    if (data.poll_id !== pollId) {
+        return;
+    }
+
+    if (lastSeq === null || data.seq !== lastSeq + 1) {
+        // Missed an event (or the server restarted): re-sync over HTTP
+        console.log('Vote sequence gap, re-syncing:', lastSeq, '->', data.seq);
+        updateDisplay();
+        return;
+    }
+
+    lastSeq = data.seq;
+    renderCounts(data.count_a, data.count_b);
 });
 
 socket.on('poll_activated', function (data) {
     console.log('Poll activated:', data);
-    location.reload();
+    // Swap the new poll in place; reloading every display at once would
+    // re-fetch the page and re-open every socket together
+    lastSeq = data.seq;
+    lastEtag = null;
+    renderPoll(data.poll);
 });
 
-function updateDisplay() {
-    fetch('/api/display/data')
-        .then(response => response.json())
-        .then(data => {
-            if (data.poll) {
-                const countA = document.getElementById('count-a');
-                const countB = document.getElementById('count-b');
-                const verticalBarA = document.getElementById('vertical-bar-a');
-                const verticalBarB = document.getElementById('vertical-bar-b');
+function renderPoll(poll) {
+    pollId = poll ? poll.id : null;
+
+    document.querySelectorAll('.question-bar, .split-container').forEach(function (el) {
+        el.hidden = !poll;
+    });
+    document.querySelectorAll('.no-poll').forEach(function (el) {
+        el.hidden = !!poll;
+    });
+    if (!poll) return;
 
-                const total = data.poll.count_a + data.poll.count_b;
-                const percentA = total > 0 ? (data.poll.count_a / total * 100) : 0;
-                const percentB = total > 0 ? (data.poll.count_b / total * 100) : 0;
+    const question = document.getElementById('question');
+    const answerA = document.getElementById('answer-a');
+    const answerB = document.getElementById('answer-b');
 
-                if (countA) countA.textContent = data.poll.count_a;
-                if (countB) countB.textContent = data.poll.count_b;
+    if (question) question.textContent = poll.question;
+    if (answerA) answerA.textContent = poll.answer_a;
+    if (answerB) answerB.textContent = poll.answer_b;
 
-                if (verticalBarA) verticalBarA.style.height = percentA + '%';
-                if (verticalBarB) verticalBarB.style.height = percentB + '%';
+    renderCounts(poll.count_a, poll.count_b);
+}
+
+function renderCounts(count_a, count_b) {
+    const countA = document.getElementById('count-a');
+    const countB = document.getElementById('count-b');
+    const verticalBarA = document.getElementById('vertical-bar-a');
+    const verticalBarB = document.getElementById('vertical-bar-b');
+
+    const total = count_a + count_b;
+    const percentA = total > 0 ? (count_a / total * 100) : 0;
+    const percentB = total > 0 ? (count_b / total * 100) : 0;
+
+    if (countA) countA.textContent = count_a;
+    if (countB) countB.textContent = count_b;
+
+    if (verticalBarA) verticalBarA.style.height = percentA + '%';
+    if (verticalBarB) verticalBarB.style.height = percentB + '%';
+}
+
+function updateDisplay() {
+    const headers = lastEtag ? { 'If-None-Match': lastEtag } : {};
+    fetch('/api/display/data', { headers: headers, cache: 'no-store' })
+        .then(response => {
+            // 304: nothing changed since the last body we rendered
+            if (response.status === 304) return null;
+            lastEtag = response.headers.get('ETag');
+            return response.json();
+        })
+        .then(data => {
+            if (!data) return;
+            if (typeof data.seq === 'number') lastSeq = data.seq;
+            // Also catches a poll_activated missed while disconnected
+            if (!data.poll || data.poll.id !== pollId) {
+                renderPoll(data.poll);
+            } else {
+                renderCounts(data.poll.count_a, data.poll.count_b);
             }
         })
         .catch(error => console.error('Error updating display:', error));
 }
 
-setInterval(updateDisplay, 5000);
+function startFallbackPolling() {
+    if (fallbackTimer === null) {
+        fallbackTimer = setInterval(updateDisplay, FALLBACK_POLL_INTERVAL);
+    }
+}
 
+function stopFallbackPolling() {
+    if (fallbackTimer !== null) {
+        clearInterval(fallbackTimer);
+        fallbackTimer = null;
+    }
+}
@@ -1,26 +1,28 @@
 // Rotation logic for completed polls display
 (function() {
-    // Check if we have more than 4 polls
-    if (typeof allPolls === 'undefined' || allPolls.length <= 4) {
-        return; // No rotation needed
-    }
-
     const POLLS_PER_PAGE = 4;
     const ROTATION_INTERVAL = 10000; // 10 seconds
     const FADE_DURATION = 300; // milliseconds, matches CSS transition
 
-    let currentPage = 0;
-    const totalPages = Math.ceil(allPolls.length / POLLS_PER_PAGE);
-
     const gridContainer = document.getElementById('grid-container');
     const currentPageEl = document.getElementById('current-page');
 
+    // The server renders the first page; without a next page there is
+    // nothing to rotate through
+    if (!gridContainer || !gridContainer.dataset.nextCursor) {
+        return;
+    }
+
     // Defensive check for required DOM elements
-    if (!gridContainer || !currentPageEl) {
+    if (!currentPageEl) {
         console.error('Required DOM elements not found for rotation');
         return;
     }
 
+    let currentPage = 0;
+    let nextCursor = gridContainer.dataset.nextCursor;
+    let prefetched = null;
+
     function escapeHtml(text) {
         const div = document.createElement('div');
         div.textContent = text;
@@ -80,23 +82,39 @@
         `;
     }
 
-    function rotatePage() {
+    function fetchPage(cursor) {
+        const params = new URLSearchParams({ limit: POLLS_PER_PAGE });
+        if (cursor) {
+            params.set('after', cursor);
+        }
+        return fetch(`/api/polls/completed?${params}`, { cache: 'no-store' })
+            .then(response => {
+                if (!response.ok) {
+                    throw new Error(`HTTP ${response.status}`);
+                }
+                return response.json();
+            });
+    }
+
+    // Only the page shown next is requested, while the current one is on screen
+    function prefetchNextPage() {
+        const cursor = nextCursor;
+        prefetched = fetchPage(cursor).then(page => ({ page, first: !cursor }));
+        prefetched.catch(() => {}); // reported when rotation awaits it
+    }
+
+    function showPage(page, first) {
         // Fade out current cards
         const cards = gridContainer.querySelectorAll('.poll-card');
         cards.forEach(card => card.classList.add('fade-out'));
 
         // Wait for fade out animation
         setTimeout(() => {
-            // Move to next page
-            currentPage = (currentPage + 1) % totalPages;
-
-            // Calculate which polls to show
+            currentPage = first ? 0 : currentPage + 1;
             const startIdx = currentPage * POLLS_PER_PAGE;
-            const endIdx = Math.min(startIdx + POLLS_PER_PAGE, allPolls.length);
-            const pollsToShow = allPolls.slice(startIdx, endIdx);
 
             // Update grid with new polls
-            gridContainer.innerHTML = pollsToShow.map((poll, idx) =>
+            gridContainer.innerHTML = page.polls.map((poll, idx) =>
                 createPollCard(poll, startIdx + idx)
             ).join('');
 
@@ -105,8 +123,28 @@
         }, FADE_DURATION);
     }
 
+    function rotatePage() {
+        prefetched.then(({ page, first }) => {
+            if (page.polls.length === 0) {
+                // The archive shrank under us; start over from the newest page
+                nextCursor = null;
+                prefetchNextPage();
+                return;
+            }
+
+            showPage(page, first);
+            // After the last page, wrap around to the first
+            nextCursor = page.next;
+            prefetchNextPage();
+        }).catch(error => {
+            console.error('Failed to load completed polls:', error);
+            prefetchNextPage();
+        });
+    }
+
     // Start rotation
+    prefetchNextPage();
     setInterval(rotatePage, ROTATION_INTERVAL);
 
-    console.log(`Rotation enabled: ${allPolls.length} polls, ${totalPages} pages`);
+    console.log('Rotation enabled');
 })();
@@ -0,0 +1,27 @@
+import pytest
+from sqlalchemy import event
+
+
+@pytest.fixture
+def record_statements():
+    """Start recording the SQL run on an engine; returns the growing list.
+
+    The listeners are removed when the test ends, so an engine that outlives
+    the test stops recording into it.
+    """
+    listeners = []
+
+    def record(bind):
+        statements = []
+
+        def listener(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(bind, "before_cursor_execute", listener)
+        listeners.append((bind, listener))
+        return statements
+
+    yield record
+
+    for bind, listener in listeners:
+        event.remove(bind, "before_cursor_execute", listener)
@@ -0,0 +1,104 @@
+import dataclasses
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from app.active_poll import ActivePollCache, PollSnapshot
+from app.models import Base, Poll, Vote
+
+
+@pytest.fixture
+def db_session():
+    engine = create_engine("sqlite:///:memory:")
+
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragma(dbapi_conn, connection_record):
+        cursor = dbapi_conn.cursor()
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.close()
+
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+    session = Session()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def statements(db_session, record_statements):
+    return record_statements(db_session.get_bind())
+
+
+def describe_active_poll_cache():
+
+    def it_returns_an_immutable_snapshot_of_the_active_poll(db_session):
+        poll = Poll(question="Q?", answer_a="Yes", answer_b="No", is_active=True)
+        db_session.add(poll)
+        db_session.commit()
+
+        snapshot = ActivePollCache().get(db_session)
+
+        assert snapshot == PollSnapshot(poll.id, "Q?", "Yes", "No")
+        with pytest.raises(dataclasses.FrozenInstanceError):
+            snapshot.question = "Changed?"
+
+    def it_skips_the_query_while_cached(db_session, statements):
+        db_session.add(Poll(question="Q?", answer_a="A", answer_b="B", is_active=True))
+        db_session.commit()
+        cache = ActivePollCache()
+        cache.get(db_session)
+        statements.clear()
+
+        cache.get(db_session)
+
+        assert statements == []
+
+    def it_caches_the_absence_of_an_active_poll(db_session, statements):
+        cache = ActivePollCache()
+
+        assert cache.get(db_session) is None
+        statements.clear()
+        assert cache.get(db_session) is None
+        assert statements == []
+
+    def it_reloads_after_invalidation(db_session):
+        first = Poll(question="First?", answer_a="A", answer_b="B", is_active=True)
+        second = Poll(question="Second?", answer_a="A", answer_b="B")
+        db_session.add_all([first, second])
+        db_session.commit()
+        cache = ActivePollCache()
+        cache.get(db_session)
+
+        Poll.activate_poll(db_session, second.id)
+        db_session.commit()
+        assert cache.get(db_session).question == "First?"
+
+        cache.invalidate()
+        assert cache.get(db_session).question == "Second?"
+
+    def it_reloads_once_the_ttl_expires(db_session):
+        poll = Poll(question="Old?", answer_a="A", answer_b="B", is_active=True)
+        db_session.add(poll)
+        db_session.commit()
+        cache = ActivePollCache(ttl=0)
+        cache.get(db_session)
+
+        poll.question = "New?"
+        db_session.commit()
+
+        assert cache.get(db_session).question == "New?"
+
+
+def describe_poll_snapshot():
+
+    def it_reads_vote_counts_from_the_stored_counters(db_session):
+        poll = Poll(question="Q?", answer_a="A", answer_b="B", is_active=True)
+        db_session.add(poll)
+        db_session.commit()
+        db_session.add_all([Vote(poll_id=poll.id, answer="B")])
+        db_session.commit()
+
+        snapshot = PollSnapshot.from_poll(poll)
+
+        assert snapshot.get_vote_counts(db_session) == {"A": 0, "B": 1}
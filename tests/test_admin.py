@@ -1,3 +1,6 @@
+import json
+from datetime import datetime
+
 import pytest
 from flask import Flask
 from flask_socketio import SocketIO
@@ -5,8 +8,11 @@ from sqlalchemy import create_engine, event
 from sqlalchemy.orm import scoped_session, sessionmaker
 
 from app import database as db_module
+from app.active_poll import active_poll_cache
+from app.broadcast import broadcaster
 from app.config import Config
-from app.models import Base, Poll, Vote
+from app.models import Base, Poll, PollResult, Vote
+from app.tally import tally
 from app.routes.admin import admin_bp
 
 
@@ -29,6 +35,8 @@ def app():
     Session = scoped_session(sessionmaker(bind=engine))
 
     db_module._session = Session
+    tally.invalidate()
+    active_poll_cache.invalidate()
 
     app.register_blueprint(admin_bp, url_prefix="/admin")
 
@@ -111,6 +119,23 @@ def describe_admin_poll_listing():
         assert response.status_code == 200
         assert b"New Poll?" in response.data
 
+    def it_uses_a_constant_number_of_queries_as_polls_grow(client, db_session, record_statements):
+        statements = record_statements(db_session.get_bind())
+
+        def queries_for_poll_count(total):
+            while db_session.query(Poll).count() < total:
+                poll = Poll(question="Q?", answer_a="A", answer_b="B")
+                db_session.add(poll)
+                db_session.commit()
+                db_session.add(Vote(poll_id=poll.id, answer="A"))
+                db_session.commit()
+            db_session.expire_all()
+            statements.clear()
+            client.get("/admin/?secret=test-secret")
+            return len(statements)
+
+        assert queries_for_poll_count(2) == queries_for_poll_count(20)
+
     def it_requires_authentication(client):
         response = client.get("/admin/", follow_redirects=False)
         assert response.status_code == 403
@@ -220,6 +245,38 @@ def describe_poll_activation():
         assert len(active_polls) == 1
         assert active_polls[0].id == poll3.id
 
+    def it_refreshes_the_cached_active_poll(client, db_session):
+        poll1 = Poll(question="Poll 1?", answer_a="A1", answer_b="B1", is_active=True)
+        poll2 = Poll(question="Poll 2?", answer_a="A2", answer_b="B2")
+        db_session.add_all([poll1, poll2])
+        db_session.commit()
+        assert active_poll_cache.get(db_session).id == poll1.id
+
+        client.post(f"/admin/polls/{poll2.id}/activate?secret=test-secret")
+
+        assert active_poll_cache.get(db_session).id == poll2.id
+
+    def it_broadcasts_the_new_poll_with_its_counts(client, db_session, monkeypatch):
+        events = []
+        monkeypatch.setattr(
+            broadcaster, "_emit_fn", lambda event, payload: events.append((event, payload))
+        )
+        poll = Poll(question="Next?", answer_a="Yes", answer_b="No")
+        db_session.add(poll)
+        db_session.commit()
+        db_session.add(Vote(poll_id=poll.id, answer="B"))
+        db_session.commit()
+
+        client.post(f"/admin/polls/{poll.id}/activate?secret=test-secret")
+
+        event, payload = events[-1]
+        assert event == "poll_activated"
+        assert payload["poll"] == {
+            "id": poll.id, "question": "Next?", "answer_a": "Yes", "answer_b": "No",
+            "count_a": 0, "count_b": 1,
+        }
+        assert payload["seq"] == broadcaster.seq
+
     def it_requires_authentication(client, db_session):
         poll = Poll(question="Test?", answer_a="A", answer_b="B")
         db_session.add(poll)
@@ -259,6 +316,22 @@ def describe_poll_deletion():
         votes = db_session.query(Vote).filter_by(poll_id=poll_id).all()
         assert len(votes) == 0
 
+    def it_deletes_votes_without_loading_them(client, db_session, record_statements):
+        poll = Poll(question="Big?", answer_a="A", answer_b="B")
+        db_session.add(poll)
+        db_session.commit()
+        poll_id = poll.id
+        db_session.execute(Vote.__table__.insert(), [{"poll_id": poll_id, "answer": "A"}] * 500)
+        db_session.add(PollResult(poll_id=poll_id, **PollResult.summarize(500, 0)))
+        db_session.commit()
+
+        statements = record_statements(db_session.get_bind())
+        client.post(f"/admin/polls/{poll_id}/delete?secret=test-secret")
+
+        assert not any(s.lstrip().startswith("SELECT") and "FROM votes" in s for s in statements)
+        assert db_session.query(Vote).filter_by(poll_id=poll_id).count() == 0
+        assert db_session.get(PollResult, poll_id) is None
+
     def it_prevents_deleting_active_poll(client, db_session):
         poll = Poll(question="Active?", answer_a="A", answer_b="B", is_active=True)
         db_session.add(poll)
@@ -287,6 +360,61 @@ def describe_poll_deletion():
         assert response.status_code == 403
 
 
+def describe_bulk_poll_deletion():
+
+    def it_deletes_the_selected_polls_and_their_votes(client, db_session):
+        polls = [Poll(question=f"Poll {i}?", answer_a="A", answer_b="B") for i in range(3)]
+        db_session.add_all(polls)
+        db_session.commit()
+        db_session.add_all([Vote(poll_id=poll.id, answer="A") for poll in polls])
+        db_session.commit()
+        ids = [poll.id for poll in polls]
+
+        response = client.post(
+            "/admin/polls/delete?secret=test-secret",
+            data={"poll_ids": [str(ids[0]), str(ids[2])]},
+            follow_redirects=True,
+        )
+
+        assert b"Deleted 2 poll(s)" in response.data
+        db_session.expire_all()
+        assert [poll_id for poll_id, in db_session.query(Poll.id)] == [ids[1]]
+        assert db_session.query(Vote).count() == 1
+
+    def it_skips_the_active_poll(client, db_session):
+        active = Poll(question="Active?", answer_a="A", answer_b="B", is_active=True)
+        done = Poll(question="Done?", answer_a="A", answer_b="B")
+        db_session.add_all([active, done])
+        db_session.commit()
+        active_id = active.id
+
+        response = client.post(
+            "/admin/polls/delete?secret=test-secret",
+            data={"poll_ids": [str(active.id), str(done.id)]},
+            follow_redirects=True,
+        )
+
+        assert b"Deleted 1 poll(s)" in response.data
+        assert b"Skipped" in response.data
+        db_session.expire_all()
+        assert [poll_id for poll_id, in db_session.query(Poll.id)] == [active_id]
+
+    def it_lists_checkboxes_for_inactive_polls_only(client, db_session):
+        active = Poll(question="Active?", answer_a="A", answer_b="B", is_active=True)
+        done = Poll(question="Done?", answer_a="A", answer_b="B")
+        db_session.add_all([active, done])
+        db_session.commit()
+
+        response = client.get("/admin/?secret=test-secret")
+
+        assert f'name="poll_ids" value="{done.id}"'.encode() in response.data
+        assert f'name="poll_ids" value="{active.id}"'.encode() not in response.data
+
+    def it_requires_authentication(client, db_session):
+        response = client.post("/admin/polls/delete", data={"poll_ids": ["1"]})
+        assert response.status_code == 403
+
+
 def describe_poll_editing():
 
     def it_shows_edit_form_for_poll(client, db_session):
@@ -353,6 +481,7 @@ def describe_poll_editing():
         db_session.commit()
 
         poll_id = poll.id
+        active_poll_cache.get(db_session)
 
         response = client.post(
             f"/admin/polls/{poll_id}/edit?secret=test-secret",
@@ -370,6 +499,7 @@ def describe_poll_editing():
         updated_poll = db_session.query(Poll).filter_by(id=poll_id).first()
         assert updated_poll.question == "Updated Active?"
         assert updated_poll.is_active is True
+        assert active_poll_cache.get(db_session).question == "Updated Active?"
 
     def it_requires_authentication(client, db_session):
         poll = Poll(question="Test?", answer_a="A", answer_b="B")
@@ -438,6 +568,50 @@ def describe_vote_editing():
         assert counts["A"] == 3
         assert counts["B"] == 2
 
+        assert db_session.query(Vote).filter_by(poll_id=poll_id, answer="A").count() == 3
+        assert db_session.query(Vote).filter_by(poll_id=poll_id, answer="B").count() == 2
+
+    def it_pushes_edited_counts_of_the_active_poll_to_displays(client, db_session, monkeypatch):
+        events = []
+        monkeypatch.setattr(
+            broadcaster, "_emit_fn", lambda event, payload: events.append((event, payload))
+        )
+        monkeypatch.setattr(broadcaster, "window", 0)
+        poll = Poll(question="Live?", answer_a="A", answer_b="B", is_active=True)
+        db_session.add(poll)
+        db_session.commit()
+        db_session.add(Vote(poll_id=poll.id, answer="A"))
+        db_session.commit()
+        poll_id = poll.id
+
+        client.post(
+            f"/admin/polls/{poll_id}/edit-votes?secret=test-secret",
+            data={"count_a": "100", "count_b": "50"},
+        )
+
+        assert [event for event, _ in events] == ["vote_cast"]
+        payload = events[0][1]
+        assert (payload["poll_id"], payload["count_a"], payload["count_b"]) == (poll_id, 100, 50)
+        assert payload["votes"] == 0
+
+    def it_rebuilds_frozen_results_of_completed_polls(client, db_session):
+        poll = Poll(question="Done?", answer_a="A", answer_b="B")
+        db_session.add(poll)
+        db_session.commit()
+        PollResult.freeze(db_session, [poll.id])
+        db_session.commit()
+        poll_id = poll.id
+
+        client.post(
+            f"/admin/polls/{poll_id}/edit-votes?secret=test-secret",
+            data={"count_a": "1", "count_b": "3"},
+        )
+
+        db_session.expire_all()
+        result = db_session.get(PollResult, poll_id)
+        assert (result.count_a, result.count_b, result.total) == (1, 3, 4)
+        assert result.percent_b == 75.0
+
     def it_validates_vote_counts_are_non_negative(client, db_session):
         poll = Poll(question="Poll?", answer_a="A", answer_b="B")
         db_session.add(poll)
@@ -496,3 +670,92 @@ def describe_vote_editing():
             data={"count_a": "5", "count_b": "3"}
         )
         assert response.status_code == 403
+
+
+def describe_broadcast_stats():
+
+    def it_reports_dispatcher_queue_depth_and_latency(client):
+        response = client.get("/admin/broadcast/stats?secret=test-secret")
+
+        assert response.status_code == 200
+        data = response.get_json()
+        assert {"queue_depth", "emitted", "failed", "dropped",
+                "emit_seconds_max", "wait_seconds_max"} <= set(data)
+
+    def it_requires_authentication(client):
+        assert client.get("/admin/broadcast/stats").status_code == 403
+
+
+def describe_vote_export():
+
+    def it_streams_a_polls_votes_as_csv(client, db_session):
+        poll = Poll(question="Export?", answer_a="A", answer_b="B")
+        other = Poll(question="Other?", answer_a="A", answer_b="B")
+        db_session.add_all([poll, other])
+        db_session.commit()
+        db_session.add_all([
+            Vote(poll_id=poll.id, answer="A", timestamp=datetime(2024, 1, 1, 12, 0, 0)),
+            Vote(poll_id=poll.id, answer="B", timestamp=datetime(2024, 1, 1, 12, 0, 1)),
+            Vote(poll_id=other.id, answer="A"),
+        ])
+        db_session.commit()
+
+        response = client.get(f"/admin/export/votes?secret=test-secret&poll_id={poll.id}")
+
+        assert response.status_code == 200
+        assert response.mimetype == "text/csv"
+        assert f'filename="votes-poll-{poll.id}.csv"' in response.headers["Content-Disposition"]
+        lines = response.get_data(as_text=True).splitlines()
+        assert lines[0] == "id,poll_id,answer,timestamp"
+        assert [line.split(",")[2:] for line in lines[1:]] == [
+            ["A", "2024-01-01T12:00:00"],
+            ["B", "2024-01-01T12:00:01"],
+        ]
+
+    def it_streams_a_time_range_across_polls_as_ndjson(client, db_session):
+        first = Poll(question="First?", answer_a="A", answer_b="B")
+        second = Poll(question="Second?", answer_a="A", answer_b="B")
+        db_session.add_all([first, second])
+        db_session.commit()
+        db_session.add_all([
+            Vote(poll_id=first.id, answer="A", timestamp=datetime(2024, 1, 1, 11, 59)),
+            Vote(poll_id=first.id, answer="B", timestamp=datetime(2024, 1, 1, 12, 30)),
+            Vote(poll_id=second.id, answer="A", timestamp=datetime(2024, 1, 1, 12, 45)),
+            Vote(poll_id=second.id, answer="B", timestamp=datetime(2024, 1, 1, 13, 0)),
+        ])
+        db_session.commit()
+
+        response = client.get(
+            "/admin/export/votes?secret=test-secret&format=ndjson"
+            "&start=2024-01-01T12:00:00Z&end=2024-01-01T13:00:00Z"
+        )
+
+        assert response.mimetype == "application/x-ndjson"
+        votes = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        assert [(vote["poll_id"], vote["answer"]) for vote in votes] == [
+            (first.id, "B"), (second.id, "A"),
+        ]
+
+    def it_requires_a_poll_or_a_range(client):
+        response = client.get("/admin/export/votes?secret=test-secret")
+
+        assert response.status_code == 400
+
+    def it_rejects_an_unknown_format(client, db_session):
+        poll = Poll(question="Export?", answer_a="A", answer_b="B")
+        db_session.add(poll)
+        db_session.commit()
+
+        response = client.get(
+            f"/admin/export/votes?secret=test-secret&poll_id={poll.id}&format=xlsx"
+        )
+
+        assert response.status_code == 400
+
+    def it_returns_404_for_a_missing_poll(client):
+        response = client.get("/admin/export/votes?secret=test-secret&poll_id=999")
+
+        assert response.status_code == 404
+
+    def it_requires_authentication(client):
+        assert client.get("/admin/export/votes?poll_id=1").status_code == 403
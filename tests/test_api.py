@@ -1,4 +1,7 @@
 import json
+import sqlite3
+import threading
+from datetime import datetime, timezone
 
 import pytest
 from flask import Flask
@@ -6,8 +9,11 @@ from sqlalchemy import create_engine, event
 from sqlalchemy.orm import scoped_session, sessionmaker
 
 from app import database as db_module
+from app.active_poll import active_poll_cache
 from app.config import Config
-from app.models import Base, Poll, Vote
+from app.models import Base, Poll, PollResult, Vote
+from app.tally import tally
+from app.timeline import timeline_cache
 from app.routes.api import api_bp
 
 
@@ -29,6 +35,9 @@ def app():
     Session = scoped_session(sessionmaker(bind=engine))
 
     db_module._session = Session
+    tally.invalidate()
+    active_poll_cache.invalidate()
+    timeline_cache.clear()
 
     app.register_blueprint(api_bp, url_prefix="/api")
 
@@ -150,3 +159,367 @@ def describe_vote_api():
 
         vote = db_session.query(Vote).first()
         assert vote.timestamp is not None
+
+    def it_keeps_counts_current_across_consecutive_votes(client, db_session):
+        poll = Poll(question="Test?", answer_a="A", answer_b="B", is_active=True)
+        db_session.add(poll)
+        db_session.commit()
+
+        headers = {"X-Vote-Password": "vote123"}
+        client.post("/api/vote?answer=A", headers=headers)
+        client.post("/api/vote?answer=A", headers=headers)
+        response = client.post("/api/vote?answer=B", headers=headers)
+
+        data = json.loads(response.data)
+        assert data["poll"]["count_a"] == 2
+        assert data["poll"]["count_b"] == 1
+
+        response = client.get("/api/display/data")
+        data = json.loads(response.data)
+        assert data["poll"]["count_a"] == 2
+        assert data["poll"]["count_b"] == 1
+
+    def it_includes_the_broadcast_sequence_in_display_data(client, db_session):
+        poll = Poll(question="Test?", answer_a="A", answer_b="B", is_active=True)
+        db_session.add(poll)
+        db_session.commit()
+
+        data = json.loads(client.get("/api/display/data").data)
+
+        assert isinstance(data["seq"], int)
+
+
+def describe_vote_batch_api():
+
+    def it_requires_vote_password(client, db_session):
+        response = client.post("/api/votes/batch", json=[{"answer": "A"}])
+
+        assert response.status_code == 403
+
+    def it_records_all_votes_in_the_batch(client, db_session):
+        poll = Poll(question="Test?", answer_a="A", answer_b="B", is_active=True)
+        db_session.add(poll)
+        db_session.commit()
+
+        response = client.post(
+            "/api/votes/batch",
+            json=[
+                {"answer": "A", "timestamp": "2026-01-02T03:04:05Z"},
+                {"answer": "B", "timestamp": "2026-01-02T03:04:06+01:00"},
+                {"answer": "A"},
+            ],
+            headers={"X-Vote-Password": "vote123"},
+        )
+
+        assert response.status_code == 200
+        data = json.loads(response.data)
+        assert data["accepted"] == 3
+        assert data["poll"]["count_a"] == 2
+        assert data["poll"]["count_b"] == 1
+
+        votes = db_session.query(Vote).order_by(Vote.id).all()
+        assert [vote.answer for vote in votes] == ["A", "B", "A"]
+        assert votes[0].timestamp.isoformat() == "2026-01-02T03:04:05"
+        assert votes[1].timestamp.isoformat() == "2026-01-02T02:04:06"
+
+        db_session.expire_all()
+        assert (poll.count_a, poll.count_b) == (2, 1)
+
+    def it_commits_the_batch_once(client, db_session, record_statements):
+        poll = Poll(question="Test?", answer_a="A", answer_b="B", is_active=True)
+        db_session.add(poll)
+        db_session.commit()
+
+        statements = record_statements(db_session.get_bind())
+        client.post(
+            "/api/votes/batch",
+            json=[{"answer": "A"}] * 50,
+            headers={"X-Vote-Password": "vote123"},
+        )
+
+        assert len([s for s in statements if s.startswith("INSERT INTO votes")]) == 1
+        assert db_session.query(Vote).count() == 50
+
+    def it_rejects_the_whole_batch_when_a_record_is_invalid(client, db_session):
+        poll = Poll(question="Test?", answer_a="A", answer_b="B", is_active=True)
+        db_session.add(poll)
+        db_session.commit()
+
+        response = client.post(
+            "/api/votes/batch",
+            json=[{"answer": "A"}, {"answer": "C"}],
+            headers={"X-Vote-Password": "vote123"},
+        )
+
+        assert response.status_code == 400
+        assert "index 1" in json.loads(response.data)["error"]
+        assert db_session.query(Vote).count() == 0
+
+    def it_rejects_invalid_timestamps(client, db_session):
+        poll = Poll(question="Test?", answer_a="A", answer_b="B", is_active=True)
+        db_session.add(poll)
+        db_session.commit()
+
+        response = client.post(
+            "/api/votes/batch",
+            json=[{"answer": "A", "timestamp": "yesterday"}],
+            headers={"X-Vote-Password": "vote123"},
+        )
+
+        assert response.status_code == 400
+        assert "timestamp" in json.loads(response.data)["error"]
+
+    def it_rejects_empty_or_malformed_bodies(client, db_session):
+        headers = {"X-Vote-Password": "vote123"}
+
+        assert client.post("/api/votes/batch", json=[], headers=headers).status_code == 400
+        assert client.post(
+            "/api/votes/batch", json={"answer": "A"}, headers=headers
+        ).status_code == 400
+
+    def it_rejects_batches_over_the_record_limit(app, client, db_session):
+        app.config["VOTE_BATCH_MAX_RECORDS"] = 3
+        poll = Poll(question="Test?", answer_a="A", answer_b="B", is_active=True)
+        db_session.add(poll)
+        db_session.commit()
+        headers = {"X-Vote-Password": "vote123"}
+
+        response = client.post("/api/votes/batch", json=[{"answer": "A"}] * 4, headers=headers)
+
+        assert response.status_code == 413
+        assert "At most 3" in json.loads(response.data)["error"]
+        assert db_session.query(Vote).count() == 0
+        assert client.post(
+            "/api/votes/batch", json=[{"answer": "A"}] * 3, headers=headers
+        ).status_code == 200
+
+    def it_rejects_batch_when_no_active_poll(client, db_session):
+        response = client.post(
+            "/api/votes/batch",
+            json=[{"answer": "A"}],
+            headers={"X-Vote-Password": "vote123"},
+        )
+
+        assert response.status_code == 400
+        assert "no active poll" in json.loads(response.data)["error"].lower()
+
+
+def describe_locked_database():
+
+    @pytest.fixture
+    def locked(app, tmp_path):
+        path = tmp_path / "votes.db"
+        db_module.init_db(
+            f"sqlite:///{path}", pragmas={"journal_mode": "WAL", "busy_timeout": 20},
+            pool_size=2,
+        )
+        session = db_module.get_session()
+        session.add(Poll(question="Busy?", answer_a="A", answer_b="B", is_active=True))
+        session.commit()
+        active_poll_cache.invalidate()
+
+        blocker = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        blocker.execute("BEGIN IMMEDIATE")
+        yield blocker
+        blocker.close()
+        session.remove()
+
+    def it_retries_votes_until_the_lock_is_released(client, locked):
+        threading.Timer(0.3, locked.rollback).start()
+
+        response = client.post("/api/vote?answer=A", headers={"X-Vote-Password": "vote123"})
+
+        assert response.status_code == 200
+        assert db_module.get_session().query(Vote).count() == 1
+
+    def it_answers_503_once_the_lock_wait_runs_out(app, client, locked):
+        app.config["SQLITE_LOCK_RETRY_MS"] = 100
+        headers = {"X-Vote-Password": "vote123"}
+
+        single = client.post("/api/vote?answer=A", headers=headers)
+        batch = client.post("/api/votes/batch", json=[{"answer": "B"}], headers=headers)
+
+        assert single.status_code == 503
+        assert batch.status_code == 503
+        locked.rollback()
+        session = db_module.get_session()
+        assert session.query(Vote).count() == 0
+        assert tally.get_counts(session.query(Poll).one(), session) == {"A": 0, "B": 0}
+
+
+def describe_display_data_api():
+
+    def it_sends_a_strong_etag(client, db_session):
+        poll = Poll(question="Test?", answer_a="A", answer_b="B", is_active=True)
+        db_session.add(poll)
+        db_session.commit()
+
+        response = client.get("/api/display/data")
+
+        assert response.status_code == 200
+        assert response.headers["ETag"].startswith('"')
+        assert response.headers["Cache-Control"] == "no-cache"
+
+    def it_returns_not_modified_for_a_matching_etag(client, db_session):
+        poll = Poll(question="Test?", answer_a="A", answer_b="B", is_active=True)
+        db_session.add(poll)
+        db_session.commit()
+
+        etag = client.get("/api/display/data").headers["ETag"]
+        response = client.get("/api/display/data", headers={"If-None-Match": etag})
+
+        assert response.status_code == 304
+        assert response.data == b""
+
+    def it_changes_the_etag_after_a_vote(client, db_session):
+        poll = Poll(question="Test?", answer_a="A", answer_b="B", is_active=True)
+        db_session.add(poll)
+        db_session.commit()
+
+        etag = client.get("/api/display/data").headers["ETag"]
+        client.post("/api/vote?answer=A", headers={"X-Vote-Password": "vote123"})
+        response = client.get("/api/display/data", headers={"If-None-Match": etag})
+
+        assert response.status_code == 200
+        assert response.headers["ETag"] != etag
+        assert json.loads(response.data)["poll"]["count_a"] == 1
+
+    def it_sends_an_etag_when_there_is_no_active_poll(client, db_session):
+        response = client.get("/api/display/data")
+        etag = response.headers["ETag"]
+
+        assert json.loads(response.data) == {"poll": None}
+        assert client.get(
+            "/api/display/data", headers={"If-None-Match": etag}
+        ).status_code == 304
+
+
+def questions(response):
+    return [item["poll"]["question"] for item in json.loads(response.data)["polls"]]
+
+
+def describe_completed_polls_api():
+
+    @pytest.fixture
+    def completed(db_session):
+        # Two polls share a created_at so paging must break the tie by id
+        polls = [
+            Poll(question=f"Q{i}?", answer_a="A", answer_b="B",
+                 created_at=datetime(2024, 1, 1 + min(i, 5)))
+            for i in range(7)
+        ]
+        db_session.add_all(polls)
+        db_session.commit()
+        return polls
+
+    def it_returns_the_newest_page_first(client, completed):
+        response = client.get("/api/polls/completed?limit=4")
+
+        assert response.status_code == 200
+        assert questions(response) == ["Q6?", "Q5?", "Q4?", "Q3?"]
+        assert json.loads(response.data)["next"] is not None
+
+    def it_continues_after_the_cursor(client, completed):
+        cursor = json.loads(client.get("/api/polls/completed?limit=3").data)["next"]
+
+        response = client.get("/api/polls/completed", query_string={"after": cursor, "limit": 3})
+
+        assert questions(response) == ["Q3?", "Q2?", "Q1?"]
+
+    def it_walks_every_poll_exactly_once(client, completed):
+        seen, cursor = [], None
+        while True:
+            params = {"limit": 2, **({"after": cursor} if cursor else {})}
+            data = json.loads(client.get("/api/polls/completed", query_string=params).data)
+            seen += [item["poll"]["question"] for item in data["polls"]]
+            cursor = data["next"]
+            if cursor is None:
+                break
+
+        assert seen == [f"Q{i}?" for i in range(6, -1, -1)]
+
+    def it_includes_frozen_results(client, db_session):
+        poll = Poll(question="Frozen?", answer_a="A", answer_b="B")
+        db_session.add(poll)
+        db_session.commit()
+        db_session.add(PollResult(
+            poll_id=poll.id, count_a=3, count_b=1, total=4, percent_a=75.0, percent_b=25.0,
+        ))
+        db_session.commit()
+
+        item = json.loads(client.get("/api/polls/completed").data)["polls"][0]
+
+        assert (item["count_a"], item["count_b"], item["percent_a"]) == (3, 1, 75.0)
+
+    def it_excludes_the_active_poll(client, db_session):
+        db_session.add(Poll(question="Live?", answer_a="A", answer_b="B", is_active=True))
+        db_session.commit()
+
+        data = json.loads(client.get("/api/polls/completed").data)
+
+        assert data == {"polls": [], "next": None}
+
+    def it_rejects_a_malformed_cursor(client):
+        response = client.get("/api/polls/completed?after=yesterday")
+
+        assert response.status_code == 400
+
+    def it_rejects_an_out_of_range_limit(client):
+        assert client.get("/api/polls/completed?limit=0").status_code == 400
+        assert client.get("/api/polls/completed?limit=500").status_code == 400
+
+
+def describe_poll_timeline_api():
+
+    def it_buckets_a_completed_polls_votes(client, db_session):
+        poll = Poll(question="Done?", answer_a="A", answer_b="B")
+        db_session.add(poll)
+        db_session.commit()
+        db_session.add_all([
+            Vote(poll_id=poll.id, answer="A", timestamp=datetime(2024, 1, 1, 12, 0, 5)),
+            Vote(poll_id=poll.id, answer="B", timestamp=datetime(2024, 1, 1, 12, 0, 9)),
+            Vote(poll_id=poll.id, answer="A", timestamp=datetime(2024, 1, 1, 12, 0, 42)),
+        ])
+        db_session.commit()
+
+        response = client.get(f"/api/polls/{poll.id}/timeline?bucket=10s")
+
+        assert response.status_code == 200
+        data = json.loads(response.data)
+        start = int(datetime(2024, 1, 1, 12, 0, tzinfo=timezone.utc).timestamp())
+        assert data["live"] is False
+        assert data["buckets"] == [
+            {"t": start, "count_a": 1, "count_b": 1},
+            {"t": start + 40, "count_a": 1, "count_b": 0},
+        ]
+
+    def it_follows_votes_on_the_active_poll(client, db_session):
+        poll = Poll(question="Live?", answer_a="A", answer_b="B", is_active=True)
+        db_session.add(poll)
+        db_session.commit()
+        headers = {"X-Vote-Password": "vote123"}
+
+        client.post("/api/vote?answer=A", headers=headers)
+        client.get(f"/api/polls/{poll.id}/timeline?bucket=1m")
+        client.post("/api/vote?answer=B", headers=headers)
+        client.post("/api/vote?answer=B", headers=headers)
+
+        data = json.loads(client.get(f"/api/polls/{poll.id}/timeline?bucket=1m").data)
+        assert data["live"] is True
+        assert sum(bucket["count_a"] for bucket in data["buckets"]) == 1
+        assert sum(bucket["count_b"] for bucket in data["buckets"]) == 2
+
+    def it_rejects_an_unknown_bucket(client, db_session):
+        poll = Poll(question="Test?", answer_a="A", answer_b="B")
+        db_session.add(poll)
+        db_session.commit()
+
+        response = client.get(f"/api/polls/{poll.id}/timeline?bucket=5m")
+
+        assert response.status_code == 400
+
+    def it_returns_404_for_a_missing_poll(client):
+        response = client.get("/api/polls/999/timeline")
+
+        assert response.status_code == 404
+        assert json.loads(response.data)["error"] == "Poll not found"
@@ -1,5 +1,6 @@
 import pytest
-from app import create_app
+from app import create_app, socketio
+from app.config import ProductionConfig
 
 
 def describe_application_setup():
@@ -25,6 +26,12 @@ def describe_application_setup():
         assert hasattr(app, 'extensions')
         assert 'socketio' in app.extensions or True
 
+    def it_runs_socketio_on_the_configured_async_mode():
+        create_app()
+
+        assert socketio.async_mode == 'threading'
+        assert ProductionConfig.SOCKETIO_ASYNC_MODE == 'gevent'
+
     def it_has_index_route(client=None):
         app = create_app()
         client = app.test_client()
@@ -0,0 +1,190 @@
+import threading
+import time
+
+import pytest
+
+from app.broadcast import BroadcastDispatcher, VoteBroadcaster
+from app.tally import tally
+
+
+class RecordingEmit:
+
+    def __init__(self):
+        self.events = []
+        self.lock = threading.Lock()
+
+    def __call__(self, event, payload):
+        with self.lock:
+            self.events.append((event, payload))
+
+    @property
+    def payloads(self):
+        return [payload for _, payload in self.events]
+
+
+def counts(a, b):
+    return {"A": a, "B": b}
+
+
+@pytest.fixture(autouse=True)
+def empty_tally():
+    tally.invalidate()
+
+
+def describe_vote_broadcaster():
+
+    def it_pushes_counts_with_the_first_vote_immediately():
+        emit = RecordingEmit()
+        broadcaster = VoteBroadcaster(window_ms=50, emit=emit)
+
+        broadcaster.vote_cast(1, counts(1, 0))
+
+        assert emit.events == [(
+            "vote_cast",
+            {"poll_id": 1, "count_a": 1, "count_b": 0, "votes": 1, "seq": 1},
+        )]
+
+    def it_merges_votes_inside_the_window_into_one_trailing_event():
+        emit = RecordingEmit()
+        broadcaster = VoteBroadcaster(window_ms=50, emit=emit)
+
+        for a in range(1, 11):
+            broadcaster.vote_cast(1, counts(a, 0))
+        broadcaster.vote_cast(1, counts(10, 5), votes=5)
+        assert len(emit.events) == 1
+
+        time.sleep(0.2)
+
+        assert emit.payloads[1] == {
+            "poll_id": 1, "count_a": 10, "count_b": 5, "votes": 14, "seq": 2,
+        }
+        assert len(emit.events) == 2
+
+    def it_sends_nothing_trailing_for_a_lone_vote():
+        emit = RecordingEmit()
+        broadcaster = VoteBroadcaster(window_ms=20, emit=emit)
+
+        broadcaster.vote_cast(1, counts(1, 0))
+        time.sleep(0.1)
+
+        assert len(emit.events) == 1
+
+    def it_coalesces_each_poll_separately():
+        emit = RecordingEmit()
+        broadcaster = VoteBroadcaster(window_ms=50, emit=emit)
+
+        broadcaster.vote_cast(1, counts(1, 0))
+        broadcaster.vote_cast(2, counts(0, 1))
+
+        assert [payload["poll_id"] for payload in emit.payloads] == [1, 2]
+
+    def it_numbers_events_consecutively():
+        emit = RecordingEmit()
+        broadcaster = VoteBroadcaster(window_ms=0, emit=emit)
+
+        for a in range(1, 4):
+            broadcaster.vote_cast(1, counts(a, 0))
+
+        assert [payload["seq"] for payload in emit.payloads] == [1, 2, 3]
+        assert broadcaster.seq == 3
+
+    def it_prefers_the_live_tally_over_stale_caller_counts():
+        class Snapshot:
+            id = 7
+
+            def get_vote_counts(self, session):
+                return counts(9, 9)
+
+        tally.get_counts(Snapshot(), session=None)
+        emit = RecordingEmit()
+        broadcaster = VoteBroadcaster(window_ms=0, emit=emit)
+
+        broadcaster.vote_cast(7, counts(3, 3))
+
+        assert (emit.payloads[0]["count_a"], emit.payloads[0]["count_b"]) == (9, 9)
+
+    def it_survives_emit_failures():
+        def failing_emit(event, payload):
+            raise RuntimeError("socket down")
+
+        dispatcher = BroadcastDispatcher(emit=failing_emit)
+        broadcaster = VoteBroadcaster(window_ms=0, emit=dispatcher.submit)
+
+        broadcaster.vote_cast(1, counts(1, 0))
+        broadcaster.vote_cast(1, counts(2, 0))
+        dispatcher.stop()
+
+        assert dispatcher.stats()["failed"] == 2
+        assert broadcaster.seq == 2
+
+    def it_sends_the_new_poll_with_the_current_seq_on_activation():
+        emit = RecordingEmit()
+        broadcaster = VoteBroadcaster(window_ms=0, emit=emit)
+        broadcaster.vote_cast(1, counts(1, 0))
+        poll = {"id": 2, "question": "Q?", "answer_a": "A", "answer_b": "B",
+                "count_a": 0, "count_b": 0}
+
+        broadcaster.poll_activated(poll)
+
+        assert emit.events[-1] == (
+            "poll_activated", {"poll_id": 2, "poll": poll, "seq": 1},
+        )
+        assert broadcaster.seq == 1
+
+
+def describe_broadcast_dispatcher():
+
+    def it_emits_events_in_submission_order_off_the_calling_thread():
+        emit = RecordingEmit()
+        threads = []
+        dispatcher = BroadcastDispatcher(
+            emit=lambda event, payload: (threads.append(threading.current_thread()),
+                                         emit(event, payload))
+        )
+
+        for seq in range(1, 6):
+            dispatcher.submit("vote_cast", {"poll_id": 1, "seq": seq})
+        dispatcher.stop()
+
+        assert [payload["seq"] for payload in emit.payloads] == [1, 2, 3, 4, 5]
+        assert threading.current_thread() not in threads
+
+    def it_does_not_block_the_caller_on_a_slow_emit():
+        release = threading.Event()
+        dispatcher = BroadcastDispatcher(emit=lambda event, payload: release.wait(5))
+
+        started = time.perf_counter()
+        for _ in range(3):
+            dispatcher.submit("vote_cast", {"poll_id": 1})
+        elapsed = time.perf_counter() - started
+        release.set()
+        dispatcher.stop()
+
+        assert elapsed < 0.5
+        assert dispatcher.stats()["emitted"] == 3
+
+    def it_drops_and_counts_events_when_the_queue_is_full():
+        release = threading.Event()
+        dispatcher = BroadcastDispatcher(emit=lambda event, payload: release.wait(5), max_size=2)
+
+        for _ in range(10):
+            dispatcher.submit("vote_cast", {"poll_id": 1})
+        stats = dispatcher.stats()
+        release.set()
+        dispatcher.stop()
+
+        assert stats["dropped"] >= 7
+        assert stats["queue_depth"] <= 2
+
+    def it_reports_queue_wait_and_emit_latency():
+        dispatcher = BroadcastDispatcher(emit=lambda event, payload: time.sleep(0.02))
+
+        dispatcher.submit("vote_cast", {"poll_id": 1})
+        dispatcher.stop()
+
+        stats = dispatcher.stats()
+        assert stats["emitted"] == 1
+        assert stats["emit_seconds_max"] >= 0.02
+        assert stats["emit_seconds_total"] >= 0.02
+        assert stats["wait_seconds_max"] >= 0
+        assert stats["queue_depth"] == 0
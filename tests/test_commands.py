@@ -0,0 +1,88 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import scoped_session, sessionmaker
+
+from app import create_app
+from app import database as db_module
+from app.config import Config
+from app.models import Base, Poll, PollResult, Vote
+
+
+@pytest.fixture
+def app():
+    app = create_app(Config)
+    app.config["TESTING"] = True
+
+    engine = create_engine("sqlite:///:memory:")
+
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragma(dbapi_conn, connection_record):
+        cursor = dbapi_conn.cursor()
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.close()
+
+    Base.metadata.create_all(engine)
+    Session = scoped_session(sessionmaker(bind=engine))
+
+    db_module._session = Session
+
+    yield app
+
+    Session.remove()
+
+
+@pytest.fixture
+def db_session(app):
+    return db_module._session
+
+
+def describe_reconcile_counts_command():
+
+    def it_recomputes_counters_from_votes(app, db_session):
+        poll = Poll(question="Drifted?", answer_a="A", answer_b="B", count_a=7)
+        db_session.add(poll)
+        db_session.commit()
+        db_session.execute(Vote.__table__.insert(), [
+            {"poll_id": poll.id, "answer": "B"},
+            {"poll_id": poll.id, "answer": "B"},
+        ])
+        db_session.commit()
+        poll_id = poll.id
+
+        result = app.test_cli_runner().invoke(args=["reconcile-counts"])
+
+        assert result.exit_code == 0
+        poll = db_session.get(Poll, poll_id)
+        assert (poll.count_a, poll.count_b) == (0, 2)
+
+
+def describe_compact_votes_command():
+
+    def it_compacts_polls_past_the_retention_period(app, db_session):
+        old = Poll(question="Old?", answer_a="A", answer_b="B", count_a=1, count_b=1,
+                   completed_at=datetime.utcnow() - timedelta(days=40))
+        recent = Poll(question="Recent?", answer_a="A", answer_b="B", count_a=1,
+                      completed_at=datetime.utcnow() - timedelta(days=1))
+        db_session.add_all([old, recent])
+        db_session.commit()
+        db_session.add_all([
+            Vote(poll_id=old.id, answer="A"),
+            Vote(poll_id=old.id, answer="B"),
+            Vote(poll_id=recent.id, answer="A"),
+            PollResult(poll_id=old.id, **PollResult.summarize(1, 1)),
+            PollResult(poll_id=recent.id, **PollResult.summarize(1, 0)),
+        ])
+        db_session.commit()
+        old_id, recent_id = old.id, recent.id
+
+        result = app.test_cli_runner().invoke(
+            args=["compact-votes", "--retention-days", "30", "--no-vacuum"]
+        )
+
+        assert result.exit_code == 0, result.output
+        assert f"Poll {old_id}: compacted 2 votes" in result.output
+        assert db_session.query(Vote).filter_by(poll_id=old_id).count() == 0
+        assert db_session.query(Vote).filter_by(poll_id=recent_id).count() == 1
+        assert Poll.count_votes(db_session, [old_id])[old_id] == {"A": 1, "B": 1}
@@ -0,0 +1,162 @@
+import os
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import insert
+
+from app.compaction import compact_polls, compactable_polls, reclaim_space
+from app.config import Config
+from app.database import get_session, init_db, sqlite_pragmas
+from app.models import Poll, PollResult, Vote, VoteBucket
+from app.timeline import query_timeline
+
+CONFIG = {key: getattr(Config, key) for key in dir(Config) if key.isupper()}
+NOW = datetime(2024, 3, 1)
+RETENTION = timedelta(days=30)
+
+
+@pytest.fixture
+def engine(tmp_path):
+    return init_db(
+        f"sqlite:///{tmp_path / 'votes.db'}", pragmas=sqlite_pragmas(CONFIG), pool_size=4
+    )
+
+
+@pytest.fixture
+def session(engine):
+    session = get_session()
+    yield session
+    session.remove()
+
+
+def completed_poll(session, votes, completed_at, start=datetime(2024, 1, 1, 12)):
+    """A completed poll with one vote per second, alternating A and B"""
+    poll = Poll(question="Done?", answer_a="A", answer_b="B", completed_at=completed_at)
+    session.add(poll)
+    session.commit()
+    session.execute(insert(Vote.__table__), [
+        {"poll_id": poll.id, "answer": "AB"[i % 2], "timestamp": start + timedelta(seconds=i)}
+        for i in range(votes)
+    ])
+    Poll.reconcile_counts(session)
+    PollResult.freeze(session, [poll.id])
+    session.commit()
+    return poll
+
+
+def describe_compactable_polls():
+
+    def it_selects_polls_completed_before_the_retention_period(session):
+        old = completed_poll(session, 4, completed_at=NOW - timedelta(days=31))
+        completed_poll(session, 4, completed_at=NOW - timedelta(days=29))
+        active = completed_poll(session, 4, completed_at=NOW - timedelta(days=60))
+        active.is_active = True
+        session.commit()
+
+        assert compactable_polls(session, RETENTION, NOW) == [old.id]
+
+    def it_keeps_the_retention_clock_when_results_are_refrozen(session):
+        old = completed_poll(session, 4, completed_at=NOW - timedelta(days=31))
+
+        # reconcile-counts and admin vote edits freeze results again
+        PollResult.freeze(session, [old.id])
+        session.commit()
+
+        assert compactable_polls(session, RETENTION, NOW) == [old.id]
+
+    def it_skips_polls_already_compacted(session):
+        completed_poll(session, 4, completed_at=NOW - timedelta(days=31))
+        compact_polls(session, RETENTION, now=NOW)
+
+        assert compactable_polls(session, RETENTION, NOW) == []
+
+
+def describe_compact_polls():
+
+    def it_replaces_raw_votes_with_bucket_counts(session):
+        poll = completed_poll(session, 25, completed_at=NOW - timedelta(days=31))
+
+        assert compact_polls(session, RETENTION, bucket_seconds=10, now=NOW) == {poll.id: 25}
+
+        assert session.query(Vote).filter_by(poll_id=poll.id).count() == 0
+        buckets = session.query(VoteBucket.count_a, VoteBucket.count_b).filter_by(
+            poll_id=poll.id
+        ).order_by(VoteBucket.bucket_start).all()
+        assert [tuple(bucket) for bucket in buckets] == [(5, 5), (5, 5), (3, 2)]
+
+    def it_keeps_results_counts_and_timelines_intact(session):
+        poll = completed_poll(session, 130, completed_at=NOW - timedelta(days=31))
+        result = session.get(PollResult, poll.id).as_dict()
+        timelines = {seconds: query_timeline(session, poll.id, seconds) for seconds in (1, 10, 60)}
+
+        compact_polls(session, RETENTION, now=NOW)
+        session.expire_all()
+
+        assert session.get(PollResult, poll.id).as_dict() == result
+        assert Poll.count_votes(session, [poll.id])[poll.id] == {"A": 65, "B": 65}
+        for seconds, timeline in timelines.items():
+            assert query_timeline(session, poll.id, seconds) == timeline
+
+    def it_merges_votes_cast_after_an_earlier_compaction(session):
+        poll = completed_poll(session, 4, completed_at=NOW - timedelta(days=31))
+        compact_polls(session, RETENTION, now=NOW)
+        session.add(Vote(poll_id=poll.id, answer="A", timestamp=datetime(2024, 1, 1, 12)))
+        session.commit()
+
+        compact_polls(session, RETENTION, now=NOW)
+
+        first = session.query(VoteBucket).filter_by(poll_id=poll.id).order_by(
+            VoteBucket.bucket_start
+        ).first()
+        assert (first.count_a, first.count_b) == (2, 0)
+
+    def it_lets_admins_lower_the_counts_of_a_compacted_poll(session):
+        poll = completed_poll(session, 6, completed_at=NOW - timedelta(days=31))
+        compact_polls(session, RETENTION, now=NOW)
+
+        Poll.set_vote_counts(session, poll.id, 1, 3)
+        session.commit()
+
+        assert Poll.count_votes(session, [poll.id])[poll.id] == {"A": 1, "B": 3}
+
+    def it_deletes_buckets_with_their_poll(session):
+        poll = completed_poll(session, 4, completed_at=NOW - timedelta(days=31))
+        compact_polls(session, RETENTION, now=NOW)
+
+        Poll.delete_polls(session, [poll.id])
+        session.commit()
+
+        assert session.query(VoteBucket).count() == 0
+
+
+def describe_reclaim_space():
+
+    def it_creates_new_databases_with_incremental_auto_vacuum(engine):
+        with engine.connect() as connection:
+            assert connection.exec_driver_sql("PRAGMA auto_vacuum").scalar() == 2
+
+    def it_shrinks_the_database_file_after_compaction(engine, session, tmp_path):
+        completed_poll(session, 20000, completed_at=NOW - timedelta(days=31))
+        reclaim_space(engine)
+        before = os.path.getsize(tmp_path / "votes.db")
+
+        compact_polls(session, RETENTION, bucket_seconds=60, now=NOW)
+        session.remove()
+        reclaim_space(engine)
+
+        assert os.path.getsize(tmp_path / "votes.db") < before / 4
+        with engine.connect() as connection:
+            assert connection.exec_driver_sql("PRAGMA freelist_count").scalar() == 0
+
+    def it_vacuums_databases_created_without_auto_vacuum(tmp_path):
+        plain = init_db(f"sqlite:///{tmp_path / 'plain.db'}")
+        with plain.connect() as connection:
+            assert connection.exec_driver_sql("PRAGMA auto_vacuum").scalar() == 0
+
+        engine = init_db(
+            f"sqlite:///{tmp_path / 'plain.db'}", pragmas=sqlite_pragmas(CONFIG), pool_size=4
+        )
+        reclaim_space(engine)
+
+        with engine.connect() as connection:
+            assert connection.exec_driver_sql("PRAGMA auto_vacuum").scalar() == 2
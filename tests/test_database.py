@@ -0,0 +1,116 @@
+import gc
+import os
+
+import pytest
+from sqlalchemy.pool import QueuePool
+
+from app import create_app
+from app.config import Config
+from app.database import get_session, init_db, sqlite_pragmas
+from app.models import Poll
+
+CONFIG = {key: getattr(Config, key) for key in dir(Config) if key.isupper()}
+
+
+def pragma(engine, name):
+    with engine.connect() as connection:
+        return connection.exec_driver_sql(f"PRAGMA {name}").scalar()
+
+
+def describe_sqlite_profile():
+
+    def it_applies_the_configured_pragmas_to_new_connections(tmp_path):
+        engine = init_db(
+            f"sqlite:///{tmp_path / 'tuned.db'}",
+            pragmas=sqlite_pragmas(CONFIG),
+            pool_size=4,
+        )
+
+        assert pragma(engine, "journal_mode") == "wal"
+        assert pragma(engine, "synchronous") == 1  # NORMAL
+        assert pragma(engine, "busy_timeout") == CONFIG["SQLITE_BUSY_TIMEOUT_MS"]
+        assert pragma(engine, "cache_size") == CONFIG["SQLITE_CACHE_SIZE"]
+        assert pragma(engine, "foreign_keys") == 1
+
+    def it_pools_connections_for_file_databases(tmp_path):
+        engine = init_db(f"sqlite:///{tmp_path / 'pooled.db'}", pool_size=4)
+
+        assert isinstance(engine.pool, QueuePool)
+        assert engine.pool.size() == 4
+
+    def it_leaves_in_memory_databases_on_the_default_pool():
+        engine = init_db("sqlite:///:memory:", pool_size=4)
+
+        assert not isinstance(engine.pool, QueuePool)
+
+    def it_keeps_sqlite_defaults_without_a_profile(tmp_path):
+        engine = init_db(f"sqlite:///{tmp_path / 'plain.db'}")
+
+        assert pragma(engine, "journal_mode") == "delete"
+
+
+def _rss_kb():
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+
+
+@pytest.fixture
+def app(tmp_path):
+    class TestConfig(Config):
+        DATABASE_URL = f"sqlite:///{tmp_path / 'votes.db'}"
+        VOTE_PASSWORD = "vote123"
+        VOTE_BROADCAST_WINDOW_MS = 0
+        TESTING = True
+
+    app = create_app(TestConfig)
+    session = get_session()
+    session.add(Poll(question="Test?", answer_a="A", answer_b="B", is_active=True))
+    session.commit()
+    session.remove()
+    return app
+
+
+def describe_request_sessions():
+
+    def it_removes_the_session_when_the_request_ends(app):
+        client = app.test_client()
+
+        client.post("/api/vote?answer=A", headers={"X-Vote-Password": "vote123"})
+
+        assert not get_session().registry.has()
+
+    def it_returns_the_connection_after_a_read_only_request(app):
+        client = app.test_client()
+
+        client.get("/api/display/data")
+
+        # An open read transaction would pin the WAL snapshot and stop checkpoints
+        assert get_session().get_bind().pool.checkedout() == 0
+
+    def it_rolls_back_uncommitted_work_at_teardown(app):
+        with app.app_context():
+            get_session().add(Poll(question="Never?", answer_a="A", answer_b="B"))
+
+        assert get_session().query(Poll).filter_by(question="Never?").count() == 0
+
+    @pytest.mark.skipif(not os.path.exists("/proc/self/status"), reason="needs /proc")
+    def it_keeps_resident_memory_flat_across_thousands_of_votes(app):
+        client = app.test_client()
+        headers = {"X-Vote-Password": "vote123"}
+
+        def vote(times):
+            for i in range(times):
+                client.post(f"/api/vote?answer={'AB'[i % 2]}", headers=headers)
+                client.get("/api/display/data")
+            gc.collect()
+
+        vote(500)  # warm up pools, caches and the allocator
+        before = _rss_kb()
+        vote(3000)
+        growth_kb = _rss_kb() - before
+
+        assert growth_kb < 4 * 1024
+        counts = get_session().query(Poll.count_a, Poll.count_b).one()
+        assert sum(counts) == 3500
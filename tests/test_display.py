@@ -3,8 +3,10 @@ from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker, scoped_session
 from app import create_app
 from app.config import Config
-from app.models import Base, Poll, Vote
+from app.models import Base, Poll, PollResult, Vote
+from app.tally import tally
 from app import database as db_module
+from app.active_poll import active_poll_cache
 
 
 @pytest.fixture
@@ -27,6 +29,8 @@ def app():
 
     # Override the database session with the test session
     db_module._session = Session
+    tally.invalidate()
+    active_poll_cache.invalidate()
 
     yield app
 
@@ -56,6 +60,8 @@ def describe_display_interface():
         assert b'Test Question?' in response.data
         assert b'Option A' in response.data
         assert b'Option B' in response.data
+        assert f'data-poll-id="{poll.id}"'.encode() in response.data
+        assert b'data-seq=' in response.data
 
     def it_displays_vote_counts_for_each_answer(client, db_session):
         poll = Poll(question="Test?", answer_a="A", answer_b="B", is_active=True)
@@ -82,6 +88,13 @@ def describe_display_interface():
         assert response.status_code == 200
         assert b'No active poll' in response.data or b'no poll' in response.data.lower()
 
+    def it_renders_hidden_poll_markup_to_fill_in_on_activation(client, db_session):
+        response = client.get('/display')
+
+        assert b'<div class="split-container" hidden>' in response.data
+        assert b'id="question"' in response.data
+        assert b'data-seq=' in response.data
+
 
 def describe_display_no_votes_interface():
 
@@ -167,6 +180,21 @@ def describe_completed_polls_display():
         assert b"2" in response.data  # count_a
         assert b"1" in response.data  # count_b
 
+    def it_reads_frozen_results_instead_of_live_counts(client, db_session):
+        poll = Poll(question="Frozen?", answer_a="Yes", answer_b="No", is_active=False)
+        db_session.add(poll)
+        db_session.commit()
+        db_session.add(PollResult(
+            poll_id=poll.id, count_a=41, count_b=59, total=100,
+            percent_a=41.0, percent_b=59.0,
+        ))
+        db_session.commit()
+
+        response = client.get("/display-completed")
+
+        assert b"41 votes (41%)" in response.data
+        assert b"59 votes (59%)" in response.data
+
     def it_excludes_active_polls(client, db_session):
         active_poll = Poll(question="Active?", answer_a="A", answer_b="B", is_active=True)
         completed_poll = Poll(question="Completed?", answer_a="C", answer_b="D", is_active=False)
@@ -187,6 +215,35 @@ def describe_completed_polls_display():
         assert response.status_code == 200
         assert b"No Completed Polls" in response.data or b"no polls" in response.data.lower()
 
+    def it_uses_a_constant_number_of_queries_as_polls_grow(client, db_session, record_statements):
+        statements = record_statements(db_session.get_bind())
+
+        def queries_for_poll_count(total):
+            while db_session.query(Poll).count() < total:
+                poll = Poll(question="Done?", answer_a="A", answer_b="B")
+                db_session.add(poll)
+                db_session.commit()
+                db_session.add(Vote(poll_id=poll.id, answer="B"))
+                db_session.commit()
+            db_session.expire_all()
+            statements.clear()
+            client.get("/display-completed")
+            return len(statements)
+
+        assert queries_for_poll_count(2) == queries_for_poll_count(20)
+
+    def it_renders_only_the_first_page(client, db_session):
+        for i in range(6):
+            db_session.add(Poll(question=f"Archived {i}?", answer_a="A", answer_b="B"))
+        db_session.commit()
+
+        response = client.get("/display-completed")
+
+        assert response.data.count(b'class="poll-card"') == 4
+        assert b"allPolls" not in response.data
+        assert b"data-next-cursor=" in response.data
+        assert b'<span id="total-pages">2</span>' in response.data
+
     def it_orders_polls_by_most_recent(client, db_session):
         from datetime import datetime, timedelta
 
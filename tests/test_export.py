@@ -0,0 +1,128 @@
+import csv
+import io
+import json
+import tracemalloc
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event, insert
+
+from app.config import Config
+from app.database import init_db, sqlite_pragmas
+from app.export import export_chunks, vote_rows
+from app.models import Poll, Vote
+
+CONFIG = {key: getattr(Config, key) for key in dir(Config) if key.isupper()}
+START = datetime(2024, 1, 1, 12, 0)
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = init_db(
+        f"sqlite:///{tmp_path / 'votes.db'}", pragmas=sqlite_pragmas(CONFIG), pool_size=4
+    )
+    with engine.begin() as connection:
+        connection.execute(insert(Poll.__table__), [
+            {"id": 1, "question": "First?", "answer_a": "A", "answer_b": "B",
+             "is_active": False, "created_at": START},
+            {"id": 2, "question": "Second?", "answer_a": "A", "answer_b": "B",
+             "is_active": True, "created_at": START},
+        ])
+    return engine
+
+
+def add_votes(engine, poll_id, count, start=START):
+    with engine.begin() as connection:
+        connection.execute(insert(Vote.__table__), [
+            {"poll_id": poll_id, "answer": "AB"[i % 2], "timestamp": start + timedelta(seconds=i)}
+            for i in range(count)
+        ])
+
+
+def describe_vote_rows():
+
+    def it_reads_one_poll_in_time_order(engine):
+        add_votes(engine, 1, 3, start=START + timedelta(minutes=1))
+        add_votes(engine, 2, 2)
+        add_votes(engine, 1, 1)
+
+        rows = list(vote_rows(engine, poll_id=1))
+
+        assert [row.poll_id for row in rows] == [1, 1, 1, 1]
+        assert [row.timestamp for row in rows] == sorted(row.timestamp for row in rows)
+
+    def it_reads_a_time_range_across_polls(engine):
+        add_votes(engine, 1, 10)
+        add_votes(engine, 2, 10)
+
+        rows = list(vote_rows(
+            engine, start=START + timedelta(seconds=2), end=START + timedelta(seconds=5)
+        ))
+
+        assert len(rows) == 6
+        assert {row.poll_id for row in rows} == {1, 2}
+        assert [row.timestamp for row in rows] == sorted(row.timestamp for row in rows)
+
+    def it_reads_a_time_range_from_the_timestamp_index(engine):
+        plans = []
+
+        @event.listens_for(engine, "before_cursor_execute")
+        def explain(conn, cursor, statement, parameters, context, executemany):
+            if statement.startswith("SELECT"):
+                plan = cursor.execute(f"EXPLAIN QUERY PLAN {statement}", parameters)
+                plans.append(plan.fetchall())
+
+        list(vote_rows(engine, start=START, end=START + timedelta(hours=1)))
+
+        assert "ix_votes_timestamp" in str(plans[-1])
+        assert "TEMP B-TREE" not in str(plans[-1])
+
+    def it_streams_in_constant_memory(engine):
+        def peak_bytes(poll_id):
+            tracemalloc.start()
+            try:
+                for _ in export_chunks(vote_rows(engine, poll_id=poll_id), "csv"):
+                    pass
+                return tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+
+        add_votes(engine, 1, 5000)
+        add_votes(engine, 2, 25000)
+        peak_bytes(1)  # warm up statement caches
+
+        assert peak_bytes(2) < peak_bytes(1) * 1.5
+
+    def it_does_not_block_vote_commits_while_exporting(engine):
+        add_votes(engine, 1, 5000)
+        rows = vote_rows(engine, poll_id=1, batch_size=100)
+        next(rows)
+
+        with engine.connect() as connection:
+            connection.exec_driver_sql("PRAGMA busy_timeout = 0")
+            connection.execute(insert(Vote.__table__), [{"poll_id": 2, "answer": "A"}])
+            connection.commit()
+
+        assert sum(1 for _ in rows) == 4999
+
+
+def describe_export_chunks():
+
+    ROWS = [(1, 2, "A", START), (2, 2, "B", START + timedelta(seconds=1))]
+
+    def it_writes_csv_with_a_header():
+        text = "".join(export_chunks(iter(ROWS), "csv"))
+
+        assert list(csv.reader(io.StringIO(text))) == [
+            ["id", "poll_id", "answer", "timestamp"],
+            ["1", "2", "A", "2024-01-01T12:00:00"],
+            ["2", "2", "B", "2024-01-01T12:00:01"],
+        ]
+
+    def it_writes_one_json_object_per_line():
+        lines = "".join(export_chunks(iter(ROWS), "ndjson")).splitlines()
+
+        assert [json.loads(line) for line in lines] == [
+            {"id": 1, "poll_id": 2, "answer": "A", "timestamp": "2024-01-01T12:00:00"},
+            {"id": 2, "poll_id": 2, "answer": "B", "timestamp": "2024-01-01T12:00:01"},
+        ]
@@ -0,0 +1,187 @@
+import json
+import queue
+import sqlite3
+import threading
+import time
+
+import pytest
+from flask import Flask
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import scoped_session, sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app import database as db_module, metrics
+from app.active_poll import active_poll_cache
+from app.config import Config
+from app.ingest import VoteIngestQueue, vote_queue
+from app.models import Base, Poll, Vote
+from app.routes.api import api_bp
+from app.tally import tally
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    app.config["TESTING"] = True
+    app.config["VOTE_INGEST_MODE"] = "batched"
+
+    # The flusher thread must see the same in-memory database
+    engine = create_engine(
+        "sqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragma(dbapi_conn, connection_record):
+        cursor = dbapi_conn.cursor()
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.close()
+
+    Base.metadata.create_all(engine)
+    Session = scoped_session(sessionmaker(bind=engine))
+
+    db_module._session = Session
+    tally.invalidate()
+    active_poll_cache.invalidate()
+    vote_queue.configure(max_size=3, batch_size=2, interval_ms=100)
+
+    app.register_blueprint(api_bp, url_prefix="/api")
+
+    yield app
+
+    vote_queue.drain()
+    Session.remove()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def db_session(app):
+    return db_module._session
+
+
+@pytest.fixture
+def poll(db_session):
+    poll = Poll(question="Test?", answer_a="A", answer_b="B", is_active=True)
+    db_session.add(poll)
+    db_session.commit()
+    return poll
+
+
+HEADERS = {"X-Vote-Password": "vote123"}
+
+
+def describe_batched_vote_ingestion():
+
+    def it_acknowledges_votes_before_they_are_written(client, db_session, poll):
+        client.post("/api/vote?answer=A", headers=HEADERS)
+        response = client.post("/api/vote?answer=B", headers=HEADERS)
+
+        assert response.status_code == 200
+        data = json.loads(response.data)
+        assert data["poll"]["count_a"] == 1
+        assert data["poll"]["count_b"] == 1
+        assert db_session.query(Vote).count() == 0
+
+    def it_writes_queued_votes_and_counters_in_batches(client, db_session, poll):
+        for answer in ["A", "A", "B"]:
+            client.post(f"/api/vote?answer={answer}", headers=HEADERS)
+
+        assert vote_queue.flush() == 2
+        assert vote_queue.flush() == 1
+        assert vote_queue.flush() == 0
+
+        db_session.expire_all()
+        assert db_session.query(Vote).count() == 3
+        assert (poll.count_a, poll.count_b) == (2, 1)
+
+    def it_counts_pending_votes_when_the_tally_reloads(client, db_session, poll):
+        client.post("/api/vote?answer=A", headers=HEADERS)
+        tally.invalidate()
+
+        response = client.get("/api/display/data")
+
+        assert json.loads(response.data)["poll"]["count_a"] == 1
+
+        vote_queue.drain()
+        tally.invalidate()
+        db_session.expire_all()
+
+        response = client.get("/api/display/data")
+        assert json.loads(response.data)["poll"]["count_a"] == 1
+
+    def it_rejects_votes_when_the_queue_is_full(client, db_session, poll):
+        for _ in range(3):
+            client.post("/api/vote?answer=A", headers=HEADERS)
+
+        response = client.post("/api/vote?answer=A", headers=HEADERS)
+
+        assert response.status_code == 503
+        assert json.loads(response.data)["success"] is False
+        assert tally.get_counts(poll, db_session) == {"A": 3, "B": 0}
+
+
+def describe_vote_ingest_queue():
+
+    def it_drains_queued_votes_when_stopped(app, db_session, poll):
+        ingest = VoteIngestQueue(max_size=100, batch_size=10, interval_ms=10000)
+        ingest.start()
+        for _ in range(5):
+            ingest.submit(poll.id, "B")
+
+        ingest.stop()
+
+        assert db_session.query(Vote).filter_by(answer="B").count() == 5
+
+    def it_raises_when_full(app, poll):
+        ingest = VoteIngestQueue(max_size=1, batch_size=10, interval_ms=100)
+        ingest.submit(poll.id, "A")
+
+        with pytest.raises(queue.Full):
+            ingest.submit(poll.id, "A")
+
+        ingest.drain()
+
+    def it_retries_a_batch_while_the_database_is_locked(tmp_path):
+        path = tmp_path / "votes.db"
+        db_module.init_db(
+            f"sqlite:///{path}", pragmas={"journal_mode": "WAL", "busy_timeout": 200},
+            pool_size=2,
+        )
+        session = db_module.get_session()
+        poll = Poll(question="Busy?", answer_a="A", answer_b="B", is_active=True)
+        session.add(poll)
+        session.commit()
+        tally.invalidate()
+        ingest = VoteIngestQueue(max_size=100, batch_size=100, interval_ms=10)
+        for _ in range(10):
+            ingest.submit(poll.id, "A")
+
+        # Hold the write lock well past the busy timeout
+        blocker = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        blocker.execute("BEGIN IMMEDIATE")
+        threading.Timer(1.0, blocker.rollback).start()
+        started = time.monotonic()
+        ingest.drain()
+
+        assert time.monotonic() - started >= 0.9
+        assert session.query(Vote).filter_by(poll_id=poll.id).count() == 10
+        assert tally.get_counts(poll, session) == {"A": 10, "B": 0}
+        blocker.close()
+        session.remove()
+
+    def it_drops_and_counts_batches_the_database_rejects(app, db_session, poll):
+        metrics.reset()
+        ingest = VoteIngestQueue(max_size=100, batch_size=10, interval_ms=100)
+        ingest.submit(poll.id + 1, "A")
+
+        assert ingest.flush() == 1
+
+        assert db_session.query(Vote).count() == 0
+        assert metrics.votes_dropped.collect() == {None: 1}
+        assert ingest.pending() == 0
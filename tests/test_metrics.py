@@ -0,0 +1,202 @@
+import threading
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import scoped_session, sessionmaker
+
+from app import create_app, database as db_module, metrics, socketio
+from app.active_poll import active_poll_cache
+from app.broadcast import BroadcastDispatcher
+from app.config import Config
+from app.metrics import Counter, Gauge, Histogram
+from app.models import Base, Poll
+from app.tally import tally
+
+
+@pytest.fixture
+def app():
+    app = create_app(Config)
+    app.config["TESTING"] = True
+    app.config["ADMIN_SECRET"] = "test-secret"
+    app.config["VOTE_PASSWORD"] = "test-password"
+
+    engine = create_engine("sqlite:///:memory:")
+
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragma(dbapi_conn, connection_record):
+        cursor = dbapi_conn.cursor()
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.close()
+
+    Base.metadata.create_all(engine)
+    Session = scoped_session(sessionmaker(bind=engine))
+
+    db_module._session = Session
+    tally.invalidate()
+    active_poll_cache.invalidate()
+    metrics.reset()
+
+    yield app
+
+    Session.remove()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def db_session(app):
+    return db_module._session
+
+
+def scrape(client):
+    response = client.get("/metrics", headers={"X-Admin-Secret": "test-secret"})
+    assert response.status_code == 200
+    return response.get_data(as_text=True)
+
+
+def describe_metric_types():
+
+    def it_sums_counter_increments_by_label():
+        counter = Counter("things_total", "Things", label="kind")
+        counter.inc(label_value="a")
+        counter.inc(3, label_value="a")
+        counter.inc(label_value="b")
+
+        assert counter.collect() == {"a": 4, "b": 1}
+
+    def it_moves_gauges_both_ways():
+        gauge = Gauge("open", "Open things")
+        gauge.inc()
+        gauge.inc()
+        gauge.dec()
+
+        assert gauge.collect() == {None: 1}
+
+    def it_renders_cumulative_histogram_buckets():
+        histogram = Histogram("wait_seconds", "Waits", label="route", buckets=(0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 2.0):
+            histogram.observe(value, "api.vote")
+
+        assert histogram.render() == [
+            "# HELP wait_seconds Waits",
+            "# TYPE wait_seconds histogram",
+            'wait_seconds_bucket{route="api.vote",le="0.1"} 2',
+            'wait_seconds_bucket{route="api.vote",le="1.0"} 3',
+            'wait_seconds_bucket{route="api.vote",le="+Inf"} 4',
+            'wait_seconds_sum{route="api.vote"} 2.65',
+            'wait_seconds_count{route="api.vote"} 4',
+        ]
+
+    def it_skips_blocks_that_raise_when_timing():
+        histogram = Histogram("commit_seconds", "Commits")
+        with histogram.time():
+            pass
+        with pytest.raises(RuntimeError):
+            with histogram.time():
+                raise RuntimeError
+
+        assert sum(histogram.collect()[None][:-1]) == 1
+
+    def it_folds_pending_observations_without_a_reader():
+        counter = Counter("things_total", "Things", fold_at=10)
+        for _ in range(25):
+            counter.inc()
+
+        assert len(counter._pending) < 10
+        assert counter.collect() == {None: 25}
+
+    def it_loses_no_updates_across_threads():
+        counter = Counter("things_total", "Things", fold_at=100)
+
+        def work():
+            for _ in range(5000):
+                counter.inc()
+
+        threads = [threading.Thread(target=work) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert counter.collect() == {None: 40000}
+
+
+def describe_metrics_endpoint():
+
+    def it_requires_authentication(client):
+        assert client.get("/metrics").status_code == 403
+        assert client.get("/metrics?secret=wrong").status_code == 403
+
+    def it_serves_the_prometheus_text_format(client):
+        response = client.get("/metrics?secret=test-secret")
+
+        assert response.status_code == 200
+        assert response.content_type == "text/plain; version=0.0.4; charset=utf-8"
+        body = response.get_data(as_text=True)
+        assert "# TYPE http_request_duration_seconds histogram" in body
+        assert "# TYPE broadcast_queue_depth gauge" in body
+
+    def it_times_requests_by_endpoint(client):
+        client.get("/api/display/data")
+        client.get("/api/display/data")
+        client.get("/admin/?secret=test-secret")
+
+        body = scrape(client)
+
+        assert 'http_request_duration_seconds_count{endpoint="api.display_data"} 2' in body
+        assert 'http_request_duration_seconds_count{endpoint="admin.index"} 1' in body
+
+    def it_counts_committed_votes_and_commit_latency(client, db_session):
+        db_session.add(Poll(question="Q?", answer_a="A", answer_b="B", is_active=True))
+        db_session.commit()
+        headers = {"X-Vote-Password": "test-password"}
+
+        client.post("/api/vote?answer=A", headers=headers)
+        client.post("/api/votes/batch", headers=headers, json=[{"answer": "B"}] * 3)
+
+        body = scrape(client)
+
+        assert 'votes_ingested_total{path="single"} 1' in body
+        assert 'votes_ingested_total{path="batch"} 3' in body
+        assert 'vote_commit_duration_seconds_count{path="single"} 1' in body
+        assert 'vote_commit_duration_seconds_count{path="batch"} 1' in body
+        assert 'http_request_duration_seconds_count{endpoint="api.vote"} 1' in body
+
+    def it_tracks_connected_socketio_clients(app, client):
+        first = socketio.test_client(app)
+        second = socketio.test_client(app)
+        assert "socketio_connected_clients 2" in scrape(client)
+
+        first.disconnect()
+        assert "socketio_connected_clients 1" in scrape(client)
+        second.disconnect()
+
+
+def describe_collected_stats():
+
+    def it_times_broadcast_fan_out():
+        dispatcher = BroadcastDispatcher(emit=lambda event, payload: None)
+        dispatcher.submit("vote_cast", {"poll_id": 1})
+        dispatcher.stop()
+
+        assert sum(metrics.emit_seconds.collect()[None][:-1]) >= 1
+
+    def it_reports_connection_pool_usage(tmp_path):
+        engine = db_module._create_engine(f"sqlite:///{tmp_path / 'pool.db'}", pool_size=3)
+
+        with engine.connect():
+            body = metrics.render({"queue_depth": 0, "dropped": 0, "failed": 0}, engine)
+
+        assert "db_pool_size 3" in body
+        assert "db_pool_checked_out 1" in body
+        assert "db_pool_overflow 0" in body
+        engine.dispose()
+
+    def it_skips_pool_stats_for_unpooled_databases():
+        body = metrics.render({"queue_depth": 0, "dropped": 0, "failed": 0},
+                              create_engine("sqlite:///:memory:"))
+
+        assert "db_pool_size" not in body
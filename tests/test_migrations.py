@@ -0,0 +1,223 @@
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import pytest
+from sqlalchemy import create_engine, inspect, select, text
+
+from app.database import init_db
+from app.migrations import MIGRATIONS, run_migrations
+from app.models import Vote
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Imports first, then init_db at an agreed moment, so the workers race
+WORKER = (
+    "import sys, time\n"
+    "from app.database import init_db\n"
+    "time.sleep(max(0, float(sys.argv[2]) - time.time()))\n"
+    "init_db(sys.argv[1])\n"
+)
+
+LEGACY_SCHEMA = [
+    """CREATE TABLE polls (
+        id INTEGER NOT NULL,
+        question VARCHAR NOT NULL,
+        answer_a VARCHAR NOT NULL,
+        answer_b VARCHAR NOT NULL,
+        is_active BOOLEAN NOT NULL,
+        created_at DATETIME NOT NULL,
+        PRIMARY KEY (id)
+    )""",
+    """CREATE TABLE votes (
+        id INTEGER NOT NULL,
+        poll_id INTEGER NOT NULL,
+        answer VARCHAR NOT NULL,
+        timestamp DATETIME NOT NULL,
+        PRIMARY KEY (id),
+        FOREIGN KEY(poll_id) REFERENCES polls (id)
+    )""",
+]
+
+
+@pytest.fixture
+def legacy_db(tmp_path):
+    url = f"sqlite:///{tmp_path / 'legacy.db'}"
+    engine = create_engine(url)
+    with engine.begin() as connection:
+        for statement in LEGACY_SCHEMA:
+            connection.execute(text(statement))
+        connection.execute(text(
+            "INSERT INTO polls VALUES (1, 'Old?', 'A', 'B', 1, '2025-01-01 00:00:00'), "
+            "(2, 'Done?', 'A', 'B', 0, '2024-01-01 00:00:00')"
+        ))
+        connection.execute(text(
+            "INSERT INTO votes (poll_id, answer, timestamp) VALUES "
+            "(1, 'A', '2025-01-01 00:00:01'), (1, 'B', '2025-01-01 00:00:02'), "
+            "(1, 'B', '2025-01-01 00:00:03'), (2, 'A', '2024-01-01 00:00:01')"
+        ))
+    engine.dispose()
+    return url
+
+
+def index_names(engine, table):
+    return {index["name"] for index in inspect(engine).get_indexes(table)}
+
+
+def schema_version(engine):
+    with engine.connect() as connection:
+        return connection.execute(text("SELECT version FROM schema_version")).scalar()
+
+
+def describe_run_migrations():
+
+    def it_upgrades_a_legacy_database_on_startup(legacy_db):
+        engine = init_db(legacy_db)
+
+        with engine.connect() as connection:
+            counts = connection.execute(
+                text("SELECT count_a, count_b FROM polls WHERE id = 1")
+            ).one()
+        assert tuple(counts) == (1, 2)
+        assert "ix_votes_poll_id_answer" in index_names(engine, "votes")
+        assert "ix_votes_poll_id_timestamp" in index_names(engine, "votes")
+        assert "ix_polls_active" in index_names(engine, "polls")
+        assert schema_version(engine) == MIGRATIONS[-1][0]
+
+    def it_freezes_results_of_polls_completed_before_upgrade(legacy_db):
+        engine = init_db(legacy_db)
+
+        with engine.connect() as connection:
+            results = connection.execute(
+                text("SELECT poll_id, count_a, count_b, total FROM poll_results")
+            ).all()
+        assert [tuple(row) for row in results] == [(2, 1, 0, 1)]
+
+    def it_backfills_completion_times_from_the_last_vote(legacy_db):
+        engine = init_db(legacy_db)
+
+        with engine.connect() as connection:
+            rows = connection.execute(
+                text("SELECT id, completed_at FROM polls ORDER BY id")
+            ).all()
+        assert [tuple(row) for row in rows] == [(1, None), (2, "2024-01-01 00:00:01.000000")]
+
+    def it_converts_votes_to_the_compact_encoding(legacy_db):
+        engine = init_db(legacy_db)
+
+        with engine.connect() as connection:
+            rows = connection.execute(
+                text("SELECT poll_id, answer, timestamp FROM votes ORDER BY id")
+            ).all()
+            answers = connection.execute(select(Vote.answer).order_by(Vote.id)).scalars().all()
+        assert [tuple(row) for row in rows] == [
+            (1, 0, 1735689601000), (1, 1, 1735689602000),
+            (1, 1, 1735689603000), (2, 0, 1704067201000),
+        ]
+        assert answers == ["A", "B", "B", "A"]
+        assert {"ix_votes_poll_id_answer", "ix_votes_poll_id_timestamp"} <= index_names(
+            engine, "votes"
+        )
+
+    def it_recounts_polls_whose_votes_it_cannot_convert(legacy_db):
+        # A database at version 5 whose counters include votes for a 'C'
+        engine = create_engine(legacy_db)
+        with engine.begin() as connection:
+            connection.execute(text(
+                "INSERT INTO votes (poll_id, answer, timestamp) VALUES "
+                "(1, 'C', '2025-01-01 00:00:04'), (2, 'C', '2024-01-01 00:00:02')"
+            ))
+            for name in ("count_a", "count_b"):
+                connection.execute(text(
+                    f"ALTER TABLE polls ADD COLUMN {name} INTEGER NOT NULL DEFAULT 0"
+                ))
+            connection.execute(text(
+                "UPDATE polls SET count_a = 1, count_b = CASE id WHEN 1 THEN 3 ELSE 1 END"
+            ))
+            connection.execute(text("CREATE TABLE schema_version (version INTEGER NOT NULL)"))
+            connection.execute(text("INSERT INTO schema_version VALUES (5)"))
+        engine.dispose()
+
+        engine = init_db(legacy_db)
+
+        with engine.connect() as connection:
+            counters = connection.execute(
+                text("SELECT id, count_a, count_b FROM polls ORDER BY id")
+            ).all()
+            results = connection.execute(
+                text("SELECT poll_id, count_a, count_b, total FROM poll_results")
+            ).all()
+        assert [tuple(row) for row in counters] == [(1, 1, 2), (2, 1, 0)]
+        assert [tuple(row) for row in results] == [(2, 1, 0, 1)]
+
+    def it_is_a_no_op_once_applied(legacy_db):
+        engine = init_db(legacy_db)
+
+        assert run_migrations(engine) == []
+
+    def it_stamps_a_fresh_database_without_altering_it(tmp_path):
+        engine = init_db(f"sqlite:///{tmp_path / 'fresh.db'}")
+
+        assert schema_version(engine) == MIGRATIONS[-1][0]
+        assert "ix_votes_poll_id_answer" in index_names(engine, "votes")
+
+    def it_lets_workers_starting_together_upgrade_the_same_database(legacy_db):
+        start = time.time() + 3
+        workers = [
+            subprocess.Popen(
+                [sys.executable, "-c", WORKER, legacy_db, str(start)],
+                cwd=ROOT, stderr=subprocess.PIPE, text=True,
+            )
+            for _ in range(3)
+        ]
+        for worker in workers:
+            _, errors = worker.communicate(timeout=60)
+            assert worker.returncode == 0, errors
+
+        engine = create_engine(legacy_db)
+        assert schema_version(engine) == MIGRATIONS[-1][0]
+        with engine.connect() as connection:
+            assert connection.execute(text("SELECT count(*) FROM votes")).scalar() == 4
+
+    def it_only_applies_migrations_newer_than_the_recorded_version(legacy_db):
+        engine = init_db(legacy_db)
+        with engine.begin() as connection:
+            connection.execute(text("UPDATE schema_version SET version = 2"))
+
+        applied = run_migrations(engine)
+
+        assert applied == [version for version, _ in MIGRATIONS if version > 2]
+
+
+def describe_hot_query_indexes():
+
+    def it_serves_the_active_poll_lookup_from_the_partial_index(tmp_path):
+        engine = init_db(f"sqlite:///{tmp_path / 'plan.db'}")
+
+        with engine.connect() as connection:
+            plan = connection.execute(text(
+                "EXPLAIN QUERY PLAN SELECT * FROM polls WHERE polls.is_active = 1"
+            )).all()
+        assert "ix_polls_active" in str(plan)
+
+    def it_pages_completed_polls_from_the_created_at_index(tmp_path):
+        engine = init_db(f"sqlite:///{tmp_path / 'plan.db'}")
+
+        with engine.connect() as connection:
+            plan = connection.execute(text(
+                "EXPLAIN QUERY PLAN SELECT * FROM polls WHERE polls.is_active = 0 "
+                "AND created_at <= '2024-01-01' ORDER BY created_at DESC, id DESC LIMIT 5"
+            )).all()
+        assert "ix_polls_is_active_created_at" in str(plan)
+        assert "TEMP B-TREE" not in str(plan)
+
+    def it_serves_vote_counts_from_the_composite_index(tmp_path):
+        engine = init_db(f"sqlite:///{tmp_path / 'plan.db'}")
+
+        with engine.connect() as connection:
+            plan = connection.execute(text(
+                "EXPLAIN QUERY PLAN SELECT poll_id, answer, count(id) FROM votes "
+                "WHERE poll_id IN (1, 2) GROUP BY poll_id, answer"
+            )).all()
+        assert "ix_votes_poll_id_answer" in str(plan)
@@ -1,9 +1,9 @@
 import pytest
-from datetime import datetime
-from sqlalchemy import create_engine, event
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine, event, text
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.exc import IntegrityError
-from app.models import Base, Poll, Vote
+from app.models import Base, Poll, PollResult, Vote
 
 
 @pytest.fixture
@@ -79,6 +79,60 @@ def describe_poll_model():
         assert poll2.is_active is True
         assert poll3.is_active is False
 
+    def it_freezes_results_of_polls_it_deactivates(db_session):
+        poll1 = Poll(question="Q1?", answer_a="A1", answer_b="B1", is_active=True)
+        poll2 = Poll(question="Q2?", answer_a="A2", answer_b="B2")
+        db_session.add_all([poll1, poll2])
+        db_session.commit()
+        db_session.add_all([
+            Vote(poll_id=poll1.id, answer="A"),
+            Vote(poll_id=poll1.id, answer="A"),
+            Vote(poll_id=poll1.id, answer="A"),
+            Vote(poll_id=poll1.id, answer="B"),
+        ])
+        db_session.commit()
+
+        Poll.activate_poll(db_session, poll2.id)
+        db_session.commit()
+
+        result = db_session.get(PollResult, poll1.id)
+        assert (result.count_a, result.count_b, result.total) == (3, 1, 4)
+        assert (result.percent_a, result.percent_b) == (75.0, 25.0)
+        assert db_session.get(PollResult, poll2.id) is None
+
+    def it_records_when_a_poll_was_completed(db_session):
+        poll1 = Poll(question="Q1?", answer_a="A1", answer_b="B1", is_active=True)
+        poll2 = Poll(question="Q2?", answer_a="A2", answer_b="B2")
+        db_session.add_all([poll1, poll2])
+        db_session.commit()
+        before = datetime.utcnow()
+
+        Poll.activate_poll(db_session, poll2.id)
+        db_session.commit()
+
+        assert poll1.completed_at >= before
+        assert poll2.completed_at is None
+
+        Poll.activate_poll(db_session, poll1.id)
+        db_session.commit()
+
+        assert poll1.completed_at is None
+        assert poll2.completed_at >= before
+
+    def it_drops_frozen_results_when_a_poll_is_reactivated(db_session):
+        poll1 = Poll(question="Q1?", answer_a="A1", answer_b="B1", is_active=True)
+        poll2 = Poll(question="Q2?", answer_a="A2", answer_b="B2")
+        db_session.add_all([poll1, poll2])
+        db_session.commit()
+
+        Poll.activate_poll(db_session, poll2.id)
+        db_session.commit()
+        Poll.activate_poll(db_session, poll1.id)
+        db_session.commit()
+
+        assert db_session.get(PollResult, poll1.id) is None
+        assert db_session.get(PollResult, poll2.id) is not None
+
     def it_calculates_vote_counts_for_answers(db_session):
         poll = Poll(question="Test?", answer_a="A", answer_b="B")
         db_session.add(poll)
@@ -95,6 +149,134 @@ def describe_poll_model():
         assert counts["A"] == 2
         assert counts["B"] == 1
 
+    def it_keeps_stored_counters_in_step_with_votes(db_session):
+        poll = Poll(question="Test?", answer_a="A", answer_b="B")
+        db_session.add(poll)
+        db_session.commit()
+
+        vote_a = Vote(poll_id=poll.id, answer="A")
+        vote_b = Vote(poll_id=poll.id, answer="B")
+        db_session.add_all([vote_a, vote_b])
+        db_session.commit()
+
+        assert (poll.count_a, poll.count_b) == (1, 1)
+
+        db_session.delete(vote_b)
+        db_session.commit()
+
+        assert (poll.count_a, poll.count_b) == (1, 0)
+
+    def it_reads_vote_counts_without_scanning_votes(db_session, record_statements):
+        poll = Poll(question="Test?", answer_a="A", answer_b="B")
+        db_session.add(poll)
+        db_session.commit()
+        db_session.add(Vote(poll_id=poll.id, answer="A"))
+        db_session.commit()
+        db_session.refresh(poll)
+
+        statements = record_statements(db_session.get_bind())
+
+        assert poll.get_vote_counts(db_session) == {"A": 1, "B": 0}
+        assert statements == []
+
+    def it_counts_votes_for_many_polls_in_one_query(db_session, record_statements):
+        polls = [Poll(question=f"Q{i}?", answer_a="A", answer_b="B") for i in range(3)]
+        db_session.add_all(polls)
+        db_session.commit()
+        db_session.add_all([
+            Vote(poll_id=polls[0].id, answer="A"),
+            Vote(poll_id=polls[0].id, answer="B"),
+            Vote(poll_id=polls[1].id, answer="B"),
+        ])
+        db_session.commit()
+        poll_ids = [poll.id for poll in polls]
+
+        statements = record_statements(db_session.get_bind())
+
+        counts = Poll.count_votes(db_session, poll_ids)
+
+        assert counts == {
+            poll_ids[0]: {"A": 1, "B": 1},
+            poll_ids[1]: {"A": 0, "B": 1},
+            poll_ids[2]: {"A": 0, "B": 0},
+        }
+        assert len(statements) == 1
+        assert "GROUP BY" in statements[0]
+
+    def it_counts_nothing_for_no_polls(db_session):
+        assert Poll.count_votes(db_session, []) == {}
+
+    def it_reconciles_counters_from_votes(db_session):
+        poll = Poll(question="Test?", answer_a="A", answer_b="B")
+        other = Poll(question="Other?", answer_a="A", answer_b="B")
+        db_session.add_all([poll, other])
+        db_session.commit()
+
+        db_session.execute(Vote.__table__.insert(), [
+            {"poll_id": poll.id, "answer": "A"},
+            {"poll_id": poll.id, "answer": "B"},
+            {"poll_id": poll.id, "answer": "B"},
+        ])
+        db_session.commit()
+        assert (poll.count_a, poll.count_b) == (0, 0)
+
+        Poll.reconcile_counts(db_session)
+        db_session.commit()
+
+        assert (poll.count_a, poll.count_b) == (1, 2)
+        assert (other.count_a, other.count_b) == (0, 0)
+
+    def it_sets_vote_counts_by_writing_only_the_difference(db_session):
+        poll = Poll(question="Test?", answer_a="A", answer_b="B")
+        db_session.add(poll)
+        db_session.commit()
+        early = datetime(2024, 1, 1, 12, 0, 0)
+        db_session.add_all(
+            [Vote(poll_id=poll.id, answer="A", timestamp=early) for _ in range(3)]
+            + [Vote(poll_id=poll.id, answer="B", timestamp=early)]
+        )
+        db_session.commit()
+        kept_a = sorted(id_ for id_, in db_session.query(Vote.id).filter_by(answer="A"))[:2]
+        kept_b = [id_ for id_, in db_session.query(Vote.id).filter_by(answer="B")]
+
+        Poll.set_vote_counts(db_session, poll.id, 2, 4)
+        db_session.commit()
+
+        votes_a = db_session.query(Vote).filter_by(poll_id=poll.id, answer="A").all()
+        votes_b = db_session.query(Vote).filter_by(poll_id=poll.id, answer="B").all()
+        assert sorted(vote.id for vote in votes_a) == kept_a
+        assert all(vote.timestamp == early for vote in votes_a)
+        assert len(votes_b) == 4
+        assert set(kept_b) <= {vote.id for vote in votes_b}
+        assert sum(vote.timestamp == early for vote in votes_b) == 1
+        assert (poll.count_a, poll.count_b) == (2, 4)
+
+    def it_leaves_vote_deletion_to_the_database_cascade(db_session):
+        poll = Poll(question="Test?", answer_a="A", answer_b="B")
+        db_session.add(poll)
+        db_session.commit()
+        db_session.execute(Vote.__table__.insert(), [{"poll_id": poll.id, "answer": "A"}] * 3)
+        db_session.commit()
+        poll_id = poll.id
+
+        db_session.delete(poll)
+        db_session.commit()
+
+        assert db_session.query(Vote).filter_by(poll_id=poll_id).count() == 0
+
+    def it_repairs_drifted_counters_when_setting_vote_counts(db_session):
+        poll = Poll(question="Test?", answer_a="A", answer_b="B")
+        db_session.add(poll)
+        db_session.commit()
+        db_session.execute(Vote.__table__.insert(), [{"poll_id": poll.id, "answer": "A"}])
+        db_session.commit()
+
+        Poll.set_vote_counts(db_session, poll.id, 1, 0)
+        db_session.commit()
+
+        assert db_session.query(Vote).filter_by(poll_id=poll.id).count() == 1
+        assert (poll.count_a, poll.count_b) == (1, 0)
+
 
 def describe_vote_model():
 
@@ -133,3 +315,26 @@ def describe_vote_model():
         assert vote.timestamp is not None
         assert isinstance(vote.timestamp, datetime)
 
+
+    def it_timestamps_votes_in_the_database_to_the_millisecond(db_session):
+        poll = Poll(question="Test?", answer_a="A", answer_b="B")
+        db_session.add(poll)
+        db_session.commit()
+        before = datetime.utcnow().replace(microsecond=0)
+
+        db_session.execute(Vote.__table__.insert(), [{"poll_id": poll.id, "answer": "B"}])
+        stored = db_session.execute(text("SELECT answer, timestamp FROM votes")).one()
+
+        assert stored.answer == 1
+        assert isinstance(stored.timestamp, int)
+        assert abs(db_session.query(Vote.timestamp).scalar() - before) < timedelta(seconds=5)
+
+    def it_rejects_answers_other_than_a_or_b(db_session):
+        poll = Poll(question="Test?", answer_a="A", answer_b="B")
+        db_session.add(poll)
+        db_session.commit()
+
+        db_session.add(Vote(poll_id=poll.id, answer="C"))
+
+        with pytest.raises(IntegrityError):
+            db_session.commit()
@@ -0,0 +1,193 @@
+"""Two app.serve worker processes sharing a database and a Redis stand-in.
+
+fakeredis's TCP server plays Redis on a local port, so the Socket.IO message
+queue and the shared counter store run exactly as they would in production.
+"""
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from pathlib import Path
+
+import pytest
+from fakeredis import TcpFakeServer
+from wsproto import ConnectionType, WSConnection
+from wsproto.events import Message, Request, TextMessage
+
+from app import database
+from app.models import Poll
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def redis_url():
+    port = _free_port()
+    server = TcpFakeServer(("127.0.0.1", port), server_type="redis")
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"redis://127.0.0.1:{port}/0"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def poll_ids(tmp_path):
+    url = f"sqlite:///{tmp_path / 'votes.db'}"
+    database.init_db(url)
+    session = database.get_session()()
+    first = Poll(question="First?", answer_a="A", answer_b="B", is_active=True)
+    second = Poll(question="Second?", answer_a="C", answer_b="D")
+    session.add_all([first, second])
+    session.commit()
+    ids = (first.id, second.id)
+    session.close()
+    return url, ids
+
+
+def _wait_for(port, timeout=20):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/api/display/data", timeout=1)
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"worker on port {port} did not start")
+
+
+@pytest.fixture
+def workers(redis_url, poll_ids):
+    url, _ = poll_ids
+    ports = [_free_port(), _free_port()]
+    processes = []
+    for port in ports:
+        env = dict(
+            os.environ,
+            DATABASE_URL=url,
+            SERVER_HOST="127.0.0.1",
+            SERVER_PORT=str(port),
+            SOCKETIO_MESSAGE_QUEUE=redis_url,
+            COUNTER_STORE_URL=redis_url,
+            VOTE_PASSWORD="vote123",
+            ADMIN_SECRET="test-secret",
+            VOTE_BROADCAST_WINDOW_MS="0",
+        )
+        processes.append(subprocess.Popen(
+            [sys.executable, "-m", "app.serve"], cwd=ROOT, env=env,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        ))
+    try:
+        for port in ports:
+            _wait_for(port)
+        yield ports
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait()
+
+
+class Display:
+    """Minimal Socket.IO websocket client collecting events"""
+
+    def __init__(self, port):
+        self.sock = socket.create_connection(("127.0.0.1", port), timeout=10)
+        self.ws = WSConnection(ConnectionType.CLIENT)
+        self._send(Request(host="127.0.0.1", target="/socket.io/?EIO=4&transport=websocket"))
+        self.events = []
+        while not any(message.startswith("40") for message in self._read()):
+            pass
+
+    def _send(self, event):
+        self.sock.sendall(self.ws.send(event))
+
+    def _read(self):
+        self.ws.receive_data(self.sock.recv(65536))
+        messages = []
+        for event in self.ws.events():
+            if isinstance(event, TextMessage):
+                if event.data.startswith("0"):
+                    self._send(Message(data="40"))
+                elif event.data == "2":
+                    self._send(Message(data="3"))
+                elif event.data.startswith("42"):
+                    self.events.append(json.loads(event.data[2:]))
+                messages.append(event.data)
+        return messages
+
+    def wait_for(self, name, timeout=10):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            for event, payload in self.events:
+                if event == name:
+                    return payload
+            self.sock.settimeout(max(deadline - time.monotonic(), 0.01))
+            try:
+                self._read()
+            except socket.timeout:
+                break
+        raise AssertionError(f"no {name} event received")
+
+    def close(self):
+        self.sock.close()
+
+
+def _post(port, path, headers):
+    request = urllib.request.Request(
+        f"http://127.0.0.1:{port}{path}", method="POST", headers=headers
+    )
+    return urllib.request.urlopen(request, timeout=10)
+
+
+def _vote(port, answer):
+    return json.load(_post(port, f"/api/vote?answer={answer}", {"X-Vote-Password": "vote123"}))
+
+
+def _display_data(port):
+    return json.load(urllib.request.urlopen(f"http://127.0.0.1:{port}/api/display/data"))
+
+
+def describe_multiple_workers():
+
+    def it_delivers_a_vote_to_displays_on_another_worker(workers):
+        first, second = workers
+        display = Display(second)
+        try:
+            _vote(first, "A")
+
+            payload = display.wait_for("vote_cast")
+        finally:
+            display.close()
+
+        assert (payload["count_a"], payload["count_b"]) == (1, 0)
+
+    def it_shares_counts_and_seq_between_workers(workers):
+        first, second = workers
+
+        _vote(first, "A")
+        _vote(second, "B")
+        _vote(first, "B")
+
+        for port in workers:
+            data = _display_data(port)
+            assert (data["poll"]["count_a"], data["poll"]["count_b"]) == (1, 2)
+            assert data["seq"] == 3
+
+    def it_switches_every_worker_to_a_newly_activated_poll(workers, poll_ids):
+        first, second = workers
+        _, (_, second_poll) = poll_ids
+        assert _display_data(second)["poll"]["question"] == "First?"
+
+        _post(first, f"/admin/polls/{second_poll}/activate?secret=test-secret", {})
+
+        assert _display_data(second)["poll"]["question"] == "Second?"
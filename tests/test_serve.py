@@ -0,0 +1,76 @@
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+from pathlib import Path
+
+from app import database
+from app.models import Poll, Vote
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_for(port, timeout=20):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/api/display/data", timeout=1)
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"server on port {port} did not start")
+
+
+def describe_shutdown():
+
+    def it_writes_queued_votes_on_sigterm(tmp_path):
+        url = f"sqlite:///{tmp_path / 'votes.db'}"
+        database.init_db(url)
+        session = database.get_session()()
+        session.add(Poll(question="Q?", answer_a="A", answer_b="B", is_active=True))
+        session.commit()
+
+        port = _free_port()
+        env = dict(
+            os.environ,
+            DATABASE_URL=url,
+            SERVER_HOST="127.0.0.1",
+            SERVER_PORT=str(port),
+            VOTE_PASSWORD="vote123",
+            VOTE_INGEST_MODE="batched",
+            # Never flush on the timer: only shutdown writes the votes
+            VOTE_BATCH_INTERVAL_MS="600000",
+        )
+        process = subprocess.Popen(
+            [sys.executable, "-m", "app.serve"], cwd=ROOT, env=env,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            _wait_for(port)
+            for _ in range(5):
+                request = urllib.request.Request(
+                    f"http://127.0.0.1:{port}/api/vote?answer=A",
+                    method="POST", headers={"X-Vote-Password": "vote123"},
+                )
+                assert urllib.request.urlopen(request, timeout=5).status == 200
+            assert session.query(Vote).count() == 0
+
+            process.send_signal(signal.SIGTERM)
+            assert process.wait(timeout=20) == 0
+        finally:
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+
+        session.expire_all()
+        assert session.query(Vote).count() == 5
+        session.close()
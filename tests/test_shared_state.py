@@ -0,0 +1,135 @@
+import fakeredis
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import scoped_session, sessionmaker
+
+from app import database as db_module
+from app.active_poll import PollSnapshot, active_poll_cache
+from app.broadcast import VoteBroadcaster
+from app.models import Base, Poll, Vote
+from app.shared_state import SharedStateStore
+from app.tally import tally
+
+
+@pytest.fixture
+def store():
+    return SharedStateStore(fakeredis.FakeRedis())
+
+
+@pytest.fixture
+def shared_tally(store):
+    tally.share(store)
+    yield tally
+    tally.share(None)
+
+
+@pytest.fixture
+def db_session():
+    engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(engine)
+    Session = scoped_session(sessionmaker(bind=engine))
+    db_module._session = Session
+    yield Session
+    Session.remove()
+
+
+def counts(a, b):
+    return {"A": a, "B": b}
+
+
+def describe_shared_state_store():
+
+    def it_stores_published_counts(store):
+        assert store.publish(store.epoch(), 1, counts(3, 2)) is True
+
+        assert store.counts(1) == counts(3, 2)
+
+    def it_keeps_the_newer_counts_when_publishes_race(store):
+        epoch = store.epoch()
+        store.publish(epoch, 1, counts(5, 5))
+
+        assert store.publish(epoch, 1, counts(4, 5)) is False
+        assert store.counts(1) == counts(5, 5)
+
+    def it_rejects_counts_read_before_an_invalidation(store):
+        epoch = store.epoch()
+        store.invalidate(1)
+
+        assert store.publish(epoch, 1, counts(9, 9)) is False
+        assert store.counts(1) is None
+
+    def it_drops_every_poll_on_a_full_invalidation(store):
+        store.publish(store.epoch(), 1, counts(1, 0))
+        store.publish(store.epoch(), 2, counts(0, 1))
+
+        store.invalidate()
+
+        assert store.counts(1) is None
+        assert store.counts(2) is None
+
+    def it_bumps_the_version_when_counts_change(store):
+        before = store.version()
+
+        store.publish(store.epoch(), 1, counts(1, 0))
+
+        assert store.version() > before
+
+
+def describe_shared_tally():
+
+    def it_publishes_the_committed_counters_after_recording(shared_tally, store, db_session):
+        poll = Poll(question="Q?", answer_a="A", answer_b="B", is_active=True)
+        db_session.add(poll)
+        db_session.commit()
+
+        db_session.add(Vote(poll_id=poll.id, answer="B"))
+        with shared_tally.recording(poll.id, "B"):
+            db_session.commit()
+
+        assert store.counts(poll.id) == counts(0, 1)
+
+    def it_reads_counts_another_worker_published(shared_tally, store, db_session):
+        poll = Poll(question="Q?", answer_a="A", answer_b="B", is_active=True)
+        db_session.add(poll)
+        db_session.commit()
+        snapshot = PollSnapshot.from_poll(poll)
+
+        assert shared_tally.get_counts(snapshot, db_session) == counts(0, 0)
+        store.publish(store.epoch(), poll.id, counts(7, 1))
+
+        assert shared_tally.get_counts(snapshot, db_session) == counts(7, 1)
+
+
+def describe_shared_broadcast_seq():
+
+    def it_numbers_events_from_the_store(store):
+        events = []
+        first = VoteBroadcaster(window_ms=0, emit=lambda event, payload: events.append(payload))
+        second = VoteBroadcaster(window_ms=0, emit=lambda event, payload: events.append(payload))
+        first.share(store)
+        second.share(store)
+
+        first.vote_cast(1, counts(1, 0))
+        second.vote_cast(1, counts(2, 0))
+
+        assert [payload["seq"] for payload in events] == [1, 2]
+        assert first.seq == second.seq == 2
+
+
+def describe_shared_active_poll_cache():
+
+    def it_reloads_after_an_invalidation_in_another_worker(store, db_session):
+        poll = Poll(question="Before?", answer_a="A", answer_b="B", is_active=True)
+        db_session.add(poll)
+        db_session.commit()
+        active_poll_cache.share(store)
+        try:
+            assert active_poll_cache.get(db_session).question == "Before?"
+
+            poll.question = "After?"
+            db_session.commit()
+            store.bump_epoch()
+
+            assert active_poll_cache.get(db_session).question == "After?"
+        finally:
+            active_poll_cache.share(None)
@@ -0,0 +1,110 @@
+import time
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from app.models import Base, Poll, Vote
+from app.tally import VoteTally
+
+
+@pytest.fixture
+def db_session():
+    engine = create_engine("sqlite:///:memory:")
+
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragma(dbapi_conn, connection_record):
+        cursor = dbapi_conn.cursor()
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.close()
+
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+    session = Session()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def poll(db_session):
+    poll = Poll(question="Test?", answer_a="A", answer_b="B", is_active=True)
+    db_session.add(poll)
+    db_session.commit()
+    db_session.add_all([
+        Vote(poll_id=poll.id, answer="A"),
+        Vote(poll_id=poll.id, answer="B"),
+        Vote(poll_id=poll.id, answer="B"),
+    ])
+    db_session.commit()
+    return poll
+
+
+def describe_vote_tally():
+
+    def it_loads_counts_from_the_database_on_first_use(db_session, poll):
+        tally = VoteTally()
+
+        assert tally.get_counts(poll, db_session) == {"A": 1, "B": 2}
+
+    def it_serves_subsequent_reads_without_querying_votes(db_session, poll, record_statements):
+        tally = VoteTally()
+        tally.get_counts(poll, db_session)
+
+        statements = record_statements(db_session.get_bind())
+        tally.get_counts(poll, db_session)
+
+        assert not [s for s in statements if "votes" in s]
+
+    def it_applies_recorded_votes_after_commit(db_session, poll):
+        tally = VoteTally()
+        tally.get_counts(poll, db_session)
+
+        db_session.add(Vote(poll_id=poll.id, answer="A"))
+        with tally.recording(poll.id, "A"):
+            db_session.commit()
+
+        assert tally.get_counts(poll, db_session) == {"A": 2, "B": 2}
+
+    def it_does_not_apply_votes_when_commit_fails(db_session, poll):
+        tally = VoteTally()
+        tally.get_counts(poll, db_session)
+
+        with pytest.raises(RuntimeError):
+            with tally.recording(poll.id, "A"):
+                raise RuntimeError("commit failed")
+
+        assert tally.get_counts(poll, db_session) == {"A": 1, "B": 2}
+
+    def it_reloads_after_invalidation(db_session, poll):
+        tally = VoteTally()
+        tally.get_counts(poll, db_session)
+
+        db_session.add(Vote(poll_id=poll.id, answer="A"))
+        db_session.commit()
+        tally.invalidate(poll.id)
+
+        assert tally.get_counts(poll, db_session) == {"A": 2, "B": 2}
+
+    def it_rereads_stored_counters_once_its_counts_expire(db_session, poll):
+        tally = VoteTally(ttl=0.05)
+        tally.get_counts(poll, db_session)
+        version = tally.version
+
+        # As flask reconcile-counts would, from another process
+        db_session.query(Poll).filter_by(id=poll.id).update({"count_a": 10})
+        db_session.commit()
+
+        assert tally.get_counts(poll, db_session) == {"A": 1, "B": 2}
+        time.sleep(0.06)
+        assert tally.get_counts(poll, db_session) == {"A": 10, "B": 2}
+        assert tally.version > version
+
+    def it_ignores_invalidation_for_other_polls(db_session, poll, record_statements):
+        tally = VoteTally()
+        tally.get_counts(poll, db_session)
+
+        statements = record_statements(db_session.get_bind())
+        tally.invalidate(poll.id + 1)
+        tally.get_counts(poll, db_session)
+
+        assert not [s for s in statements if "votes" in s]
@@ -0,0 +1,185 @@
+from collections import Counter
+from datetime import datetime, timezone
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import scoped_session, sessionmaker
+
+from app import database as db_module
+from app.models import Base, Poll, Vote
+from app.tally import tally
+from app.timeline import LiveTimeline, TimelineCache, query_timeline
+
+NOON = datetime(2024, 1, 1, 12, 0)
+NOON_TS = int(NOON.replace(tzinfo=timezone.utc).timestamp())
+
+
+@pytest.fixture
+def db_session():
+    engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(engine)
+    Session = scoped_session(sessionmaker(bind=engine))
+    db_module._session = Session
+    tally.invalidate()
+    yield Session
+    Session.remove()
+
+
+@pytest.fixture
+def poll(db_session):
+    poll = Poll(question="Q?", answer_a="A", answer_b="B", is_active=True)
+    db_session.add(poll)
+    db_session.commit()
+    return poll
+
+
+def at(seconds):
+    return datetime.utcfromtimestamp(NOON_TS + seconds)
+
+
+def commit_vote(session, poll, answer):
+    session.add(Vote(poll_id=poll.id, answer=answer))
+    with tally.recording(poll.id, answer):
+        session.commit()
+
+
+def describe_query_timeline():
+
+    def it_groups_votes_into_buckets(db_session, poll):
+        db_session.add_all([
+            Vote(poll_id=poll.id, answer="A", timestamp=at(0)),
+            Vote(poll_id=poll.id, answer="A", timestamp=at(59)),
+            Vote(poll_id=poll.id, answer="B", timestamp=at(61)),
+        ])
+        db_session.commit()
+
+        assert query_timeline(db_session, poll.id, 60) == [
+            {"t": NOON_TS, "count_a": 2, "count_b": 0},
+            {"t": NOON_TS + 60, "count_a": 0, "count_b": 1},
+        ]
+
+    def it_only_counts_votes_since_the_given_time(db_session, poll):
+        db_session.add_all([
+            Vote(poll_id=poll.id, answer="A", timestamp=at(0)),
+            Vote(poll_id=poll.id, answer="B", timestamp=at(5)),
+        ])
+        db_session.commit()
+
+        assert query_timeline(db_session, poll.id, 1, since=at(5)) == [
+            {"t": NOON_TS + 5, "count_a": 0, "count_b": 1},
+        ]
+
+    def it_reads_the_poll_timestamp_index(db_session, poll):
+        bind = db_session.get_bind()
+        with bind.connect() as connection:
+            plan = connection.exec_driver_sql(
+                "EXPLAIN QUERY PLAN SELECT timestamp / 10000, answer, count(id) "
+                "FROM votes WHERE poll_id = 1 AND timestamp >= 1704067200000 "
+                "GROUP BY 1, 2"
+            ).all()
+
+        assert "ix_votes_poll_id_timestamp" in str(plan)
+
+
+def describe_timeline_cache():
+
+    def it_loads_each_key_once():
+        cache = TimelineCache()
+        loads = []
+
+        for _ in range(3):
+            cache.get("key", lambda: loads.append(1) or ["timeline"])
+
+        assert loads == [1]
+
+    def it_evicts_the_least_recently_used_timeline():
+        cache = TimelineCache(max_entries=2)
+        cache.get("first", lambda: 1)
+        cache.get("second", lambda: 2)
+        cache.get("first", lambda: 1)
+
+        cache.get("third", lambda: 3)
+
+        assert cache.get("first", lambda: "reloaded") == 1
+        assert cache.get("second", lambda: "reloaded") == "reloaded"
+
+
+def describe_live_timeline():
+
+    @pytest.fixture
+    def clock():
+        now = [NOON_TS + 30.5]
+        return now
+
+    @pytest.fixture
+    def live(clock):
+        live = LiveTimeline(capacity=5, clock=lambda: clock[0])
+        tally.on_apply(live.record)
+        tally.on_invalidate(live.reset)
+        yield live
+        tally._listeners.remove(live.record)
+        tally._invalidation_listeners.remove(live.reset)
+
+    def it_seeds_from_the_database_then_counts_new_votes(db_session, poll, live, clock):
+        db_session.add(Vote(poll_id=poll.id, answer="A", timestamp=at(20)))
+        db_session.commit()
+
+        assert live.get(db_session, poll.id, 10) == [
+            {"t": NOON_TS + 20, "count_a": 1, "count_b": 0},
+        ]
+
+        clock[0] = NOON_TS + 41
+        commit_vote(db_session, poll, "B")
+
+        assert live.get(db_session, poll.id, 10) == [
+            {"t": NOON_TS + 20, "count_a": 1, "count_b": 0},
+            {"t": NOON_TS + 40, "count_a": 0, "count_b": 1},
+        ]
+
+    def it_drops_buckets_older_than_its_capacity(db_session, poll, live, clock):
+        live.get(db_session, poll.id, 1)
+        commit_vote(db_session, poll, "A")
+
+        clock[0] += 10
+
+        assert live.get(db_session, poll.id, 1) == []
+
+    def it_ignores_votes_for_other_polls(db_session, poll, live):
+        live.get(db_session, poll.id, 1)
+
+        live.record(poll.id + 1, "A", 1)
+
+        assert live.get(db_session, poll.id, 1) == []
+
+    def it_reseeds_after_the_tally_is_invalidated(db_session, poll, live, clock):
+        live.get(db_session, poll.id, 10)
+        db_session.add(Vote(poll_id=poll.id, answer="B", timestamp=at(30)))
+        db_session.commit()
+
+        tally.invalidate(poll.id)
+
+        assert live.get(db_session, poll.id, 10) == [
+            {"t": NOON_TS + 30, "count_a": 0, "count_b": 1},
+        ]
+
+    def it_places_backdated_votes_in_their_own_buckets(db_session, poll, live, clock):
+        live.get(db_session, poll.id, 10)
+        clock[0] = NOON_TS + 41
+        votes = [
+            Vote(poll_id=poll.id, answer="A", timestamp=at(40)),
+            Vote(poll_id=poll.id, answer="B", timestamp=at(10)),
+            Vote(poll_id=poll.id, answer="B", timestamp=at(12)),
+        ]
+        db_session.add_all(votes)
+        with tally.recording_batch(poll.id, Counter((v.answer, v.timestamp) for v in votes)):
+            db_session.commit()
+
+        expected = [
+            {"t": NOON_TS + 10, "count_a": 0, "count_b": 2},
+            {"t": NOON_TS + 40, "count_a": 1, "count_b": 0},
+        ]
+        assert live.get(db_session, poll.id, 10) == expected
+
+        tally.invalidate(poll.id)
+
+        assert live.get(db_session, poll.id, 10) == expected